@@ -1,130 +1,317 @@
 import streamlit as st
-import cv2
-import numpy as np
-import requests
-import base64
 import os
+import tempfile
 import time
-from PIL import Image
-import io
+import uuid
+
+# Arranque rápido: scanner carga sus submódulos bajo demanda, y cv2/numpy (y
+# streamlit-webrtc) se importan en las funciones que los usan, así que el
+# primer render del paso 1 no paga su importación.
+import scanner
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
 
 # ========== CONFIGURACIÓN OCR API ==========
+@st.cache_resource
 def setup_ocr():
-    """Configura el cliente OCR usando API externa"""
-    try:
-        # OCR.space API Key (gratuita para uso limitado)
-        API_KEYS = [
-            'helloworld',  # Clave pública gratuita
-            'K89947096688957'  # Clave de ejemplo
-        ]
-        
-        return True, API_KEYS[0]
-    except Exception as e:
-        st.error(f"❌ Error configurando OCR: {e}")
-        return False, None
+    """Gestor de claves de OCR.space, configurado una vez por proceso"""
+    # Claves de OCR.space: SCANNER_OCR_API_KEYS (varias, separadas por comas) o
+    # SCANNER_OCR_API_KEY; por defecto la clave pública gratuita 'helloworld'.
+    # Cada petición usa la clave con más margen de cuota y ritmo.
+    return scanner.get_key_manager()
 
-OCR_AVAILABLE, API_KEY = setup_ocr()
+try:
+    KEY_MANAGER, OCR_AVAILABLE = setup_ocr(), True
+except Exception as e:
+    # st.cache_resource no guarda las excepciones: se reintenta en el siguiente rerun
+    st.error(f"❌ Error configurando OCR: {e}")
+    KEY_MANAGER, OCR_AVAILABLE = None, False
 
 # ========== FUNCIONES DE LA APLICACIÓN ==========
-def get_roi(image, x, y, width, height):
-    """Extrae región de interés"""
-    return image[y:y + height, x:x + width]
+# Modos de selección del área a analizar
+AREA_AUTO = "🎯 Detección automática"
+AREA_MANUAL = "▭ Rectángulo central"
 
-def image_to_base64(image):
-    """Convierte imagen OpenCV a base64"""
-    try:
-        # Convertir BGR to RGB
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        # Convertir a PIL Image
-        pil_image = Image.fromarray(image_rgb)
-        # Convertir a bytes
-        buffered = io.BytesIO()
-        pil_image.save(buffered, format="JPEG", quality=85)
-        # Convertir a base64
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        return img_str
-    except Exception as e:
-        st.error(f"Error convirtiendo imagen: {e}")
+@st.cache_resource
+def get_ocr_client():
+    """Cliente HTTP de OCR.space compartido entre reruns y sesiones (pool de conexiones)"""
+    return scanner.OCRSpaceClient(keys=KEY_MANAGER)
+
+# Al vaciarse la caché se detienen los hilos del motor anterior antes de construir otro
+@st.cache_resource(on_release=lambda recognizer: recognizer.close())
+def _build_recognizer():
+    recognizer = scanner.get_recognizer(client=get_ocr_client())
+    # Caché compartida por todas las sesiones (SCANNER_CACHE_BACKEND)
+    cache = scanner.get_cache()
+    if cache is not None:
+        recognizer = scanner.CachedRecognizer(recognizer, cache)
+    return recognizer
+
+@st.cache_resource
+def start_metrics():
+    """Endpoint /metrics y log JSON-lines (SCANNER_METRICS_PORT / SCANNER_METRICS_LOG), una vez por proceso
+
+    Importar scanner.results publica también /results.jsonl y /results.csv.
+    """
+    import scanner.results  # noqa: F401
+    return scanner.metrics.configure()
+
+def get_store():
+    """Almacén de capturas en disco, sólo si SCANNER_STORE_ENABLED está activo"""
+    return scanner.get_store() if scanner.config.get_setting("store_enabled") else None
+
+def record_reading(roi, result):
+    """Guarda la lectura junto a la captura en el almacén (si está activo)"""
+    store = get_store()
+    if store is None or result is None:
+        return
+    capture_id = st.session_state.capture_id
+    if store.path(capture_id) is None:
+        # La retención pudo borrarla: volver a guardarla desde la memoria de la sesión
+        capture = scanner.get_capture_cache().get(capture_id)
+        if capture is None:
+            return
+        store.add(capture.data, source="camera")
+    store.record(capture_id, roi, result)
+
+def log_reading(roi, result, timings=None):
+    """Añade la lectura al log de resultados (SCANNER_RESULTS_ENABLED)"""
+    if result is None or not scanner.config.get_setting("results_enabled"):
+        return
+    record = scanner.ResultRecord.from_result(result, roi, st.session_state.capture_id, timings)
+    scanner.get_result_log().append(record)
+
+def get_captured_image():
+    """Captura de la sesión decodificada bajo demanda (None si no hay o caducó)"""
+    capture_id = st.session_state.get("capture_id")
+    if capture_id is None:
         return None
+    return scanner.get_capture_cache().image(capture_id)
 
-def extract_digits_with_api(image):
-    """Extrae dígitos usando OCR.space API"""
-    if not OCR_AVAILABLE:
-        return "OCR no disponible", None
-    
+# ========== TRANSFORMACIONES CACHEADAS POR CAPTURA ==========
+# Cada rerun vuelve a ejecutar el script entero: todo lo que depende sólo de la
+# captura se memoiza por capture_id para que el paso 2 no crezca con su tamaño.
+# Si la captura caducó se lanza KeyError, que st.cache_data no guarda.
+
+def _capture_image(capture_id):
+    image = scanner.get_capture_cache().image(capture_id)
+    if image is None:
+        raise KeyError(capture_id)
+    return image
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def preview_jpeg(capture_id):
+    """Vista previa ya codificada: st.image no vuelve a convertir ni comprimir"""
+    import cv2
+
+    preview = scanner.get_capture_cache().preview(capture_id)
+    if preview is None:
+        raise KeyError(capture_id)
+    ok, buffer = cv2.imencode(".jpg", cv2.cvtColor(preview, cv2.COLOR_RGB2BGR),
+                              [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buffer.tobytes()
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def detect_regions(capture_id):
+    """Cajas candidatas de la detección automática"""
+    return scanner.propose_regions(_capture_image(capture_id))
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def analysis_inputs(capture_id, roi):
+    """ROI en RGB para mostrar, ROI preprocesado y tiempos de cada etapa"""
+    import cv2
+
+    crop = scanner.get_roi(_capture_image(capture_id), *roi)
+    processed, timings = scanner.get_preprocessor().run(crop)
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB), processed, timings
+
+# st.fragment (Streamlit ≥ 1.37) vuelve a ejecutar sólo la función decorada
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+@fragment
+def centering_controls():
+    """Botones de centrado: su interacción no repite el resto del paso 2"""
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("↔️ Centrar Horizontal", use_container_width=True):
+            st.info("Imagen centrada horizontalmente")
+
+    with col2:
+        if st.button("↕️ Centrar Vertical", use_container_width=True):
+            st.info("Imagen centrada verticalmente")
+
+def polling_fragment(seconds):
+    """Fragmento que se vuelve a ejecutar cada ``seconds`` s sin repetir el resto de la página
+
+    Sin st.fragment se hace una pausa corta y se vuelve a ejecutar el script.
+    """
+    if getattr(st, "fragment", None) is not None:
+        return st.fragment(run_every=seconds)
+
+    def decorator(func):
+        def wrapper():
+            func()
+            time.sleep(seconds)
+            st.rerun()
+        return wrapper
+    return decorator
+
+def analysis_job(recognizer, image, candidates, rect, processed_roi):
+    """Reconocimiento del paso 2, ejecutado en la cola de trabajos (sin llamadas a Streamlit)
+
+    Devuelve el texto a mostrar, el área detectada (o None) y las lecturas
+    (roi, resultado) para el almacén.
+    """
+    # Detección automática: el motor local elige entre las cajas candidatas y
+    # el rectángulo del centro, y sólo la ganadora pasa por el motor completo
+    if candidates:
+        result, chosen = scanner.recognize_best_region(image, recognizer, candidates, fallback_roi=rect)
+        if chosen is not None:
+            return {"digits": result.as_text(), "detected_roi": chosen.roi,
+                    "readings": [(chosen.roi, result)]}
+    else:
+        # Sin detección: rectángulo fijo del centro
+        if processed_roi is None:
+            raise ValueError("No se pudo extraer el área del rectángulo")
+        result = recognizer.recognize(processed_roi)
+    # Lectura poco fiable (etiqueta inclinada, dígitos pequeños): barrido de giros y escalas
+    if image is not None and scanner.config.get_setting("sweep"):
+        result = scanner.sweep_if_unreliable(image, rect, result, recognizer)
+    return {"digits": result.as_text(), "detected_roi": None, "readings": [(rect, result)]}
+
+def collect_job():
+    """Pasa a la sesión el resultado del análisis en cola; False si aún no ha terminado"""
+    job_id = st.session_state.get("job_id")
+    if job_id is None:
+        return True
+    job = scanner.get_job_queue().get(job_id)
+    if job is not None and not job.done:
+        return False
+
+    st.session_state.job_id = None
+    st.session_state.detected_roi = None
+    if job is None:
+        st.session_state.captured_digits = "No se encontró el análisis (caducó); vuelve a intentarlo"
+    elif job.status == scanner.jobs.DONE:
+        # Espera en la cola y duración del análisis completo (ms)
+        timings = {"queue": (job.started - job.submitted) * 1000,
+                   "analysis": (job.finished - job.started) * 1000}
+        for roi, result in job.result["readings"]:
+            record_reading(roi, result)
+            log_reading(roi, result, timings)
+        st.session_state.captured_digits = job.result["digits"]
+        st.session_state.detected_roi = job.result["detected_roi"]
+    elif job.status == scanner.jobs.FAILED:
+        st.session_state.captured_digits = f"Error al procesar el área seleccionada: {job.error}"
+    else:
+        st.session_state.captured_digits = "No se completó el análisis: fue cancelado"
+    st.session_state.analysis_done = True
+    return True
+
+@polling_fragment(0.5)
+def job_progress():
+    """Estado del análisis en curso; se refresca solo hasta que termina"""
+    queue = scanner.get_job_queue()
+    job_id = st.session_state.get("job_id")
+    job = queue.get(job_id) if job_id else None
+    if job is None or job.done:
+        st.rerun()
+        return
+
+    if job.status == scanner.jobs.QUEUED:
+        st.info(f"⏳ En cola: {queue.position(job_id)} análisis por delante")
+    else:
+        st.info(f"🔍 Analizando dígitos... {job.elapsed:.1f} s")
+    if st.button("✖️ Cancelar", use_container_width=True):
+        queue.cancel(job_id)
+        st.session_state.job_id = None
+        st.session_state.current_step = 2
+        st.rerun()
+
+def submit_analysis(capture_id, rect, detect=False):
+    """Encola el reconocimiento de ``rect`` (y de las regiones detectadas) y pasa al paso 3
+
+    El reconocimiento va a la cola compartida: el script no espera a la API.
+    """
     try:
-        # Convertir imagen a base64
-        image_base64 = image_to_base64(image)
-        if not image_base64:
-            return "Error procesando imagen", None
-        
-        # Configurar parámetros para la API
-        payload = {
-            'base64Image': f'data:image/jpeg;base64,{image_base64}',
-            'apikey': API_KEY,
-            'language': 'eng',
-            'isOverlayRequired': False,
-            'OCREngine': 2  # Motor 2 es mejor para dígitos
-        }
-        
-        # Llamar a la API
-        with st.spinner("🔍 Analizando dígitos..."):
-            response = requests.post(
-                'https://api.ocr.space/parse/image',
-                data=payload,
-                timeout=30
-            )
-        
-        if response.status_code == 200:
-            result = response.json()
-            
-            # Verificar si la API retornó resultados
-            if result['IsErroredOnProcessing']:
-                error_message = result['ErrorMessage'] if 'ErrorMessage' in result else 'Error desconocido'
-                return f"Error API: {error_message}", None
-            
-            # Extraer texto de los resultados
-            parsed_results = result.get('ParsedResults', [])
-            if parsed_results:
-                text = parsed_results[0].get('ParsedText', '').strip()
-                
-                # Filtrar solo dígitos
-                digits = ''.join(filter(str.isdigit, text))
-                
-                if digits:
-                    return digits, None
-                else:
-                    return "No se encontraron dígitos", None
-            else:
-                return "No se pudieron procesar los resultados", None
-        else:
-            return f"Error HTTP: {response.status_code}", None
-            
-    except requests.exceptions.Timeout:
-        return "Timeout: La API tardó demasiado en responder", None
-    except requests.exceptions.RequestException as e:
-        return f"Error de conexión: {str(e)}", None
+        candidates = detect_regions(capture_id) if detect else []
+
+        # Extraer y preprocesar el área del rectángulo (cacheado por captura)
+        roi_rgb, processed_roi, _ = analysis_inputs(capture_id, rect)
+
+        job_id = scanner.get_job_queue().submit(
+            st.session_state.session_id,
+            analysis_job,
+            get_recognizer(),
+            get_captured_image() if candidates or scanner.config.get_setting("sweep") else None,
+            candidates,
+            rect,
+            processed_roi if roi_rgb.size > 0 else None,
+        )
+    except scanner.errors.QueueFullError as e:
+        st.warning(f"⏳ {e}")
     except Exception as e:
-        return f"Error inesperado: {str(e)}", None
+        st.error(f"❌ Error al procesar el área seleccionada: {e}")
+    else:
+        st.session_state.job_id = job_id
+        st.session_state.last_job_id = job_id
+        st.session_state.analysis_rect = rect
+        st.session_state.analysis_done = False
+        st.session_state.current_step = 3
+        st.rerun()
+
+def client_crop_capture():
+    """Paso 1 con recorte en el navegador: sólo el rectángulo alineado llega al servidor
+
+    La captura de la sesión es el propio recorte, así que se analiza entero y
+    sin pasar por el paso 2.
+    """
+    from components.roi_crop import roi_camera
 
-def preprocess_image(image):
-    """Preprocesamiento simple para mejorar la imagen"""
     try:
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
-        
-        # Mejorar contraste
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        enhanced = clahe.apply(gray)
-        
-        return enhanced
-        
-    except Exception as e:
-        return image
+        crop = roi_camera(max_height=scanner.config.get_setting("client_crop_max_height"),
+                          quality=scanner.config.get_setting("client_crop_quality"),
+                          key="roi_camera")
+        if crop is None:
+            return
+        capture_id = scanner.get_capture_cache().put(crop.data)
+    except ValueError as e:
+        st.error(f"❌ Error al procesar la imagen capturada: {e}")
+        return
+
+    # Persistir sólo la primera vez que se ve este recorte (no en cada rerun)
+    store = get_store()
+    if store is not None and capture_id != st.session_state.capture_id:
+        store.add(crop.data, source="camera-roi")
+    st.session_state.capture_id = capture_id
+
+    st.success(f"✅ ¡Área capturada! {crop.width}×{crop.height} px "
+               f"({len(crop.data) / 1024:.0f} KB) de una foto de {crop.source[0]}×{crop.source[1]}")
+    if st.button("🔍 ANALIZAR DÍGITOS DEL ÁREA", use_container_width=True, type="primary"):
+        submit_analysis(capture_id, (0, 0, crop.width, crop.height))
+
+def realign():
+    """Vuelve a alinear: con recorte en el navegador la alineación es el paso 1
+
+    La captura de ese modo ya es el rectángulo alineado; volver al paso 2
+    recortaría de nuevo su centro y perdería los bordes.
+    """
+    st.session_state.current_step = 1 if scanner.config.get_setting("client_crop") else 2
+    st.session_state.analysis_done = False
+    st.rerun()
+
+def get_recognizer():
+    """Motor OCR configurado (SCANNER_OCR_ENGINE), construido una vez por proceso"""
+    return _build_recognizer()
 
 # ========== APLICACIÓN STREAMLIT ==========
+@st.cache_resource
+def page_styles():
+    """<style> con la hoja de estilos de assets/, compactada"""
+    with open(os.path.join(ASSETS_DIR, "css", "custom.css"), encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return "<style>" + "\n".join(line for line in lines if line) + "</style>"
+
 st.set_page_config(
     page_title="Escáner de Dígitos - Selección Táctil",
     page_icon="📱",
@@ -132,221 +319,264 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS personalizado con JavaScript para interacción táctil
-st.markdown("""
-<style>
-    .main {
-        background-color: #f0f2f6;
-    }
-    .stButton>button {
-        border-radius: 15px;
-        height: 3.5em;
-        font-weight: bold;
-        font-size: 1.1em;
-        margin: 5px 0;
-    }
-    .digits-result {
-        font-size: 3em;
-        font-weight: bold;
-        color: #00cc00;
-        text-align: center;
-        padding: 25px;
-        background-color: #000000;
-        border-radius: 15px;
-        border: 3px solid #00cc00;
-        margin: 15px 0;
-    }
-    .info-box {
-        background-color: #e8f4fd;
-        padding: 20px;
-        border-radius: 15px;
-        border-left: 5px solid #2196F3;
-        margin: 10px 0;
-    }
-    .touch-container {
-        position: relative;
-        border: 3px solid #00cc00;
-        border-radius: 15px;
-        padding: 10px;
-        background: #000;
-        margin: 10px 0;
-        overflow: hidden;
-        touch-action: manipulation;
-    }
-    .scanner-overlay {
-        position: absolute;
-        top: 50%;
-        left: 50%;
-        transform: translate(-50%, -50%);
-        width: 250px;
-        height: 120px;
-        border: 3px solid #00ff00;
-        border-radius: 10px;
-        pointer-events: none;
-        z-index: 1000;
-        box-shadow: 0 0 0 9999px rgba(0, 0, 0, 0.4);
-    }
-    .overlay-text {
-        position: absolute;
-        top: -40px;
-        left: 0;
-        right: 0;
-        text-align: center;
-        color: #00ff00;
-        font-weight: bold;
-        font-size: 16px;
-        background: rgba(0, 0, 0, 0.8);
-        padding: 8px;
-        border-radius: 8px;
-    }
-    .zoom-controls {
-        background: rgba(0, 0, 0, 0.8);
-        padding: 15px;
-        border-radius: 10px;
-        margin: 10px 0;
-    }
-    .instruction-box {
-        background: linear-gradient(45deg, #000000, #001a00);
-        padding: 15px;
-        border-radius: 10px;
-        border: 2px solid #00cc00;
-        margin: 10px 0;
-    }
-    .step-indicator {
-        background: #007bff;
-        color: white;
-        border-radius: 50%;
-        width: 35px;
-        height: 35px;
-        display: inline-flex;
-        align-items: center;
-        justify-content: center;
-        margin-right: 10px;
-        font-weight: bold;
-        font-size: 18px;
-    }
-    
-    /* Estilos para la imagen interactiva */
-    .interactive-image {
-        cursor: grab;
-        transition: transform 0.2s;
-        max-width: 100%;
-        height: auto;
-    }
-    .interactive-image:active {
-        cursor: grabbing;
-    }
-    
-    @media (max-width: 768px) {
-        .digits-result {
-            font-size: 2.5em;
-            padding: 20px;
-        }
-        .scanner-overlay {
-            width: 200px;
-            height: 100px;
-        }
-    }
-</style>
-
-<script>
-// JavaScript para hacer la imagen arrastrable y con zoom
-function makeImageDraggable() {
-    const image = document.querySelector('.interactive-image');
-    if (!image) return;
-    
-    let isDragging = false;
-    let startX, startY;
-    let translateX = 0, translateY = 0;
-    let scale = 1;
-    
-    image.style.transform = `translate(${translateX}px, ${translateY}px) scale(${scale})`;
-    image.style.cursor = 'grab';
-    
-    // Eventos táctiles
-    image.addEventListener('touchstart', function(e) {
-        e.preventDefault();
-        isDragging = true;
-        const touch = e.touches[0];
-        startX = touch.clientX - translateX;
-        startY = touch.clientY - translateY;
-        image.style.cursor = 'grabbing';
-    });
-    
-    image.addEventListener('touchmove', function(e) {
-        if (!isDragging) return;
-        e.preventDefault();
-        const touch = e.touches[0];
-        translateX = touch.clientX - startX;
-        translateY = touch.clientY - startY;
-        image.style.transform = `translate(${translateX}px, ${translateY}px) scale(${scale})`;
-    });
-    
-    image.addEventListener('touchend', function() {
-        isDragging = false;
-        image.style.cursor = 'grab';
-    });
-    
-    // Eventos de ratón (para desktop)
-    image.addEventListener('mousedown', function(e) {
-        isDragging = true;
-        startX = e.clientX - translateX;
-        startY = e.clientY - translateY;
-        image.style.cursor = 'grabbing';
-    });
-    
-    document.addEventListener('mousemove', function(e) {
-        if (!isDragging) return;
-        translateX = e.clientX - startX;
-        translateY = e.clientY - startY;
-        image.style.transform = `translate(${translateX}px, ${translateY}px) scale(${scale})`;
-    });
-    
-    document.addEventListener('mouseup', function() {
-        isDragging = false;
-        image.style.cursor = 'grab';
-    });
-    
-    // Gestos de zoom con rueda del ratón
-    image.addEventListener('wheel', function(e) {
-        e.preventDefault();
-        const delta = -Math.sign(e.deltaY);
-        scale += delta * 0.1;
-        scale = Math.max(0.5, Math.min(3, scale)); // Limitar zoom entre 0.5x y 3x
-        image.style.transform = `translate(${translateX}px, ${translateY}px) scale(${scale})`;
-    });
-}
-
-// Inicializar cuando la página cargue
-document.addEventListener('DOMContentLoaded', function() {
-    setTimeout(makeImageDraggable, 1000);
-});
-
-// Re-inicializar cuando Streamlit actualice el contenido
-if (window.Streamlit) {
-    window.Streamlit.onRender(function() {
-        setTimeout(makeImageDraggable, 500);
-    });
-}
-</script>
-""", unsafe_allow_html=True)
+# Estilos en assets/css/custom.css, leídos una vez por proceso
+st.markdown(page_styles(), unsafe_allow_html=True)
 
 st.title("📱 Escáner de Dígitos - Selección Táctil")
 st.markdown("---")
 
+def load_batch_images(uploaded_files, include_captures):
+    """Decodifica las imágenes subidas y, opcionalmente, las capturas de temp/"""
+    import cv2
+    import numpy as np
+
+    images = []
+    for uploaded in uploaded_files or []:
+        image = cv2.imdecode(np.frombuffer(uploaded.getvalue(), np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append((uploaded.name, image))
+    if include_captures:
+        for name in sorted(os.listdir('temp')):
+            if name.startswith('capture_') and name.endswith('.jpg'):
+                try:
+                    images.append((name, scanner.load_image(os.path.join('temp', name))))
+                except (OSError, ValueError):
+                    continue
+    return images
+
+def batch_mode():
+    """Escaneo por lotes: varias imágenes y varios ROIs por imagen en una sola petición"""
+    st.subheader("🗂️ Escaneo por Lotes")
+
+    uploaded_files = st.file_uploader(
+        "Imágenes a escanear", type=["jpg", "jpeg", "png"], accept_multiple_files=True
+    )
+    include_captures = st.checkbox("Incluir capturas guardadas en temp/")
+    rois_text = st.text_area(
+        "ROIs por imagen (x,y,ancho,alto en píxeles o fracciones 0-1 de centro y tamaño; "
+        "separados por punto y coma)",
+        placeholder="Vacío = rectángulo centrado, proporcional a cada imagen",
+    )
+
+    if not st.button("🔍 ANALIZAR LOTE", use_container_width=True, type="primary"):
+        return
+
+    try:
+        rois = scanner.parse_rois(rois_text)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return
+
+    images = load_batch_images(uploaded_files, include_captures)
+    if not images:
+        st.warning("⚠️ No hay imágenes para analizar")
+        return
+
+    # Recortar y preprocesar todos los ROIs de todas las imágenes
+    preprocess = scanner.get_preprocessor()
+    labels, crops = [], []
+    for name, image in images:
+        for roi in rois or [scanner.default_roi(image.shape)]:
+            roi = scanner.resolve_roi(roi, image.shape)
+            crop = scanner.get_roi(image, *roi)
+            if crop.size > 0:
+                labels.append((name, roi))
+                crops.append(preprocess(crop))
+
+    engine = scanner.config.get_setting("ocr_engine")
+    local = scanner.LocalDigitRecognizer() if engine in ("local", "auto") else None
+    client = get_ocr_client() if engine in ("api", "auto") else None
+
+    with st.spinner(f"🔍 Analizando {len(crops)} áreas..."):
+        results = scanner.recognize_batch(crops, client=client, local=local)
+
+    st.dataframe(
+        [
+            {
+                "Imagen": name,
+                "ROI": ",".join(str(v) for v in roi),
+                "Resultado": result.as_text(),
+                "Motor": result.engine,
+            }
+            for (name, roi), result in zip(labels, results)
+        ],
+        use_container_width=True,
+    )
+    ok = sum(1 for result in results if result.ok)
+    st.success(f"✅ {ok} de {len(results)} áreas con dígitos detectados")
+
+def show_stream_state(state):
+    """Resultado de un escaneo de vídeo: consenso o lectura provisional y lecturas por fotograma"""
+    if state.done:
+        st.success(f"✅ Dígitos detectados: **{state.digits}**")
+    elif state.candidate:
+        st.warning(f"⚠️ Sin consenso; lectura provisional: {state.candidate}")
+    else:
+        st.warning("⚠️ Ningún fotograma con dígitos suficientemente nítidos")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Fotogramas", state.frames)
+    col2.metric("Reconocimientos", state.recognitions)
+    col3.metric("Tiempo hasta el resultado",
+                f"{state.time_to_result_ms / 1000:.1f} s" if state.time_to_result_ms else "—")
+    if state.readings:
+        st.dataframe(state.readings, hide_index=True, use_container_width=True)
+
+def load_webrtc():
+    """webrtc_streamer de streamlit-webrtc (opcional), o None si no está instalado
+
+    Sin él, el modo vídeo sólo analiza ficheros grabados.
+    """
+    try:
+        from streamlit_webrtc import webrtc_streamer
+    except ImportError:
+        return None
+    return webrtc_streamer
+
+@polling_fragment(0.5)
+def live_status():
+    """Progreso del escaneo en directo; se refresca solo sin retener el script"""
+    live = st.session_state.get("live_scanner")
+    if live is None:
+        return
+    if live.state.done:
+        show_stream_state(live.finish())
+    else:
+        st.info(f"🎞️ {live.state.frames} fotogramas · {live.state.recognitions} lecturas · "
+                f"provisional: {live.state.candidate or '—'}")
+
+def live_video_scan(webrtc_streamer):
+    """Cámara en directo: los fotogramas se puntúan en el hilo de vídeo y el OCR corre aparte"""
+    live = st.session_state.get("live_scanner")
+    if live is None or st.button("🔄 Nuevo escaneo", use_container_width=True):
+        if live is not None:
+            # Libera el hilo de reconocimiento del escaneo anterior
+            live.finish()
+        live = st.session_state.live_scanner = scanner.LiveScanner(get_recognizer(), background=True)
+
+    def on_frame(frame):
+        live.feed(frame.to_ndarray(format="bgr24"))
+        return frame
+
+    ctx = webrtc_streamer(
+        key="live-scan",
+        video_frame_callback=on_frame,
+        media_stream_constraints={"video": True, "audio": False},
+    )
+    if ctx.state.playing:
+        live_status()
+    elif live.state.frames:
+        # Vídeo detenido: reconocer el mejor fotograma pendiente y soltar el hilo
+        show_stream_state(live.finish())
+
+def video_mode():
+    """Escaneo continuo: sólo el mejor fotograma de cada ventana llega al motor OCR"""
+    st.subheader("🎥 Escaneo en Vídeo")
+    webrtc_streamer = load_webrtc()
+    if webrtc_streamer is not None:
+        live_video_scan(webrtc_streamer)
+        st.markdown("---")
+    else:
+        st.caption("Instala `streamlit-webrtc` para escanear desde la cámara en directo; "
+                   "mientras tanto puedes analizar un vídeo grabado.")
+
+    uploaded = st.file_uploader("Vídeo a analizar", type=["mp4", "mov", "avi", "webm", "mkv"])
+    if uploaded is None or not st.button("🔍 ANALIZAR VÍDEO", use_container_width=True, type="primary"):
+        return
+
+    # cv2.VideoCapture necesita una ruta en disco
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(uploaded.name)[1], delete=False) as f:
+        f.write(uploaded.getvalue())
+    try:
+        with st.spinner("🔍 Buscando el mejor fotograma..."):
+            state = scanner.scan_stream(scanner.iter_video_frames(f.name), get_recognizer())
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return
+    finally:
+        os.unlink(f.name)
+    show_stream_state(state)
+
+def diagnostics_panel():
+    """Tiempos por etapa, errores y tráfico HTTP acumulados en este proceso"""
+    snapshot = scanner.metrics.REGISTRY.snapshot()
+    timings = [
+        {
+            "Métrica": h["metric"].replace("scanner_", "").replace("_seconds", ""),
+            "Etiqueta": ", ".join(f"{k}={v}" for k, v in h["labels"].items()),
+            "N": h["count"],
+            "p50 (ms)": round(h["p50"] * 1000, 2),
+            "p95 (ms)": round(h["p95"] * 1000, 2),
+        }
+        for h in snapshot["histograms"] if h["metric"].endswith("_seconds")
+    ]
+    counters = [
+        {
+            "Métrica": c["metric"].replace("scanner_", ""),
+            "Etiqueta": ", ".join(f"{k}={v}" for k, v in c["labels"].items()),
+            "Total": c["value"],
+        }
+        for c in snapshot["counters"]
+    ]
+    payloads = [h for h in snapshot["histograms"] if h["metric"] == "scanner_payload_bytes"]
+
+    with st.sidebar.expander("🩺 Diagnóstico", expanded=True):
+        if KEY_MANAGER is not None:
+            # Margen de cada clave de OCR.space (compartido entre procesos)
+            st.dataframe(KEY_MANAGER.snapshot(), hide_index=True, use_container_width=True)
+        if not timings and not counters:
+            st.caption("Sin mediciones todavía")
+            return
+        st.dataframe(timings, hide_index=True, use_container_width=True)
+        if counters:
+            st.dataframe(counters, hide_index=True, use_container_width=True)
+        for h in payloads:
+            st.caption(f"📦 {h['labels'].get('kind')}: {h['count']} · media "
+                       f"{h['sum'] / h['count'] / 1024:.1f} KB")
+
 def main():
     # Información sobre el estado
     if not OCR_AVAILABLE:
         st.error("❌ Servicio OCR no disponible")
         return
 
+    start_metrics()
+    if st.sidebar.checkbox("🩺 Mostrar diagnóstico"):
+        diagnostics_panel()
+
+    mode = st.sidebar.radio("Modo", ["📷 Individual", "🗂️ Lote", "🎥 Vídeo"])
+    if mode == "🗂️ Lote":
+        batch_mode()
+        return
+    if mode == "🎥 Vídeo":
+        video_mode()
+        return
+
+    # Identificador de la sesión: reparto justo de la cola de trabajos
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+
     # Inicializar estado de la aplicación
     if 'current_step' not in st.session_state:
         st.session_state.current_step = 1
-        st.session_state.captured_image = None
+        # Sólo el identificador: los bytes JPEG viven una vez en el proceso
+        st.session_state.capture_id = None
         st.session_state.captured_digits = ""
         st.session_state.analysis_done = False
         st.session_state.image_scale = 100
+        st.session_state.detected_roi = None
+        # Análisis en la cola de trabajos (en curso y último enviado, para reintentar)
+        st.session_state.job_id = None
+        st.session_state.last_job_id = None
+        st.session_state.analysis_rect = None
+
+    # Estadísticas de la caché OCR (a partir del paso 2: el paso 1 no carga el motor)
+    if st.session_state.current_step > 1:
+        recognizer = get_recognizer()
+        if isinstance(recognizer, scanner.CachedRecognizer):
+            stats = recognizer.cache.stats
+            st.sidebar.caption(
+                f"💾 Caché OCR: {stats.hits} aciertos · {stats.misses} fallos ({stats.hit_rate:.0%})"
+            )
 
     # Indicador de pasos - CORREGIDO para evitar el error
     col1, col2, col3 = st.columns(3)
@@ -357,17 +587,10 @@ def main():
         st.markdown("Capturar imagen")
     
     with col2:
-        # Verificar si hay imagen capturada de forma segura
-        has_captured_image = st.session_state.captured_image is not None
-        if has_captured_image:
-            # Verificar que captured_image no sea un array vacío
-            try:
-                if hasattr(st.session_state.captured_image, 'size'):
-                    has_captured_image = st.session_state.captured_image.size > 0
-                else:
-                    has_captured_image = False
-            except:
-                has_captured_image = False
+        # Verificar si hay imagen capturada (puede haber caducado por inactividad)
+        # (sin captura no se consulta el almacén, que carga OpenCV)
+        has_captured_image = (st.session_state.capture_id is not None
+                              and st.session_state.capture_id in scanner.get_capture_cache())
         
         step2_icon = "🔵" if st.session_state.current_step == 2 else "✅" if has_captured_image else "⚪"
         st.markdown(f"### {step2_icon} Paso 2")
@@ -391,47 +614,56 @@ def main():
                 <li><strong>Permite el acceso a la cámara</strong> cuando tu navegador lo solicite</li>
                 <li><strong>Apunta a los dígitos</strong> que quieres escanear</li>
                 <li><strong>Captura la imagen</strong> cuando los dígitos estén claros y enfocados</li>
+                <li><strong>Encuadra los dígitos</strong> dentro del rectángulo verde (arrastra y usa dos dedos o la rueda para el zoom): sólo esa área se envía y se analiza</li>
             </ol>
         </div>
         """, unsafe_allow_html=True)
         
-        # Componente de cámara
-        camera_image = st.camera_input(
-            "Toma una foto de los dígitos",
-            key="camera_capture"
-        )
+        if scanner.config.get_setting("client_crop"):
+            # Encuadre y recorte en el navegador (SCANNER_CLIENT_CROP)
+            client_crop_capture()
+        else:
+            # Componente de cámara
+            camera_image = st.camera_input(
+                "Toma una foto de los dígitos",
+                key="camera_capture"
+            )
         
-        if camera_image is not None:
-            try:
-                # Convertir y almacenar la imagen
-                image_bytes = camera_image.getvalue()
-                image_array = np.frombuffer(image_bytes, np.uint8)
-                captured_image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+            if camera_image is not None:
+                try:
+                    # Guardar el JPEG tal cual; se decodifica sólo cuando hace falta
+                    try:
+                        capture_id = scanner.get_capture_cache().put(camera_image.getvalue())
+                        # Persistir sólo la primera vez que se ve esta foto (no en cada rerun)
+                        store = get_store()
+                        if store is not None and capture_id != st.session_state.capture_id:
+                            store.add(camera_image.getvalue(), source="camera")
+                    except ValueError:
+                        capture_id = None
                 
-                # Verificar que la imagen se cargó correctamente
-                if captured_image is not None and captured_image.size > 0:
-                    st.session_state.captured_image = captured_image
-                    st.success("✅ ¡Imagen capturada! Ahora puedes alinear los dígitos.")
+                    # Verificar que la imagen se cargó correctamente
+                    if capture_id is not None:
+                        st.session_state.capture_id = capture_id
+                        st.success("✅ ¡Imagen capturada! Ahora puedes alinear los dígitos.")
                     
-                    if st.button("➡️ Continuar a Alineación", use_container_width=True, type="primary"):
-                        st.session_state.current_step = 2
-                        st.rerun()
-                else:
-                    st.error("❌ Error al procesar la imagen capturada")
+                        if st.button("➡️ Continuar a Alineación", use_container_width=True, type="primary"):
+                            st.session_state.current_step = 2
+                            st.rerun()
+                    else:
+                        st.error("❌ Error al procesar la imagen capturada")
                     
-            except Exception as e:
-                st.error(f"❌ Error al procesar la imagen: {e}")
+                except Exception as e:
+                    st.error(f"❌ Error al procesar la imagen: {e}")
 
     # PASO 2: ALINEAR DÍGITOS CON INTERACCIÓN TÁCTIL
     elif st.session_state.current_step == 2:
-        # Verificar que tenemos una imagen válida
-        if (st.session_state.captured_image is None or 
-            not hasattr(st.session_state.captured_image, 'size') or 
-            st.session_state.captured_image.size == 0):
+        # Verificar que tenemos una imagen válida (sin decodificarla: basta con que exista)
+        capture_id = st.session_state.capture_id
+        if capture_id not in scanner.get_capture_cache():
             
-            st.error("❌ No hay imagen válida capturada. Regresando al paso 1.")
+            st.error("❌ No hay imagen válida capturada (o caducó por inactividad). Regresando al paso 1.")
             st.session_state.current_step = 1
-            st.session_state.captured_image = None
+            st.session_state.capture_id = None
             st.rerun()
             return
         
@@ -451,8 +683,8 @@ def main():
         
         # Convertir imagen para mostrar
         try:
-            image_rgb = cv2.cvtColor(st.session_state.captured_image, cv2.COLOR_BGR2RGB)
-            pil_image = Image.fromarray(image_rgb)
+            # Vista previa reducida y cacheada: no se reconvierte la captura en cada rerun
+            preview = preview_jpeg(capture_id)
             
             # Mostrar contenedor interactivo
             st.markdown("""
@@ -463,7 +695,7 @@ def main():
             """, unsafe_allow_html=True)
             
             # Mostrar imagen como interactiva
-            st.image(pil_image, use_column_width=True, caption="Arrastra y haz zoom para alinear los dígitos", output_format="JPEG")
+            st.image(preview, use_column_width=True, caption="Arrastra y haz zoom para alinear los dígitos")
             
             st.markdown("</div>", unsafe_allow_html=True)
             
@@ -471,7 +703,7 @@ def main():
             st.error(f"❌ Error al mostrar la imagen: {e}")
             if st.button("🔄 Volver a Capturar", use_container_width=True):
                 st.session_state.current_step = 1
-                st.session_state.captured_image = None
+                st.session_state.capture_id = None
                 st.rerun()
             return
         
@@ -483,85 +715,67 @@ def main():
         </div>
         """, unsafe_allow_html=True)
         
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("↔️ Centrar Horizontal", use_container_width=True):
-                st.info("Imagen centrada horizontalmente")
-        
-        with col2:
-            if st.button("↕️ Centrar Vertical", use_container_width=True):
-                st.info("Imagen centrada verticalmente")
+        centering_controls()
         
         # Botones de acción principales
         st.markdown("---")
+        area_mode = st.radio(
+            "Área de análisis",
+            [AREA_AUTO, AREA_MANUAL],
+            horizontal=True,
+            help="La detección automática busca las líneas de dígitos en toda la imagen; "
+                 "el rectángulo central analiza siempre el área marcada en verde",
+        )
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
             if st.button("🔍 ANALIZAR DÍGITOS EN EL RECTÁNGULO", use_container_width=True, type="primary"):
-                # El rectángulo está fijo en el centro, calcular área relativa
-                with st.spinner("Analizando dígitos en el área seleccionada..."):
-                    try:
-                        # Coordenadas del rectángulo fijo (centro de la imagen)
-                        img_height, img_width = st.session_state.captured_image.shape[:2]
-                        
-                        # Tamaño del rectángulo (fijo)
-                        rect_width = 250
-                        rect_height = 120
-                        
-                        # Calcular posición centrada
-                        rect_x = (img_width - rect_width) // 2
-                        rect_y = (img_height - rect_height) // 2
-                        
-                        # Asegurar que las coordenadas estén dentro de la imagen
-                        rect_x = max(0, min(rect_x, img_width - rect_width))
-                        rect_y = max(0, min(rect_y, img_height - rect_height))
-                        
-                        # Extraer área del rectángulo
-                        roi = get_roi(st.session_state.captured_image, rect_x, rect_y, rect_width, rect_height)
-                        
-                        if roi is not None and roi.size > 0:
-                            # Mostrar área que se va a analizar
-                            with st.expander("🔍 Ver Área Exacta a Analizar", expanded=True):
-                                col_a, col_b = st.columns(2)
-                                with col_a:
-                                    st.image(
-                                        cv2.cvtColor(roi, cv2.COLOR_BGR2RGB),
-                                        use_column_width=True,
-                                        caption=f"Área del rectángulo ({roi.shape[1]}×{roi.shape[0]}px)"
-                                    )
-                                with col_b:
-                                    processed_roi = preprocess_image(roi)
-                                    st.image(
-                                        processed_roi,
-                                        use_container_width=True,
-                                        caption="Versión procesada",
-                                        clamp=True
-                                    )
-                            
-                            # Extraer dígitos
-                            digits, _ = extract_digits_with_api(roi)
-                            
-                            st.session_state.captured_digits = digits
-                            st.session_state.analysis_done = True
-                            st.session_state.current_step = 3
-                            
-                            st.rerun()
-                        else:
-                            st.error("❌ No se pudo extraer el área del rectángulo")
-                            
-                    except Exception as e:
-                        st.error(f"❌ Error al procesar el área seleccionada: {e}")
+                # Coordenadas del rectángulo fijo (centro de la imagen)
+                capture = scanner.get_capture_cache().get(capture_id)
+                if capture is None:
+                    # Expulsada de la caché entre el render y el clic
+                    st.warning("⚠️ La captura caducó por inactividad. Regresando al paso 1.")
+                    st.session_state.current_step = 1
+                    st.session_state.capture_id = None
+                    st.rerun()
+                    return
+                submit_analysis(capture_id, scanner.default_roi(capture.shape), area_mode == AREA_AUTO)
         
         # Botón para volver
         if st.button("🔄 Tomar Otra Foto", use_container_width=True, type="secondary"):
             st.session_state.current_step = 1
-            st.session_state.captured_image = None
+            st.session_state.capture_id = None
             st.rerun()
 
     # PASO 3: RESULTADOS
     elif st.session_state.current_step == 3:
         st.subheader("📊 Paso 3: Resultados del Análisis")
         
-        if (st.session_state.captured_digits and 
+        if not collect_job():
+            job_progress()
+
+            # Mostrar área que se está analizando (cacheada desde el paso 2)
+            rect = st.session_state.analysis_rect
+            if rect is not None and st.session_state.capture_id in scanner.get_capture_cache():
+                roi_rgb, processed_roi, timings = analysis_inputs(st.session_state.capture_id, rect)
+                with st.expander("🔍 Ver Área Exacta a Analizar", expanded=True):
+                    col_a, col_b = st.columns(2)
+                    with col_a:
+                        st.image(
+                            roi_rgb,
+                            use_column_width=True,
+                            caption=f"Área del rectángulo ({roi_rgb.shape[1]}×{roi_rgb.shape[0]}px)"
+                        )
+                    with col_b:
+                        # Lo que se muestra es exactamente lo que se reconoce
+                        st.image(
+                            processed_roi,
+                            use_container_width=True,
+                            caption="Versión procesada",
+                            clamp=True
+                        )
+                        st.caption(" · ".join(f"{name} {ms:.1f} ms" for name, ms in timings))
+
+        elif (st.session_state.captured_digits and 
             not st.session_state.captured_digits.startswith("Error") and 
             not st.session_state.captured_digits.startswith("No se")):
             
@@ -570,6 +784,9 @@ def main():
                        unsafe_allow_html=True)
             
             st.success(f"✅ ¡Éxito! Se detectaron {len(st.session_state.captured_digits)} dígitos.")
+            if st.session_state.get('detected_roi'):
+                x, y, w, h = st.session_state.detected_roi
+                st.caption(f"🎯 Área detectada automáticamente: {w}×{h}px en ({x}, {y})")
             
             # Botones de acción
             col1, col2, col3 = st.columns(3)
@@ -580,14 +797,12 @@ def main():
             
             with col2:
                 if st.button("🔁 Re-alinear", use_container_width=True):
-                    st.session_state.current_step = 2
-                    st.session_state.analysis_done = False
-                    st.rerun()
+                    realign()
             
             with col3:
                 if st.button("🔄 Nueva Foto", use_container_width=True):
                     st.session_state.current_step = 1
-                    st.session_state.captured_image = None
+                    st.session_state.capture_id = None
                     st.session_state.captured_digits = ""
                     st.session_state.analysis_done = False
                     st.rerun()
@@ -603,17 +818,31 @@ def main():
             - Intenta alinear mejor en el paso anterior
             """)
             
-            col1, col2 = st.columns(2)
+            col1, col2, col3 = st.columns(3)
             with col1:
                 if st.button("↩️ Re-alinear", use_container_width=True):
-                    st.session_state.current_step = 2
-                    st.session_state.analysis_done = False
-                    st.rerun()
+                    realign()
             
             with col2:
+                # Repetir el mismo análisis (p. ej. tras un timeout o un límite de la API)
+                if st.button("🔁 Reintentar", use_container_width=True,
+                             disabled=not st.session_state.get('last_job_id')):
+                    try:
+                        job_id = scanner.get_job_queue().retry(st.session_state.last_job_id)
+                    except KeyError:
+                        st.warning("⚠️ El análisis anterior caducó; vuelve a alinear la imagen")
+                    except scanner.errors.QueueFullError as e:
+                        st.warning(f"⏳ {e}")
+                    else:
+                        st.session_state.job_id = job_id
+                        st.session_state.last_job_id = job_id
+                        st.session_state.analysis_done = False
+                        st.rerun()
+            
+            with col3:
                 if st.button("🔄 Nueva Foto", use_container_width=True):
                     st.session_state.current_step = 1
-                    st.session_state.captured_image = None
+                    st.session_state.capture_id = None
                     st.session_state.captured_digits = ""
                     st.session_state.analysis_done = False
                     st.rerun()
@@ -0,0 +1 @@
+# Componentes de Streamlit propios (HTML/JS estático, sin paso de compilación)
@@ -0,0 +1,67 @@
+"""Cámara con encuadre y recorte en el navegador
+
+El usuario mueve y amplía la imagen bajo el rectángulo verde; al capturar, el
+navegador recorta ese rectángulo de la foto a resolución nativa (opcionalmente
+reducido a ``max_height`` px de alto) y sólo envía ese JPEG al servidor, junto
+con la transformación usada. El servidor no recibe ni decodifica la foto
+completa, y el área analizada es exactamente la que se alineó.
+"""
+import base64
+import binascii
+import os
+from dataclasses import dataclass
+
+import streamlit.components.v1 as components
+
+_FRONTEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend")
+_roi_crop = components.declare_component("roi_crop", path=_FRONTEND)
+
+
+@dataclass
+class ClientCrop:
+    """Recorte devuelto por el navegador"""
+    data: bytes          # JPEG del ROI
+    width: int
+    height: int
+    roi: tuple           # (x, y, ancho, alto) en píxeles de la foto original
+    source: tuple        # (ancho, alto) de la foto original
+    zoom: float = 1.0
+    pan: tuple = (0.0, 0.0)
+    scale: float = 1.0   # reducción aplicada al ROI antes de enviarlo
+
+    @classmethod
+    def from_value(cls, value):
+        try:
+            data = base64.b64decode(value["image"], validate=True)
+        except (KeyError, TypeError, binascii.Error) as e:
+            raise ValueError(f"Recorte no válido: {e}") from e
+        return cls(
+            data=data,
+            width=int(value["width"]),
+            height=int(value["height"]),
+            roi=tuple(int(v) for v in value["roi"]),
+            source=tuple(int(v) for v in value["source"]),
+            zoom=float(value.get("zoom", 1.0)),
+            pan=tuple(float(v) for v in value.get("pan", (0.0, 0.0))),
+            scale=float(value.get("scale", 1.0)),
+        )
+
+    @property
+    def sent_fraction(self):
+        """Fracción de los píxeles de la foto que llegaron al servidor"""
+        total = self.source[0] * self.source[1]
+        return (self.width * self.height) / float(total) if total else 0.0
+
+
+def roi_camera(roi_width=250, roi_height=120, max_height=0, quality=0.9, height=360, key=None):
+    """Muestra la cámara con el rectángulo de análisis; devuelve un ClientCrop o None
+
+    ``roi_width``×``roi_height`` es el tamaño del rectángulo en el visor (px de
+    pantalla), ``max_height`` la altura máxima del recorte enviado (0 = sin
+    reducir) y ``quality`` la calidad JPEG (0-1).
+    """
+    value = _roi_crop(roi_width=roi_width, roi_height=roi_height, max_height=max_height,
+                      quality=quality, height=height, key=key, default=None)
+    if not value:
+        return None
+    return ClientCrop.from_value(value)
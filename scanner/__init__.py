@@ -0,0 +1,105 @@
+"""Núcleo del escáner de dígitos, independiente de Streamlit
+
+Los nombres públicos se importan la primera vez que se usan (PEP 562): ``import
+scanner`` no carga OpenCV, NumPy ni requests hasta que un código los necesita,
+lo que acorta el arranque en frío de la aplicación.
+"""
+import importlib
+
+# Nombre público → submódulo que lo define
+_EXPORTS = {
+    "parse_rois": "batch",
+    "recognize_batch": "batch",
+    "CachedRecognizer": "cache",
+    "MemoryCache": "cache",
+    "SQLiteCache": "cache",
+    "get_cache": "cache",
+    "CaptureCache": "captures",
+    "get_capture_cache": "captures",
+    "Candidate": "detect",
+    "propose_regions": "detect",
+    "recognize_best_region": "detect",
+    "ErrorKind": "errors",
+    "ScannerError": "errors",
+    "FrameContext": "frame",
+    "DigitFormat": "formats",
+    "best_valid": "formats",
+    "parse_formats": "formats",
+    "register_format": "formats",
+    "DEFAULT_ROI": "imaging",
+    "NormalizedROI": "imaging",
+    "centered_roi": "imaging",
+    "default_roi": "imaging",
+    "get_roi": "imaging",
+    "image_to_base64": "imaging",
+    "preprocess_image": "imaging",
+    "resolve_roi": "imaging",
+    "JobQueue": "jobs",
+    "get_job_queue": "jobs",
+    "KeyManager": "keys",
+    "get_key_manager": "keys",
+    "AsyncOCRSpaceClient": "ocr_client",
+    "CircuitBreaker": "ocr_client",
+    "OCRSpaceClient": "ocr_client",
+    "ScanPipeline": "pipeline",
+    "PreprocessPipeline": "preprocess",
+    "build_pipeline": "preprocess",
+    "get_preprocessor": "preprocess",
+    "register_stage": "preprocess",
+    "EnsembleRecognizer": "recognizers",
+    "FallbackRecognizer": "recognizers",
+    "LocalDigitRecognizer": "recognizers",
+    "OCRSpaceRecognizer": "recognizers",
+    "RecognitionResult": "recognizers",
+    "Recognizer": "recognizers",
+    "ValidatingRecognizer": "recognizers",
+    "get_recognizer": "recognizers",
+    "register_recognizer": "recognizers",
+    "validate_results": "recognizers",
+    "ResultLog": "results",
+    "ResultRecord": "results",
+    "export_csv": "results",
+    "export_jsonl": "results",
+    "get_result_log": "results",
+    "iter_records": "results",
+    "load_image": "scan",
+    "scan_file": "scan",
+    "scan_image": "scan",
+    "scan_paths": "scan",
+    "CaptureStore": "store",
+    "Variant": "sweep",
+    "recognize_sweep": "sweep",
+    "sweep_if_unreliable": "sweep",
+    "sweep_variants": "sweep",
+    "get_store": "store",
+    "UploadImage": "upload",
+    "optimize_for_upload": "upload",
+    "DigitVoter": "video",
+    "FrameSelector": "video",
+    "LiveScanner": "video",
+    "iter_video_frames": "video",
+    "scan_stream": "video",
+    "score_frame": "video",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        # Submódulos (scanner.config, scanner.metrics...) también bajo demanda
+        try:
+            return importlib.import_module(f".{name}", __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # Cachear en el módulo: las siguientes búsquedas no pasan por aquí
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
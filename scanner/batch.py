@@ -0,0 +1,153 @@
+"""Escaneo por lotes: varios ROIs en una sola petición OCR mediante un mosaico"""
+import cv2
+import numpy as np
+
+from .config import get_setting
+from .errors import ErrorKind, OCRError
+from .formats import parse_formats
+from .imaging import NormalizedROI
+from .metrics import inc
+from .recognizers import RecognitionResult, digits_from_text, validate_results
+from .upload import optimize_for_upload
+
+
+def parse_rois(text):
+    """Convierte 'x,y,w,h; x,y,w,h' en una lista de ROIs
+
+    Los valores enteros son píxeles (esquina superior izquierda, ancho y alto;
+    ninguno negativo).
+    Si los cuatro valores son fracciones entre 0 y 1 (p. ej. '0.5,0.5,0.4,0.25')
+    se interpretan como centro y tamaño relativos (NormalizedROI), válidos para
+    cualquier resolución.
+    """
+    rois = []
+    for chunk in text.replace("\n", ";").split(";"):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        try:
+            values = [float(v) for v in chunk.split(",")]
+        except ValueError:
+            values = []
+        if len(values) != 4 or values[0] < 0 or values[1] < 0 or values[2] <= 0 or values[3] <= 0:
+            raise ValueError(f"ROI inválido: '{chunk}' (formato x,y,ancho,alto, sin negativos)")
+        if "." in chunk and all(0 <= v <= 1 for v in values):
+            rois.append(NormalizedROI(*values))
+        else:
+            rois.append(tuple(int(v) for v in values))
+    return rois
+
+
+def tile_crops(crops, padding=None):
+    """Apila los recortes en vertical sobre fondo blanco; devuelve el mosaico y sus cajas"""
+    padding = padding if padding is not None else get_setting("batch_padding")
+    crops = [c if len(c.shape) == 3 else cv2.cvtColor(c, cv2.COLOR_GRAY2BGR) for c in crops]
+
+    width = max(c.shape[1] for c in crops) + 2 * padding
+    height = sum(c.shape[0] for c in crops) + padding * (len(crops) + 1)
+    composite = np.full((height, width, 3), 255, np.uint8)
+
+    boxes = []
+    y = padding
+    for crop in crops:
+        h, w = crop.shape[:2]
+        composite[y:y + h, padding:padding + w] = crop
+        boxes.append((padding, y, w, h))
+        y += h + padding
+    return composite, boxes
+
+
+def assign_overlay_text(result, boxes, padding=None):
+    """Reparte las palabras del TextOverlay entre las cajas del mosaico según su centro"""
+    padding = padding if padding is not None else get_setting("batch_padding")
+    words_per_box = [[] for _ in boxes]
+
+    for parsed in result.get("ParsedResults", []):
+        overlay = parsed.get("TextOverlay") or {}
+        for line in overlay.get("Lines", []):
+            for word in line.get("Words", []):
+                center_y = word["Top"] + word["Height"] / 2.0
+                for index, (_, y, _, h) in enumerate(boxes):
+                    # La mitad del margen pertenece a cada caja vecina
+                    if y - padding / 2.0 <= center_y < y + h + padding / 2.0:
+                        words_per_box[index].append((word["Left"], word["WordText"]))
+                        break
+
+    return [" ".join(text for _, text in sorted(words)) for words in words_per_box]
+
+
+def recognize_tiled(crops, client, max_tiles=None):
+    """Reconoce los recortes con una petición OCR por grupo de max_tiles recortes"""
+    max_tiles = max_tiles or get_setting("batch_max_tiles")
+    results = []
+
+    for start in range(0, len(crops), max_tiles):
+        group = crops[start:start + max_tiles]
+        composite, boxes = tile_crops(group)
+
+        try:
+            upload = optimize_for_upload(composite)
+            if upload is None:
+                raise OCRError("Error procesando imagen")
+            response = client.parse_image(upload.base64, overlay=True, mime=upload.mime)
+            # Las coordenadas del overlay están en la escala de la imagen subida
+            scaled = [tuple(v * upload.scale for v in box) for box in boxes]
+            texts = assign_overlay_text(response, scaled,
+                                        padding=get_setting("batch_padding") * upload.scale)
+        except OCRError as e:
+            results.extend(RecognitionResult(error=f"Error API: {e}", error_kind=e.kind, engine="api")
+                           for _ in group)
+            continue
+
+        for text in texts:
+            digits, confidences = digits_from_text(text)
+            if digits:
+                results.append(RecognitionResult(digits=digits, confidence=float(np.mean(confidences)),
+                                                 glyph_confidences=confidences, engine="api"))
+            else:
+                results.append(RecognitionResult(error="No se encontraron dígitos",
+                                                 error_kind=ErrorKind.NO_DIGITS, engine="api"))
+    return results
+
+
+def recognize_batch(crops, client=None, local=None, min_confidence=None, formats=None):
+    """Lee un lote de ROIs: primero el motor local y el resto en mosaicos remotos
+
+    Con formatos (``formats`` o SCANNER_DIGIT_FORMATS) una lectura local que
+    no los cumple también pasa a la API, y al final cada ROI se valida
+    combinando su lectura local y la remota (validate_results).
+    """
+    min_confidence = (min_confidence if min_confidence is not None
+                      else get_setting("local_min_confidence"))
+    formats = formats if formats is not None else get_setting("digit_formats")
+    formats = parse_formats(formats) if isinstance(formats, str) else list(formats)
+    results = [None] * len(crops)
+    local_results = [None] * len(crops)
+
+    if local is not None:
+        for index, crop in enumerate(crops):
+            result = local_results[index] = local.recognize(crop)
+            valid = not formats or any(f.matches(result.digits) for f in formats)
+            if client is None or (result.ok and result.confidence >= min_confidence and valid):
+                results[index] = result
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending and client is not None:
+        remote = recognize_tiled([crops[i] for i in pending], client)
+        for index, result in zip(pending, remote):
+            # Si la API falla se conserva la lectura local, aunque sea dudosa
+            fallback = local_results[index]
+            results[index] = result if result.ok or fallback is None or not fallback.ok else fallback
+
+    if formats:
+        for index, result in enumerate(results):
+            if result is None:
+                continue
+            readings = [result]
+            if local_results[index] is not None and local_results[index] is not result:
+                readings.append(local_results[index])
+            checked = results[index] = validate_results(readings, formats)
+            if result.ok:
+                outcome = "invalid" if not checked.ok else "corrected" if checked.corrections else "valid"
+                inc("scanner_postprocess_total", outcome=outcome)
+    return results
@@ -0,0 +1,331 @@
+"""Benchmark de latencia, rendimiento, memoria y precisión sobre capturas etiquetadas
+
+El corpus es un directorio de imágenes y un ``labels.json`` con los dígitos
+esperados de cada una ("" = la captura no contiene dígitos). El motor remoto
+se mide contra el servidor stub local salvo que se pida la API real.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from .detect import propose_regions
+from .ocr_client import OCRSpaceClient
+from .pipeline import ScanPipeline
+from .preprocess import build_pipeline
+from .recognizers import get_recognizer
+from .scan import crop_rois, iter_image_paths, load_image
+from .stub_server import start_stub_server
+from .upload import optimize_for_upload
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Etapas medidas, en el orden en que se ejecutan
+STAGES = ("decode", "detect", "crop", "preprocess", "encode", "recognize")
+# Margen tolerado antes de considerar una regresión
+DEFAULT_TOLERANCE = 0.2
+
+
+def load_corpus(directory, labels_path=None):
+    """Lista de (ruta, dígitos esperados o None si la imagen no está etiquetada)"""
+    labels_path = labels_path or os.path.join(directory, "labels.json")
+    labels = {}
+    if os.path.exists(labels_path):
+        with open(labels_path, encoding="utf-8") as f:
+            labels = json.load(f)
+    return [(path, labels.get(os.path.basename(path))) for path in iter_image_paths([directory])]
+
+
+def percentiles(values):
+    """Resumen p50/p95/p99 y media (en ms) de una lista de tiempos"""
+    if not values:
+        return {"count": 0}
+    data = np.asarray(values, dtype=float)
+    return {
+        "count": int(data.size),
+        "mean": round(float(data.mean()), 3),
+        "p50": round(float(np.percentile(data, 50)), 3),
+        "p95": round(float(np.percentile(data, 95)), 3),
+        "p99": round(float(np.percentile(data, 99)), 3),
+    }
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MB (None si no se puede medir)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa en KB y macOS en bytes
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def edit_distance(a, b):
+    """Distancia de Levenshtein entre dos cadenas"""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def char_accuracy(expected, digits):
+    """1 - distancia de edición normalizada (1.0 = lectura perfecta)"""
+    length = max(len(expected), len(digits))
+    if length == 0:
+        return 1.0
+    return max(0.0, 1.0 - edit_distance(expected, digits) / float(length))
+
+
+def _timed(timings, stage, func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    timings[stage].append((time.perf_counter() - start) * 1000)
+    return value
+
+
+def run_stages(corpus, recognizer, rois=None, preprocess=None, detect=False, encode=False, repeat=1):
+    """Escanea el corpus en serie midiendo cada etapa por separado
+
+    Devuelve (tiempos por etapa, lecturas por imagen, segundos totales). En las
+    imágenes con detección se conserva la lectura más confiable; ``recognize``
+    incluye la codificación que haga el propio motor, ``encode`` la mide aparte.
+    """
+    preprocess = preprocess or build_pipeline()
+    timings = {stage: [] for stage in STAGES}
+    readings = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path, expected in corpus:
+            image = _timed(timings, "decode", load_image, path)
+            if detect and not rois:
+                candidates = _timed(timings, "detect", propose_regions, image)
+                boxes = [c.roi for c in candidates]
+                crops = _timed(timings, "crop", lambda: crop_rois(image, boxes or None))
+            else:
+                crops = _timed(timings, "crop", crop_rois, image, rois)
+
+            best = None
+            for roi, crop in crops:
+                if crop is None:
+                    continue
+                processed = _timed(timings, "preprocess", preprocess, crop)
+                if encode:
+                    _timed(timings, "encode", optimize_for_upload, processed)
+                result = _timed(timings, "recognize", recognizer.recognize, processed)
+                if best is None or (result.ok and (not best.ok or result.confidence > best.confidence)):
+                    best = result
+            readings.append({
+                "source": os.path.basename(path),
+                "expected": expected,
+                "digits": best.digits if best is not None else "",
+                "confidence": round(best.confidence, 4) if best is not None else 0.0,
+            })
+    return timings, readings, time.perf_counter() - start
+
+
+def accuracy(readings):
+    """Precisión sobre las lecturas etiquetadas: exacta, por carácter y rechazos correctos"""
+    labelled = [r for r in readings if r["expected"] is not None]
+    with_digits = [r for r in labelled if r["expected"]]
+    without_digits = [r for r in labelled if not r["expected"]]
+    if not labelled:
+        return {"labelled": 0}
+    return {
+        "labelled": len(labelled),
+        "exact": round(sum(r["digits"] == r["expected"] for r in with_digits) / float(len(with_digits) or 1), 4),
+        "char": round(float(np.mean([char_accuracy(r["expected"], r["digits"]) for r in with_digits]))
+                      if with_digits else 1.0, 4),
+        # Capturas sin dígitos en las que el motor no inventó una lectura
+        "rejected": round(sum(not r["digits"] for r in without_digits) / float(len(without_digits) or 1), 4),
+    }
+
+
+def pipeline_throughput(paths, recognizer, rois=None, preprocess=None, detect=False, processes=2, threads=None):
+    """Imágenes por segundo del pipeline multiproceso completo"""
+    pipeline = ScanPipeline(recognizer, rois=rois, processes=processes, threads=threads,
+                            preprocess=preprocess, detect=detect)
+    start = time.perf_counter()
+    count = sum(1 for _ in pipeline.run(paths))
+    elapsed = time.perf_counter() - start
+    return {"records": count, "seconds": round(elapsed, 3),
+            "images_per_second": round(len(paths) / elapsed, 2) if elapsed else None}
+
+
+def run_benchmark(directory="temp", labels_path=None, engine="local", rois=None, preprocess_spec=None,
+                  detect=False, repeat=1, processes=0, live=False, stub_text="12345"):
+    """Ejecuta el benchmark completo y devuelve el informe serializable a JSON"""
+    corpus = load_corpus(directory, labels_path)
+    if not corpus:
+        raise ValueError(f"No hay imágenes en {directory}")
+    preprocess = build_pipeline(preprocess_spec)
+
+    server = recognizer = None
+    options = {}
+    if engine in ("api", "auto") and not live:
+        # La API remota se sustituye por el stub local para medir sin red ni cuotas
+        server = start_stub_server(text=stub_text)
+        options["client"] = OCRSpaceClient(url=server.url, api_key="bench")
+    try:
+        recognizer = get_recognizer(engine, **options)
+        # Primera pasada sin medir: carga de plantillas, conexiones, cachés de OpenCV
+        run_stages(corpus[:1], recognizer, rois, preprocess, detect)
+        timings, readings, seconds = run_stages(corpus, recognizer, rois, preprocess, detect,
+                                                encode=engine in ("api", "auto"), repeat=repeat)
+        report = {
+            "engine": engine,
+            "stub": server is not None,
+            "preprocess": repr(preprocess),
+            "detect": detect,
+            "images": len(corpus),
+            "repeat": repeat,
+            "stages": {stage: percentiles(values) for stage, values in timings.items() if values},
+            "throughput": {"images_per_second": round(len(corpus) * repeat / seconds, 2),
+                           "seconds": round(seconds, 3)},
+            "accuracy": accuracy(readings[:len(corpus)]),
+            "readings": readings[:len(corpus)],
+        }
+        if processes:
+            report["pipeline"] = pipeline_throughput([path for path, _ in corpus], recognizer, rois,
+                                                     preprocess, detect, processes)
+        report["peak_rss_mb"] = peak_rss_mb()
+        return report
+    finally:
+        if recognizer is not None:
+            recognizer.close()
+        if server is not None:
+            server.shutdown()
+
+
+# Módulos pesados cuya carga durante el primer render se informa
+HEAVY_MODULES = ("cv2", "numpy", "PIL", "requests", "streamlit_webrtc")
+
+# Se ejecuta en un intérprete nuevo para cada medida de arranque en frío
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_ms = (time.perf_counter() - start) * 1000
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+first = time.perf_counter()
+app.run()
+first_ms = (time.perf_counter() - first) * 1000
+loaded = [name for name in json.loads(sys.argv[3]) if name in sys.modules]
+reruns = []
+for _ in range(int(sys.argv[2])):
+    rerun = time.perf_counter()
+    app.run()
+    reruns.append((time.perf_counter() - rerun) * 1000)
+print(json.dumps({"streamlit_ms": streamlit_ms, "first_run_ms": first_ms, "reruns_ms": reruns,
+                  "loaded": loaded, "errors": [str(e.value) for e in app.exception]}))
+"""
+
+
+def startup_benchmark(app_path="app.py", runs=3, reruns=10):
+    """Arranque en frío de la aplicación y coste de cada rerun del script
+
+    Cada pasada lanza un intérprete nuevo que importa Streamlit, ejecuta el
+    script una vez (lo que ve el primer usuario de un contenedor recién
+    creado) y lo vuelve a ejecutar ``reruns`` veces. ``cold_start`` va desde
+    el lanzamiento del proceso hasta el final del primer render.
+    """
+    cold, streamlit_import, first_run, rerun_times = [], [], [], []
+    loaded, errors = set(), set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", _STARTUP_SCRIPT, os.path.abspath(app_path), str(reruns),
+             json.dumps(HEAVY_MODULES)],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(app_path)),
+        ).stdout
+        elapsed = (time.perf_counter() - start) * 1000
+        result = json.loads(output.strip().splitlines()[-1])
+        # El proceso sigue vivo durante los reruns: restarlos del tiempo total
+        cold.append(elapsed - sum(result["reruns_ms"]))
+        streamlit_import.append(result["streamlit_ms"])
+        first_run.append(result["first_run_ms"])
+        rerun_times.extend(result["reruns_ms"])
+        loaded.update(result["loaded"])
+        errors.update(result["errors"])
+    return {
+        "app": app_path,
+        "runs": runs,
+        "cold_start": percentiles(cold),
+        "streamlit_import": percentiles(streamlit_import),
+        "first_run": percentiles(first_run),
+        "rerun": percentiles(rerun_times),
+        "heavy_modules_loaded": sorted(loaded),
+        "errors": sorted(errors),
+    }
+
+
+def format_startup_report(report):
+    """Resumen legible del benchmark de arranque"""
+    lines = [f"Aplicación: {report['app']} · {report['runs']} arranques en frío"]
+    lines.append(f"{'fase':<18}{'p50':>10}{'p95':>10}   (ms)")
+    for label, key in (("arranque en frío", "cold_start"), ("import streamlit", "streamlit_import"),
+                       ("primer render", "first_run"), ("rerun", "rerun")):
+        stats = report[key]
+        if stats["count"]:
+            lines.append(f"{label:<18}{stats['p50']:>10.1f}{stats['p95']:>10.1f}")
+    lines.append("Módulos pesados en el primer render: " + (", ".join(report["heavy_modules_loaded"]) or "ninguno"))
+    for error in report["errors"]:
+        lines.append(f"Error en el script: {error}")
+    return "\n".join(lines)
+
+
+def compare_reports(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Regresiones de ``current`` respecto a ``baseline`` como lista de mensajes
+
+    Se compara el p95 de cada etapa, el rendimiento y la precisión; una
+    diferencia dentro de ``tolerance`` (fracción) no cuenta como regresión.
+    """
+    problems = []
+    for stage, stats in current.get("stages", {}).items():
+        old = baseline.get("stages", {}).get(stage, {}).get("p95")
+        new = stats.get("p95")
+        # Por debajo de 1 ms el ruido de medida domina
+        if old and new and new > max(old * (1 + tolerance), old + 1.0):
+            problems.append(f"{stage}: p95 {old:.2f} → {new:.2f} ms")
+
+    old = baseline.get("throughput", {}).get("images_per_second")
+    new = current.get("throughput", {}).get("images_per_second")
+    if old and new and new < old * (1 - tolerance):
+        problems.append(f"rendimiento: {old:.2f} → {new:.2f} imágenes/s")
+
+    for metric in ("exact", "char", "rejected"):
+        old = baseline.get("accuracy", {}).get(metric)
+        new = current.get("accuracy", {}).get(metric)
+        # La precisión es determinista: cualquier bajada cuenta
+        if old is not None and new is not None and new < old:
+            problems.append(f"precisión {metric}: {old:.3f} → {new:.3f}")
+    return problems
+
+
+def format_report(report):
+    """Resumen legible del informe"""
+    lines = [f"Motor: {report['engine']}{' (stub)' if report['stub'] else ''} · "
+             f"preprocesado: {report['preprocess']} · {report['images']} imágenes × {report['repeat']}"]
+    lines.append(f"{'etapa':<12}{'p50':>10}{'p95':>10}{'p99':>10}   (ms)")
+    for stage, stats in report["stages"].items():
+        lines.append(f"{stage:<12}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}")
+    lines.append(f"Rendimiento: {report['throughput']['images_per_second']} imágenes/s")
+    if "pipeline" in report:
+        lines.append(f"Pipeline multiproceso: {report['pipeline']['images_per_second']} imágenes/s")
+    acc = report["accuracy"]
+    if acc.get("labelled"):
+        lines.append(f"Precisión: exacta {acc['exact']:.1%} · por carácter {acc['char']:.1%} · "
+                     f"rechazos correctos {acc['rejected']:.1%} ({acc['labelled']} etiquetadas)")
+    if report.get("peak_rss_mb") is not None:
+        lines.append(f"Pico de memoria: {report['peak_rss_mb']} MB")
+    return "\n".join(lines)
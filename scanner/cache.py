@@ -0,0 +1,252 @@
+"""Caché de resultados OCR indexada por el contenido del ROI"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+
+import cv2
+import numpy as np
+
+from .config import get_setting
+from .recognizers import RecognitionResult, Recognizer
+
+
+# ========== CLAVES ==========
+def exact_hash(image):
+    """Hash SHA-256 de los píxeles (incluye forma y tipo del array)"""
+    digest = hashlib.sha256()
+    digest.update(f"{image.shape}:{image.dtype}".encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+def perceptual_hash(image, size=8):
+    """dHash de 64 bits: tolera recompresión JPEG y pequeños cambios de brillo"""
+    if len(image.shape) == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return f"{value:016x}"
+
+
+def hamming_distance(hash_a, hash_b):
+    """Número de bits distintos entre dos hashes perceptuales"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+def roi_key(image, namespace="", mode="exact"):
+    """Clave de caché de un ROI; el espacio de nombres separa motores"""
+    digest = perceptual_hash(image) if mode == "phash" else exact_hash(image)
+    return f"{namespace}:{mode}:{digest}"
+
+
+# ========== BACKENDS ==========
+class CacheStats:
+    """Contadores de aciertos y fallos de una caché"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+class MemoryCache:
+    """Caché LRU en memoria del proceso con caducidad por TTL"""
+
+    def __init__(self, max_entries=1024, ttl=None, max_distance=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Distancia de Hamming tolerada para claves perceptuales
+        self.max_distance = max_distance
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def _find_near(self, key):
+        prefix, _, digest = key.rpartition(":")
+        if self.max_distance <= 0 or not prefix.endswith(":phash"):
+            return None
+        for other in reversed(self._entries):
+            other_prefix, _, other_digest = other.rpartition(":")
+            if other_prefix == prefix and hamming_distance(digest, other_digest) <= self.max_distance:
+                return other
+        return None
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                key = self._find_near(key)
+            if key is not None:
+                value, stored_at = self._entries[key]
+                if not self._expired(stored_at):
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return value
+                del self._entries[key]
+                self.stats.evictions += 1
+            self.stats.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """Caché en disco compartida entre sesiones y procesos de Streamlit"""
+
+    def __init__(self, path, max_entries=10000, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_accessed ON ocr_cache (accessed)")
+
+    def _connect(self):
+        # Una conexión por operación: seguro entre hilos y procesos
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created FROM ocr_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                self.stats.evictions += 1
+                row = None
+            if row is None:
+                self.stats.misses += 1
+                return None
+            conn.execute("UPDATE ocr_cache SET accessed = ? WHERE key = ?", (now, key))
+            self.stats.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, value, created, accessed)"
+                " VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            # Desalojo LRU: conservar las max_entries usadas más recientemente
+            removed = conn.execute(
+                "DELETE FROM ocr_cache WHERE key IN ("
+                " SELECT key FROM ocr_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self.stats.evictions += max(removed, 0)
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM ocr_cache")
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+
+
+CACHE_BACKENDS = {
+    "memory": lambda: MemoryCache(
+        max_entries=get_setting("cache_max_entries"),
+        ttl=get_setting("cache_ttl") or None,
+        max_distance=get_setting("cache_phash_distance"),
+    ),
+    "sqlite": lambda: SQLiteCache(
+        get_setting("cache_path"),
+        max_entries=get_setting("cache_max_entries"),
+        ttl=get_setting("cache_ttl") or None,
+    ),
+}
+
+
+def get_cache(backend=None):
+    """Construye el backend configurado (SCANNER_CACHE_BACKEND) o None si está desactivado"""
+    backend = backend or get_setting("cache_backend")
+    if backend in ("off", "none"):
+        return None
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"Backend de caché desconocido: {backend}")
+    return CACHE_BACKENDS[backend]()
+
+
+# ========== RECONOCEDOR CON CACHÉ ==========
+class CachedRecognizer(Recognizer):
+    """Envuelve un motor y reutiliza sus lecturas para ROIs ya vistos"""
+
+    def __init__(self, recognizer, cache, key_mode=None):
+        self.recognizer = recognizer
+        self.cache = cache
+        self.key_mode = key_mode or get_setting("cache_key")
+        self.name = recognizer.name
+
+    def recognize(self, image):
+        start = time.perf_counter()
+        key = roi_key(image, namespace=self.name, mode=self.key_mode)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            result = RecognitionResult(**cached)
+            result.cached = True
+            result.elapsed_ms = (time.perf_counter() - start) * 1000
+            return result
+
+        result = self.recognizer.recognize(image)
+        # Sólo se guardan lecturas válidas: los errores pueden ser transitorios
+        if result.ok:
+            self.cache.set(key, asdict(result))
+        return result
+
+    def close(self):
+        self.recognizer.close()
@@ -0,0 +1,178 @@
+"""Capturas de sesión: bytes comprimidos compartidos y decodificación bajo demanda
+
+Las sesiones sólo guardan el ``capture_id``; el JPEG original vive una vez en
+el proceso y las versiones decodificadas (imagen completa y vista previa
+reducida) se cachean con un límite de entradas. Las capturas sin uso durante
+``idle_ttl`` segundos, o las más antiguas si se supera ``max_bytes``, se
+descartan: la sesión debe volver a capturar.
+"""
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .config import get_setting
+from .metrics import timed
+
+
+@dataclass
+class Capture:
+    """Captura comprimida tal como llegó de la cámara"""
+    data: bytes
+    width: int
+    height: int
+    last_access: float
+
+    @property
+    def shape(self):
+        return self.height, self.width, 3
+
+
+class CaptureCache:
+    """Almacén de capturas por proceso con expulsión por inactividad y por tamaño"""
+
+    def __init__(self, max_bytes=None, idle_ttl=None, decoded_entries=None, preview_side=None):
+        self.max_bytes = max_bytes or get_setting("capture_max_bytes")
+        self.idle_ttl = idle_ttl or get_setting("capture_idle_ttl")
+        self.decoded_entries = decoded_entries or get_setting("capture_decoded_entries")
+        self.preview_side = preview_side or get_setting("capture_preview_side")
+        self._lock = threading.Lock()
+        self._captures = OrderedDict()   # capture_id → Capture, de menos a más reciente
+        self._decoded = OrderedDict()    # (capture_id, tipo) → ndarray
+        self._bytes = 0
+        self.evictions = 0
+
+    def put(self, data):
+        """Guarda los bytes de una imagen y devuelve su capture_id
+
+        Sólo se lee la cabecera para validar la imagen y conocer su tamaño; la
+        misma imagen enviada dos veces comparte entrada.
+        """
+        data = bytes(data)
+        try:
+            with Image.open(io.BytesIO(data)) as probe:
+                width, height = probe.size
+        except Exception as e:
+            raise ValueError(f"Imagen no válida: {e}") from e
+
+        capture_id = hashlib.sha256(data).hexdigest()[:24]
+        with self._lock:
+            existing = self._captures.pop(capture_id, None)
+            if existing is not None:
+                self._bytes -= len(existing.data)
+            self._captures[capture_id] = Capture(data, width, height, time.monotonic())
+            self._bytes += len(data)
+            self._evict()
+        return capture_id
+
+    def get(self, capture_id):
+        """Capture (y la marca como usada) o None si no existe o caducó"""
+        with self._lock:
+            self._evict()
+            capture = self._captures.get(capture_id)
+            if capture is not None:
+                capture.last_access = time.monotonic()
+                self._captures.move_to_end(capture_id)
+            return capture
+
+    def __contains__(self, capture_id):
+        return capture_id is not None and self.get(capture_id) is not None
+
+    def discard(self, capture_id):
+        with self._lock:
+            capture = self._captures.pop(capture_id, None)
+            if capture is not None:
+                self._bytes -= len(capture.data)
+            for key in [key for key in self._decoded if key[0] == capture_id]:
+                del self._decoded[key]
+
+    def image(self, capture_id):
+        """Imagen BGR completa (decodificada bajo demanda), o None si caducó"""
+        return self._derived(capture_id, "bgr", _decode)
+
+    def preview(self, capture_id):
+        """Vista previa RGB reducida a ``preview_side`` px de lado mayor, o None"""
+        return self._derived(capture_id, "preview", lambda data: _preview(data, self.preview_side))
+
+    def _derived(self, capture_id, kind, build):
+        capture = self.get(capture_id)
+        if capture is None:
+            return None
+        key = (capture_id, kind)
+        with self._lock:
+            array = self._decoded.get(key)
+            if array is not None:
+                self._decoded.move_to_end(key)
+                return array
+        array = build(capture.data)
+        # Las sesiones no deben modificar una imagen compartida
+        array.setflags(write=False)
+        with self._lock:
+            self._decoded[key] = array
+            while len(self._decoded) > self.decoded_entries:
+                self._decoded.popitem(last=False)
+        return array
+
+    def _evict(self):
+        # Llamado con el lock tomado
+        deadline = time.monotonic() - self.idle_ttl
+        while self._captures:
+            capture_id, capture = next(iter(self._captures.items()))
+            if capture.last_access >= deadline and self._bytes <= self.max_bytes:
+                break
+            del self._captures[capture_id]
+            self._bytes -= len(capture.data)
+            self.evictions += 1
+            for key in [key for key in self._decoded if key[0] == capture_id]:
+                del self._decoded[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "captures": len(self._captures),
+                "bytes": self._bytes,
+                "decoded": len(self._decoded),
+                "decoded_bytes": sum(array.nbytes for array in self._decoded.values()),
+                "evictions": self.evictions,
+            }
+
+
+@timed("decode")
+def _decode(data):
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("No se pudo decodificar la captura")
+    return image
+
+
+@timed("preview")
+def _preview(data, max_side):
+    # IMREAD_REDUCED_* decodifica JPEG directamente a 1/2, 1/4 u 1/8 de tamaño
+    with Image.open(io.BytesIO(data)) as probe:
+        side = max(probe.size)
+    flag = cv2.IMREAD_COLOR
+    for factor, reduced in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                            (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if side // factor >= max_side:
+            flag = reduced
+            break
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if image is None:
+        raise ValueError("No se pudo decodificar la captura")
+    scale = max_side / float(max(image.shape[:2]))
+    if scale < 1:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+@lru_cache(maxsize=1)
+def get_capture_cache():
+    """Almacén de capturas compartido por todas las sesiones del proceso"""
+    return CaptureCache()
@@ -0,0 +1,413 @@
+"""Línea de comandos: python -m scanner scan temp/*.jpg --roi x,y,w,h --out results.jsonl
+
+python -m scanner bench temp --engine auto --out bench.json --baseline previous.json
+python -m scanner store import temp && python -m scanner store reprocess --engine local
+python -m scanner video clip.mp4 --roi 0.5,0.5,0.6,0.25
+python -m scanner startup app.py --runs 5
+python -m scanner stub --port 8089 --latency lognormal:median=0.8:sigma=0.5 --rate 2
+python -m scanner load app.py --sessions 50 --concurrency 10 --error-rate 0.05
+python -m scanner export --format csv --since 1760000000 --out lecturas.csv
+"""
+import argparse
+import glob
+import json
+import sys
+import time
+
+from .batch import parse_rois
+from .bench import (
+    compare_reports,
+    format_report,
+    format_startup_report,
+    run_benchmark,
+    startup_benchmark,
+)
+from .cache import CachedRecognizer, get_cache
+from .config import get_setting
+from .metrics import REGISTRY, configure
+from .pipeline import ScanPipeline
+from .preprocess import build_pipeline
+from .recognizers import get_recognizer
+from .results import EXPORTERS, iter_records
+from .scan import scan_paths
+from .store import CaptureStore
+from .stub_server import start_stub_server
+from .video import DigitVoter, FrameSelector, iter_video_frames, scan_stream
+
+
+def _roi_arg(text):
+    # Validar en argparse: un ROI mal escrito sale con el uso y el código 2
+    try:
+        return parse_rois(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _rois(groups):
+    # --roi repetible: cada aparición puede traer varios ROIs separados por ';'
+    return [roi for group in groups for roi in group] or None
+
+
+def _expand(patterns):
+    # Los shells de Windows no expanden comodines
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        yield from matches or [pattern]
+
+
+def cmd_scan(args):
+    if args.sweep and args.processes:
+        # Los procesos sólo devuelven recortes; el barrido necesita la captura completa
+        print("❌ --sweep no está disponible con --processes", file=sys.stderr)
+        return 2
+    rois = _rois(args.roi)
+    preprocess = build_pipeline(args.preprocess)
+    # Sólo el log JSON-lines: un proceso de línea de comandos no necesita endpoint
+    configure(port=0)
+    recognizer = get_recognizer(args.engine)
+    cache = get_cache(args.cache)
+    if cache is not None:
+        recognizer = CachedRecognizer(recognizer, cache)
+
+    out = open(args.out, "w", encoding="utf-8") if args.out != "-" else sys.stdout
+    total = found = 0
+    try:
+        if args.processes:
+            pipeline = ScanPipeline(recognizer, rois=rois, processes=args.processes,
+                                    threads=args.workers, ordered=args.ordered,
+                                    detect=args.detect, preprocess=preprocess)
+            records = pipeline.run(_expand(args.paths))
+        else:
+            records = scan_paths(_expand(args.paths), recognizer, rois=rois,
+                                 workers=args.workers, detect=args.detect,
+                                 preprocess=preprocess, sweep=args.sweep)
+
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            total += 1
+            found += 1 if record["digits"] else 0
+    finally:
+        recognizer.close()
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"{found}/{total} ROIs con dígitos", file=sys.stderr)
+    if args.metrics_out:
+        write_metrics(args.metrics_out)
+    return 0
+
+
+def write_metrics(path):
+    """Vuelca las métricas del proceso: JSON si la ruta acaba en .json, si no Prometheus"""
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            json.dump(REGISTRY.snapshot(), f, ensure_ascii=False, indent=2)
+        else:
+            f.write(REGISTRY.to_prometheus())
+
+
+def cmd_bench(args):
+    rois = _rois(args.roi)
+    report = run_benchmark(args.directory, labels_path=args.labels, engine=args.engine, rois=rois,
+                           preprocess_spec=args.preprocess, detect=args.detect, repeat=args.repeat,
+                           processes=args.processes, live=args.live)
+    print(format_report(report), file=sys.stderr)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare_reports(json.load(f), report, tolerance=args.tolerance)
+        for problem in problems:
+            print(f"REGRESIÓN {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+def cmd_startup(args):
+    report = startup_benchmark(args.app, runs=args.runs, reruns=args.reruns)
+    print(format_startup_report(report), file=sys.stderr)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if report["errors"] else 0
+
+
+def _stub_options(args):
+    return {"text": args.text, "latency": args.latency, "error_rate": args.error_rate,
+            "api_error_rate": args.api_error_rate, "timeout_rate": args.timeout_rate, "hang": args.hang,
+            "rate": args.rate, "burst": args.burst, "daily_quota": args.daily_quota, "seed": args.seed}
+
+
+def cmd_stub(args):
+    server = start_stub_server(host=args.host, port=args.port, **_stub_options(args))
+    print(f"Stub de OCR.space en {server.url} (SCANNER_OCR_API_URL={server.url})", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        print(json.dumps(server.stats(), ensure_ascii=False), file=sys.stderr)
+    return 0
+
+
+def cmd_load(args):
+    # Importa los mensajes de Streamlit: sólo se carga al pedir la prueba de carga
+    from .loadtest import format_load_report, load_test
+
+    report = load_test(args.app, images=args.images, sessions=args.sessions, concurrency=args.concurrency,
+                       flow=args.flow, engine=args.engine, url=args.url, timeout=args.timeout,
+                       stub=_stub_options(args))
+    print(format_load_report(report), file=sys.stderr)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if report["completed"] == report["sessions"] else 1
+
+
+def cmd_export(args):
+    exporter, _ = EXPORTERS[args.format]
+    records = iter_records(root=args.root, since=args.since, until=args.until, engine=args.filter_engine)
+    out = open(args.out, "w", encoding="utf-8", newline="") if args.out != "-" else sys.stdout
+    try:
+        for chunk in exporter(records):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def _add_stub_arguments(parser):
+    parser.add_argument("--text", default="12345", help="Texto que devuelve el stub")
+    parser.add_argument("--latency", default="0",
+                        help="Latencia del stub: segundos fijos o uniform:low=..:high=.., "
+                             "lognormal:median=..:sigma=.., exp:mean=..")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proporción de respuestas HTTP 500")
+    parser.add_argument("--api-error-rate", type=float, default=0.0,
+                        help="Proporción de errores de procesamiento con HTTP 200")
+    parser.add_argument("--timeout-rate", type=float, default=0.0,
+                        help="Proporción de peticiones que no responden hasta pasados --hang s")
+    parser.add_argument("--hang", type=float, default=60.0, help="Segundos de espera de una petición colgada")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="Peticiones/s por clave antes de responder 429 (0 = sin límite)")
+    parser.add_argument("--burst", type=int, default=5, help="Ráfaga admitida por clave")
+    parser.add_argument("--daily-quota", type=int, default=0,
+                        help="Peticiones por clave antes de responder 403 (0 = sin cuota)")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla de los fallos y latencias simulados")
+
+
+def _open_store(args):
+    return CaptureStore(root=args.root, max_bytes=0, max_age=0)
+
+
+def _store_filters(args):
+    return {
+        "since": time.time() - args.newer_than if args.newer_than else None,
+        "engine": args.filter_engine,
+        "digits": args.digits,
+        "has_digits": {"yes": True, "no": False}.get(args.has_digits),
+        "unread": args.unread,
+        "limit": args.limit,
+    }
+
+
+def cmd_store(args):
+    store = _open_store(args)
+    if args.action == "import":
+        imported = []
+        for directory in args.paths or ["temp"]:
+            imported.extend(store.import_directory(directory, remove=args.move))
+        print(f"{len(imported)} capturas indexadas", file=sys.stderr)
+    elif args.action == "list":
+        for capture in store.query(**_store_filters(args)):
+            print(json.dumps(capture, ensure_ascii=False))
+    elif args.action == "stats":
+        print(json.dumps(store.stats(), ensure_ascii=False))
+    elif args.action == "prune":
+        removed, freed = store.evict(
+            max_bytes=args.max_bytes if args.max_bytes is not None else get_setting("store_max_bytes"),
+            max_age=args.max_age if args.max_age is not None else get_setting("store_max_age"),
+        )
+        print(f"{removed} capturas borradas, {freed / 1024 / 1024:.1f} MB liberados", file=sys.stderr)
+    elif args.action == "reprocess":
+        rois = _rois(args.roi)
+        recognizer = get_recognizer(args.engine)
+        total = found = 0
+        for record in store.reprocess(recognizer, rois=rois, detect=args.detect,
+                                      **_store_filters(args)):
+            print(json.dumps(record, ensure_ascii=False))
+            total += 1
+            found += 1 if record["digits"] else 0
+        print(f"{found}/{total} ROIs con dígitos", file=sys.stderr)
+    return 0
+
+
+def cmd_video(args):
+    rois = args.roi
+    if args.every_frame:
+        # Referencia: reconocer todos los fotogramas, sin umbrales de calidad
+        selector = FrameSelector(window=0, min_sharpness=0, min_exposure=0, min_glyphs=0)
+    else:
+        selector = FrameSelector(window=args.window)
+    try:
+        state = scan_stream(iter_video_frames(args.source, stride=args.stride), get_recognizer(args.engine),
+                            roi=rois[0] if rois else None, preprocess=build_pipeline(args.preprocess),
+                            selector=selector, voter=DigitVoter(min_votes=args.votes),
+                            stop_on_consensus=not args.no_stop)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    for reading in state.readings:
+        print(json.dumps(reading, ensure_ascii=False), file=sys.stderr)
+    print(json.dumps({
+        "digits": state.digits,
+        "confidence": round(state.confidence, 4),
+        "candidate": state.candidate,
+        "frames": state.frames,
+        "recognitions": state.recognitions,
+        "time_to_result_ms": round(state.time_to_result_ms, 1) if state.time_to_result_ms else None,
+    }, ensure_ascii=False))
+    return 0 if state.done else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m scanner",
+                                     description="Escáner de dígitos sin interfaz")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan = subparsers.add_parser("scan", help="Escanea imágenes o directorios")
+    scan.add_argument("paths", nargs="+", help="Ficheros, directorios o patrones glob")
+    scan.add_argument("--roi", type=_roi_arg, action="append", default=[],
+                      help="ROI x,y,ancho,alto en píxeles o cx,cy,ancho,alto relativos (0-1); "
+                           "repetible, por defecto el rectángulo centrado")
+    scan.add_argument("--detect", action="store_true",
+                      help="Sin --roi, localizar automáticamente las líneas de dígitos")
+    scan.add_argument("--sweep", action="store_true",
+                      help="Repetir las lecturas poco fiables probando giros, escalas y filtros "
+                           "(SCANNER_SWEEP_*; no disponible con --processes)")
+    scan.add_argument("--engine", choices=["api", "local", "auto"], default=None,
+                      help="Motor OCR (por defecto SCANNER_OCR_ENGINE)")
+    scan.add_argument("--workers", type=int, default=1,
+                      help="Hilos de reconocimiento (ficheros en paralelo sin --processes)")
+    scan.add_argument("--processes", type=int, default=0,
+                      help="Procesos para decodificar y recortar (activa el pipeline paralelo)")
+    scan.add_argument("--ordered", action="store_true",
+                      help="Con --processes, entregar los resultados en el orden de entrada")
+    scan.add_argument("--preprocess", default=None,
+                      help="Etapas de preprocesado, p. ej. 'gray,clahe,threshold,deskew' "
+                           "(por defecto SCANNER_PREPROCESS; 'none' = sin preprocesado)")
+    scan.add_argument("--cache", choices=["memory", "sqlite", "off"], default=None,
+                      help="Backend de caché (por defecto SCANNER_CACHE_BACKEND)")
+    scan.add_argument("--out", default="-", help="Fichero JSONL de salida ('-' = stdout)")
+    scan.add_argument("--metrics-out", default=None,
+                      help="Volcar las métricas al terminar (.json o texto de Prometheus)")
+    scan.set_defaults(func=cmd_scan)
+
+    bench = subparsers.add_parser("bench", help="Mide latencia, rendimiento y precisión sobre un corpus")
+    bench.add_argument("directory", nargs="?", default="temp",
+                       help="Directorio con las capturas y su labels.json (por defecto temp)")
+    bench.add_argument("--labels", default=None, help="Fichero de etiquetas (por defecto DIR/labels.json)")
+    bench.add_argument("--engine", choices=["api", "local", "auto"], default="local")
+    bench.add_argument("--live", action="store_true",
+                       help="Usar la API real en lugar del servidor stub local")
+    bench.add_argument("--roi", type=_roi_arg, action="append", default=[], help="ROI a medir (repetible)")
+    bench.add_argument("--detect", action="store_true", help="Incluir la detección automática del área")
+    bench.add_argument("--preprocess", default=None, help="Etapas de preprocesado (por defecto SCANNER_PREPROCESS)")
+    bench.add_argument("--repeat", type=int, default=3, help="Pasadas sobre el corpus")
+    bench.add_argument("--processes", type=int, default=0,
+                       help="Medir además el pipeline multiproceso con N procesos")
+    bench.add_argument("--out", default=None, help="Fichero JSON con el informe completo")
+    bench.add_argument("--baseline", default=None,
+                       help="Informe JSON anterior; sale con código 1 si hay regresiones")
+    bench.add_argument("--tolerance", type=float, default=0.2,
+                       help="Margen relativo tolerado en latencia y rendimiento")
+    bench.set_defaults(func=cmd_bench)
+
+    startup = subparsers.add_parser("startup", help="Mide el arranque en frío y los reruns de la aplicación")
+    startup.add_argument("app", nargs="?", default="app.py", help="Script de Streamlit (por defecto app.py)")
+    startup.add_argument("--runs", type=int, default=3, help="Arranques en frío (un proceso nuevo cada uno)")
+    startup.add_argument("--reruns", type=int, default=10, help="Reruns medidos tras cada arranque")
+    startup.add_argument("--out", default=None, help="Fichero JSON con el informe completo")
+    startup.set_defaults(func=cmd_startup)
+
+    stub = subparsers.add_parser("stub", help="Servidor local que imita OCR.space (latencia, errores, 429)")
+    stub.add_argument("--host", default="127.0.0.1")
+    stub.add_argument("--port", type=int, default=8089)
+    _add_stub_arguments(stub)
+    stub.set_defaults(func=cmd_stub)
+
+    load = subparsers.add_parser("load", help="Prueba de carga: sesiones simultáneas por los pasos 1→2→3")
+    load.add_argument("app", nargs="?", default="app.py", help="Script de Streamlit (por defecto app.py)")
+    load.add_argument("--url", default=None,
+                      help="Aplicación ya en marcha (p. ej. http://127.0.0.1:8501); sin ella se "
+                           "arrancan la aplicación y el stub")
+    load.add_argument("--images", default="temp", help="Fichero o directorio con las fotos de prueba")
+    load.add_argument("--sessions", type=int, default=20, help="Sesiones a completar")
+    load.add_argument("--concurrency", type=int, default=5, help="Sesiones simultáneas")
+    load.add_argument("--flow", choices=["camera", "crop"], default="camera",
+                      help="camera: foto, alineación y análisis; crop: recorte del navegador y análisis")
+    load.add_argument("--engine", choices=["api", "local", "auto"], default="api",
+                      help="Motor OCR de la aplicación lanzada")
+    load.add_argument("--timeout", type=float, default=60.0, help="Espera máxima por paso (s)")
+    load.add_argument("--out", default=None, help="Fichero JSON con el informe completo")
+    _add_stub_arguments(load)
+    load.set_defaults(func=cmd_load)
+
+    store = subparsers.add_parser("store", help="Gestiona el almacén de capturas (SCANNER_STORE_ROOT)")
+    store.add_argument("action", choices=["import", "list", "stats", "prune", "reprocess"])
+    store.add_argument("paths", nargs="*", help="Con import: directorios a indexar (por defecto temp)")
+    store.add_argument("--root", default=None, help="Directorio del almacén (por defecto SCANNER_STORE_ROOT)")
+    store.add_argument("--move", action="store_true", help="Con import: borrar los originales ya copiados")
+    store.add_argument("--newer-than", type=float, default=None, help="Sólo capturas de los últimos N segundos")
+    store.add_argument("--filter-engine", default=None, help="Sólo capturas leídas por última vez con este motor")
+    store.add_argument("--digits", default=None, help="Dígitos de la última lectura (admite %% como comodín)")
+    store.add_argument("--has-digits", choices=["yes", "no"], default=None)
+    store.add_argument("--unread", action="store_true", help="Sólo capturas sin ninguna lectura")
+    store.add_argument("--limit", type=int, default=None)
+    store.add_argument("--max-bytes", type=int, default=None,
+                       help="Con prune: tamaño máximo del almacén (por defecto SCANNER_STORE_MAX_BYTES)")
+    store.add_argument("--max-age", type=float, default=None,
+                       help="Con prune: antigüedad máxima en segundos (por defecto SCANNER_STORE_MAX_AGE)")
+    store.add_argument("--engine", choices=["api", "local", "auto"], default=None,
+                       help="Con reprocess: motor OCR (por defecto SCANNER_OCR_ENGINE)")
+    store.add_argument("--roi", type=_roi_arg, action="append", default=[], help="Con reprocess: ROI (repetible)")
+    store.add_argument("--detect", action="store_true", help="Con reprocess: detección automática del área")
+    store.set_defaults(func=cmd_store)
+
+    export = subparsers.add_parser("export", help="Exporta el log de lecturas de la app (SCANNER_RESULTS_DIR)")
+    export.add_argument("--format", choices=sorted(EXPORTERS), default="jsonl")
+    export.add_argument("--root", default=None, help="Directorio del log (por defecto SCANNER_RESULTS_DIR)")
+    export.add_argument("--since", type=float, default=None, help="Desde este instante (epoch en segundos)")
+    export.add_argument("--until", type=float, default=None, help="Hasta este instante (epoch, excluido)")
+    export.add_argument("--filter-engine", default=None, help="Sólo lecturas de este motor")
+    export.add_argument("--out", default="-", help="Fichero de salida ('-' = stdout)")
+    export.set_defaults(func=cmd_export)
+
+    video = subparsers.add_parser("video", help="Escaneo continuo de un vídeo o una cámara")
+    video.add_argument("source", help="Fichero de vídeo o índice de la cámara (p. ej. 0)")
+    video.add_argument("--roi", type=_roi_arg, default=None,
+                       help="ROI en píxeles o relativo (por defecto el rectángulo centrado)")
+    video.add_argument("--engine", choices=["api", "local", "auto"], default=None,
+                       help="Motor OCR (por defecto SCANNER_OCR_ENGINE)")
+    video.add_argument("--preprocess", default=None, help="Etapas de preprocesado (por defecto SCANNER_PREPROCESS)")
+    video.add_argument("--window", type=float, default=None,
+                       help="Segundos por ventana de selección (por defecto SCANNER_VIDEO_WINDOW)")
+    video.add_argument("--votes", type=int, default=None,
+                       help="Lecturas necesarias para el consenso (por defecto SCANNER_VIDEO_VOTES)")
+    video.add_argument("--stride", type=int, default=1, help="Analizar uno de cada N fotogramas")
+    video.add_argument("--every-frame", action="store_true",
+                       help="Reconocer todos los fotogramas (referencia para comparar)")
+    video.add_argument("--no-stop", action="store_true", help="Seguir hasta el final tras el consenso")
+    video.set_defaults(func=cmd_video)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,151 @@
+"""Configuración del escáner leída de variables de entorno"""
+import os
+
+ENV_PREFIX = "SCANNER_"
+
+# Valores por defecto de cada opción (el tipo del valor define la conversión)
+DEFAULTS = {
+    # Motor de reconocimiento: 'api', 'local' o 'auto' (niveles de ensemble_tiers);
+    # 'auto' sólo tras comprobar con bench que el motor local acierta en el corpus
+    "ocr_engine": "api",
+    "ocr_api_url": "https://api.ocr.space/parse/image",
+    "ocr_api_key": "helloworld",
+    # Varias claves separadas por comas (tienen prioridad sobre ocr_api_key)
+    "ocr_api_keys": "",
+    # Por clave: peticiones/s y ráfaga del cubo de tokens, cuota diaria (0 = sin
+    # límite), enfriamiento tras 429 seguidos y tras 403 (s), fichero de estado
+    # compartido entre procesos ("" = sólo en memoria), espera máxima por un
+    # token (s) y 429 seguidos antes del enfriamiento largo (antes, Retry-After
+    # o 1, 2, 4... s)
+    "ocr_key_rate": 1.0,
+    "ocr_key_burst": 5,
+    "ocr_key_daily_quota": 0,
+    "ocr_key_cooldown": 60.0,
+    "ocr_key_forbidden_cooldown": 3600.0,
+    "ocr_key_state": os.path.join("temp", "ocr_keys.json"),
+    "ocr_key_max_wait": 5.0,
+    "ocr_key_strikes": 3,
+    "ocr_api_engine": 2,
+    "ocr_timeout": 30.0,
+    "ocr_connect_timeout": 5.0,
+    # Reintentos con backoff exponencial y jitter ante timeouts y errores 5xx/429
+    "ocr_retries": 2,
+    "ocr_backoff": 0.5,
+    "ocr_backoff_max": 8.0,
+    "ocr_pool_size": 10,
+    # Cortocircuito: fallos seguidos antes de abrir y segundos hasta reintentar
+    "ocr_breaker_threshold": 5,
+    "ocr_breaker_reset": 30.0,
+    # Confianza mínima de una lectura para no escalar al siguiente nivel en modo 'auto'
+    "local_min_confidence": 0.8,
+    # Niveles del modo 'auto': ';' separa niveles (se escala al siguiente sólo si
+    # ninguna lectura alcanza local_min_confidence) y ',' motores en paralelo;
+    # api:N = OCR.space con el motor N, p. ej. "local;api:2,api:1"
+    "ensemble_tiers": "local;api",
+    # Formatos esperados de las lecturas ("" = sin validar): nombres (ean13, ean8,
+    # upca, gtin, card, imei) o len=/regex=/check= separados por ':'; ';' separa formatos
+    "digit_formats": "",
+    # Corrección de lecturas inválidas: dígitos que se pueden cambiar, proporción
+    # mínima de probabilidad de la elegida entre las válidas y variantes de
+    # preprocesado (';' entre variantes) para volver a leer sólo si no basta
+    "postprocess_max_changes": 2,
+    "postprocess_min_share": 0.6,
+    "postprocess_retry": "resize:min_height=96;threshold;clahe:clip=4.0,resize:min_height=72",
+    # Caché de resultados: 'memory', 'sqlite' u 'off'
+    "cache_backend": "memory",
+    "cache_path": os.path.join("temp", "ocr_cache.sqlite3"),
+    "cache_max_entries": 1024,
+    "cache_ttl": 24 * 3600.0,
+    # Clave de caché: 'exact' (SHA-256 de los píxeles) o 'phash' (hash perceptual)
+    "cache_key": "exact",
+    "cache_phash_distance": 0,
+    # Lotes: recortes por mosaico enviado a la API y margen entre ellos (px)
+    "batch_max_tiles": 12,
+    "batch_padding": 24,
+    # Pipeline masivo: procesos de decodificación (0 = núcleos) e hilos de reconocimiento
+    "pipeline_processes": 0,
+    "pipeline_threads": 8,
+    # Detección automática de regiones: 'gradient' o 'mser', y cajas a reconocer como máximo
+    "detect_method": "gradient",
+    "detect_max_candidates": 3,
+    # Barrido cuando la lectura del rectángulo no es fiable (en la app si se activa;
+    # en scan con --sweep): desvíos de giro (grados) respecto a 0 y a la inclinación
+    # estimada, escalas, filtros finales (';' entre variantes) y llamadas al motor
+    # como mucho (cada una pasa por el motor completo: en modo auto, quizá la API)
+    "sweep": False,
+    "sweep_angles": "-3,3",
+    "sweep_scales": "0.75,1.0,1.5",
+    "sweep_filters": "none;threshold",
+    "sweep_max_attempts": 3,
+    # Etapas de preprocesado aplicadas a cada ROI antes de reconocerlo
+    # (gray, clahe, denoise, threshold, deskew, resize; parámetros con etapa:clave=valor)
+    "preprocess": "gray,clahe,deskew,resize",
+    # Métricas: puerto del endpoint /metrics (0 = desactivado) y log JSON-lines ("" = sin log)
+    "metrics_host": "127.0.0.1",
+    "metrics_port": 0,
+    "metrics_log": "",
+    # Capturas de sesión: memoria máxima de JPEG compartidos, expulsión por
+    # inactividad (s), imágenes decodificadas en caché y lado de la vista previa
+    "capture_max_bytes": 128 * 1024 * 1024,
+    "capture_idle_ttl": 1800.0,
+    "capture_decoded_entries": 8,
+    "capture_preview_side": 960,
+    # Almacén de capturas: guardar las fotos de la app, directorio, límite de
+    # tamaño (bytes) y antigüedad máxima (s); 0 = sin límite
+    "store_enabled": False,
+    "store_root": os.path.join("temp", "store"),
+    "store_max_bytes": 512 * 1024 * 1024,
+    "store_max_age": 30 * 86400.0,
+    # Log de lecturas de la app: activarlo, directorio de los .jsonl.gz, lecturas
+    # como mucho en memoria, segundos entre volcados, tamaño (bytes comprimidos)
+    # a partir del cual se rota de fichero y ficheros conservados (0 = todos)
+    "results_enabled": True,
+    "results_dir": os.path.join("temp", "results"),
+    "results_buffer": 10000,
+    "results_flush_interval": 2.0,
+    "results_max_file_bytes": 16 * 1024 * 1024,
+    "results_max_files": 64,
+    # Vídeo en directo: ventana de selección (s), umbrales por fotograma
+    # (nitidez = varianza del laplaciano a la altura de análisis, exposición 0-1,
+    # glifos mínimos) y votación (lecturas coincidentes y proporción por dígito)
+    "video_window": 0.5,
+    "video_analysis_height": 96,
+    "video_min_sharpness": 150.0,
+    "video_min_exposure": 0.25,
+    "video_min_glyphs": 2,
+    "video_votes": 2,
+    "video_agreement": 0.6,
+    # Cola de trabajos: hilos de reconocimiento compartidos, trabajos sin terminar
+    # por sesión y segundos que se conserva un trabajo terminado
+    "jobs_workers": 4,
+    "jobs_max_pending": 2,
+    "jobs_ttl": 600.0,
+    # Paso 1 de la app: recortar el rectángulo en el navegador y enviar sólo ese
+    # JPEG (False = foto completa con st.camera_input), altura máxima del
+    # recorte enviado (px, 0 = sin reducir) y calidad JPEG (0-1)
+    "client_crop": True,
+    "client_crop_max_height": 400,
+    "client_crop_quality": 0.9,
+    # Subida a la API: altura de glifo objetivo (px), 'gray', 'binary' o 'color',
+    # presupuesto de bytes y lado máximo de la imagen
+    "upload_glyph_height": 32,
+    "upload_color_mode": "gray",
+    "upload_byte_budget": 150 * 1024,
+    "upload_max_side": 2000,
+}
+
+
+def get_setting(name, default=None):
+    """Lee una opción de configuración desde SCANNER_<NOMBRE>"""
+    fallback = DEFAULTS.get(name, default)
+    raw = os.environ.get(ENV_PREFIX + name.upper())
+    if raw is None or raw == "":
+        return fallback
+
+    if isinstance(fallback, bool):
+        return raw.strip().lower() in ("1", "true", "yes", "si", "on")
+    if isinstance(fallback, int):
+        return int(raw)
+    if isinstance(fallback, float):
+        return float(raw)
+    return raw
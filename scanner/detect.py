@@ -0,0 +1,207 @@
+"""Localización automática de regiones con dígitos"""
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from .config import get_setting
+from .frame import FrameContext
+from .imaging import preprocess_image
+from .recognizers import LocalDigitRecognizer
+from .segmentation import normalize_glyph, segment_glyphs
+
+# Ancho de trabajo: la detección se hace sobre una copia reducida de la captura
+DETECT_WIDTH = 960
+# Cajas (las de mayor área) que se puntúan como máximo por imagen
+MAX_SCORED_BOXES = 40
+
+
+@dataclass
+class Candidate:
+    """Caja candidata (en píxeles de la imagen original) y su puntuación"""
+    x: int
+    y: int
+    width: int
+    height: int
+    score: float = 0.0
+
+    @property
+    def roi(self):
+        return self.x, self.y, self.width, self.height
+
+
+def _to_gray(image):
+    if len(image.shape) == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def _gradient_boxes(gray):
+    """Cajas de texto por gradiente morfológico + cierre horizontal + contornos"""
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT,
+                                cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Unir los glifos de una misma línea en un único bloque
+    kernel_width = max(9, gray.shape[1] // 60)
+    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE,
+                              cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_width, 1)))
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [cv2.boundingRect(contour) for contour in contours]
+
+
+def _mser_boxes(gray):
+    """Cajas de texto agrupando regiones MSER de altura similar en líneas"""
+    _, regions = cv2.MSER_create().detectRegions(gray)
+    mask = np.zeros_like(gray)
+    for x, y, w, h in regions:
+        if 0.15 <= w / float(h) <= 1.2:
+            mask[y:y + h, x:x + w] = 255
+    kernel_width = max(9, gray.shape[1] // 60)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE,
+                            cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_width, 1)))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [cv2.boundingRect(contour) for contour in contours]
+
+
+DETECTORS = {
+    "gradient": _gradient_boxes,
+    "mser": _mser_boxes,
+}
+
+
+def score_region(gray, box, classifier=None):
+    """Puntúa una caja por cuántos glifos con forma de dígito contiene
+
+    Devuelve (puntuación, caja ajustada a la línea de glifos dominante).
+    """
+    x, y, w, h = box
+    if h < 10 or w < 10:
+        return 0.0, box
+
+    crop = gray[y:y + h, x:x + w]
+    _, glyphs = segment_glyphs(preprocess_image(crop))
+    if len(glyphs) < 2:
+        return 0.0, box
+
+    # Ajustar la caja a la línea de glifos encontrada dentro del bloque
+    left = min(g[0][0] for g in glyphs)
+    top = min(g[0][1] for g in glyphs)
+    right = max(g[0][0] + g[0][2] for g in glyphs)
+    bottom = max(g[0][1] + g[0][3] for g in glyphs)
+    line = (x + left, y + top, right - left, bottom - top)
+
+    # Parecido a dígitos según el clasificador local (letras y ruido puntúan bajo)
+    classifier = classifier or LocalDigitRecognizer()
+    likeness = np.mean([classifier.classify(normalize_glyph(mask))[1] for _, mask in glyphs])
+
+    glyph_score = min(len(glyphs), 8) / 8.0
+    aspect = line[2] / float(line[3])
+    return glyph_score * likeness * min(aspect / 2.0, 1.0), line
+
+
+def _overlap(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    return inter / float(min(aw * ah, bw * bh) or 1)
+
+
+def propose_regions(image, max_candidates=None, method=None, margin=0.2):
+    """Propone las cajas con más probabilidad de contener dígitos, de mejor a peor"""
+    max_candidates = max_candidates or get_setting("detect_max_candidates")
+    method = method or get_setting("detect_method")
+    gray = _to_gray(image)
+
+    img_h, img_w = gray.shape
+    scale = min(1.0, DETECT_WIDTH / float(img_w))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+
+    # Descartar cajas diminutas o verticales antes de la puntuación (más cara)
+    boxes = [b for b in DETECTORS[method](small) if b[3] >= 10 and b[2] >= b[3] and b[2] * b[3] >= 300]
+    boxes = sorted(boxes, key=lambda b: b[2] * b[3], reverse=True)[:MAX_SCORED_BOXES]
+
+    classifier = LocalDigitRecognizer()
+    scored = []
+    for box in boxes:
+        score, line = score_region(small, box, classifier)
+        if score > 0:
+            scored.append((score, line))
+    scored.sort(key=lambda item: item[0], reverse=True)
+
+    candidates = []
+    for score, (x, y, w, h) in scored:
+        # Margen alrededor de la línea y vuelta a coordenadas originales
+        pad_x, pad_y = int(h * margin * 2), int(h * margin)
+        box = (
+            max(0, int((x - pad_x) / scale)),
+            max(0, int((y - pad_y) / scale)),
+            min(img_w, int((x + w + pad_x) / scale)),
+            min(img_h, int((y + h + pad_y) / scale)),
+        )
+        box = (box[0], box[1], box[2] - box[0], box[3] - box[1])
+        if any(_overlap(box, other.roi) > 0.5 for other in candidates):
+            continue
+        candidates.append(Candidate(*box, score=round(float(score), 4)))
+        if len(candidates) >= max_candidates:
+            break
+    return candidates
+
+
+def recognize_first_confident(crops, recognizer, min_confidence=None, scorer=None):
+    """Elige el recorte con el motor local y sólo ese pasa por ``recognizer``
+
+    Los recortes se leen en orden con ``scorer`` (por defecto el reconocedor
+    local, sin coste de red) y se para en la primera lectura fiable; si
+    ninguna lo es, gana la de mayor confianza (a igualdad, la primera). Así
+    el motor completo, que en modo 'auto' puede acabar en la API, se llama
+    una sola vez por captura. Devuelve (resultado, índice del recorte); sin
+    recortes devuelve (None, None).
+    """
+    min_confidence = (min_confidence if min_confidence is not None
+                      else get_setting("local_min_confidence"))
+    scorer = scorer or LocalDigitRecognizer()
+    best = (None, None, -1.0)
+    for index, crop in enumerate(crops):
+        local = scorer.recognize(crop)
+        score = local.confidence if local.ok else -1.0
+        if best[0] is None or score > best[2]:
+            best = (crop, index, score)
+        if score >= min_confidence:
+            break
+    crop, index, _ = best
+    if crop is None:
+        return None, None
+    return recognizer.recognize(crop), index
+
+
+def recognize_best_region(image, recognizer, candidates=None, min_confidence=None, preprocess=None,
+                          fallback_roi=None):
+    """Elige entre las candidatas con el motor local y reconoce sólo la mejor
+
+    ``fallback_roi`` (el rectángulo manual) compite como última opción.
+    Devuelve (resultado, candidata usada); la candidata es None si gana el
+    rectángulo manual, y sin nada que reconocer el resultado también es None.
+    Cada recorte pasa por ``preprocess`` (por defecto el pipeline de
+    SCANNER_PREPROCESS) sólo cuando llega su turno.
+    """
+    if candidates is None:
+        candidates = propose_regions(image)
+    rois = [candidate.roi for candidate in candidates]
+    if fallback_roi is not None:
+        rois.append(tuple(fallback_roi))
+    frame = FrameContext(image, preprocess)
+    result, index = recognize_first_confident(frame.prepare_many(rois), recognizer, min_confidence)
+    return result, (candidates[index] if index is not None and index < len(candidates) else None)
+
+
+def draw_candidates(image, candidates, chosen=None):
+    """Copia de la imagen con las candidatas dibujadas (la elegida en verde)"""
+    canvas = image.copy() if len(image.shape) == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    thickness = max(2, canvas.shape[1] // 400)
+    for candidate in candidates:
+        color = (0, 255, 0) if candidate is chosen else (0, 165, 255)
+        x, y, w, h = candidate.roi
+        cv2.rectangle(canvas, (x, y), (x + w, y + h), color, thickness)
+    return canvas
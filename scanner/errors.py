@@ -0,0 +1,70 @@
+"""Excepciones del escáner"""
+from enum import Enum
+
+
+class ErrorKind(str, Enum):
+    """Categoría de un fallo, estable para métricas y registros (el texto es sólo para el usuario)"""
+    TIMEOUT = "timeout"
+    CONNECTION = "connection"
+    HTTP = "http"
+    API = "api"
+    CIRCUIT_OPEN = "circuit_open"
+    RATE_LIMITED = "rate_limited"
+    QUEUE_FULL = "queue_full"
+    DECODE = "decode"
+    INVALID_ROI = "invalid_roi"
+    ENCODE = "encode"
+    NO_DIGITS = "no_digits"
+    INVALID_FORMAT = "invalid_format"
+    INTERNAL = "internal"
+
+
+class ScannerError(Exception):
+    """Error base del escáner"""
+    kind = ErrorKind.INTERNAL
+
+
+class QueueFullError(ScannerError):
+    """La sesión ya tiene demasiados trabajos pendientes en la cola"""
+    kind = ErrorKind.QUEUE_FULL
+
+
+class OCRError(ScannerError):
+    """Fallo al consultar un servicio OCR"""
+    kind = ErrorKind.API
+
+
+class OCRTimeoutError(OCRError):
+    """El servicio OCR no respondió a tiempo"""
+    kind = ErrorKind.TIMEOUT
+
+
+class OCRConnectionError(OCRError):
+    """No se pudo establecer la conexión con el servicio OCR"""
+    kind = ErrorKind.CONNECTION
+
+
+class OCRHTTPError(OCRError):
+    """El servicio OCR respondió con un código HTTP de error"""
+    kind = ErrorKind.HTTP
+
+    def __init__(self, status_code, message="", retry_after=None):
+        super().__init__(message or f"HTTP {status_code}")
+        self.status_code = status_code
+        # Segundos de la cabecera Retry-After (None si no vino)
+        self.retry_after = retry_after
+
+
+class OCRAPIError(OCRError):
+    """El servicio OCR procesó la petición pero informó un error"""
+    kind = ErrorKind.API
+
+
+class OCRRateLimitError(OCRError):
+    """Ninguna clave de OCR.space tiene cuota o ritmo disponible"""
+    kind = ErrorKind.RATE_LIMITED
+
+
+class CircuitOpenError(OCRError):
+    """El circuito está abierto: el servicio OCR falló repetidamente"""
+    kind = ErrorKind.CIRCUIT_OPEN
@@ -0,0 +1,277 @@
+"""Formatos esperados de las lecturas y corrección por dígito de control
+
+Un formato fija las longitudes admitidas, una expresión regular y un dígito
+de control (Luhn, EAN/GTIN o módulo 11). Cuando una lectura no cumple ningún
+formato, cada posición se trata como una distribución de dígitos: el leído
+con su confianza y, con el resto de la probabilidad, las alternativas que dio
+el motor o las confusiones habituales entre dígitos (8↔0, 1↔7...). Se elige
+la cadena válida más probable con como mucho ``max_changes`` cambios, y sólo
+si destaca claramente sobre las demás válidas; si no, la lectura se rechaza.
+"""
+import itertools
+import math
+import re
+from dataclasses import dataclass
+
+from .config import get_setting
+
+# Dígitos que los motores confunden entre sí (forma parecida a baja resolución)
+DIGIT_CONFUSIONS = {
+    "0": "869",
+    "1": "74",
+    "2": "7",
+    "3": "85",
+    "4": "1",
+    "5": "63",
+    "6": "508",
+    "7": "12",
+    "8": "0396",
+    "9": "80",
+}
+# Parte de la probabilidad no asignada al dígito leído que va a sus confusiones
+CONFUSION_SHARE = 0.8
+# Posiciones (las más dudosas) en las que se buscan cambios
+MAX_SEARCH_POSITIONS = 12
+
+
+def luhn_valid(digits):
+    """Luhn (tarjetas, IMEI): doblando uno de cada dos dígitos desde la derecha"""
+    if len(digits) < 2:
+        return False
+    total = 0
+    for index, char in enumerate(reversed(digits)):
+        value = int(char)
+        if index % 2:
+            value = value * 2 - 9 if value > 4 else value * 2
+        total += value
+    return total % 10 == 0
+
+
+def ean_valid(digits):
+    """EAN-8, UPC-A, EAN-13 y GTIN-14: pesos 3 y 1 alternos desde la derecha"""
+    if len(digits) not in (8, 12, 13, 14):
+        return False
+    payload = digits[:-1]
+    total = sum(int(char) * (3 if index % 2 == 0 else 1) for index, char in enumerate(reversed(payload)))
+    return (10 - total % 10) % 10 == int(digits[-1])
+
+
+def mod11_valid(digits):
+    """Módulo 11 con pesos 2..7 cíclicos desde la derecha (un resto de 10 no es válido)"""
+    if len(digits) < 2:
+        return False
+    payload = digits[:-1]
+    total = sum(int(char) * (2 + index % 6) for index, char in enumerate(reversed(payload)))
+    check = 11 - total % 11
+    if check == 11:
+        check = 0
+    return check != 10 and check == int(digits[-1])
+
+
+CHECKS = {
+    "luhn": luhn_valid,
+    "ean": ean_valid,
+    "mod11": mod11_valid,
+}
+
+
+@dataclass(frozen=True)
+class DigitFormat:
+    """Formato esperado: longitudes (vacío = cualquiera), regex completa y dígito de control"""
+    name: str
+    lengths: tuple = ()
+    pattern: str = None
+    check: str = None
+
+    def __post_init__(self):
+        if self.check is not None and self.check not in CHECKS:
+            raise ValueError(f"Dígito de control desconocido: {self.check}")
+
+    def accepts_length(self, length):
+        return not self.lengths or length in self.lengths
+
+    def matches(self, digits):
+        if not digits or not self.accepts_length(len(digits)):
+            return False
+        if self.pattern and not re.fullmatch(self.pattern, digits):
+            return False
+        return self.check is None or CHECKS[self.check](digits)
+
+
+FORMATS = {
+    "ean13": DigitFormat("ean13", (13,), check="ean"),
+    "ean8": DigitFormat("ean8", (8,), check="ean"),
+    "upca": DigitFormat("upca", (12,), check="ean"),
+    "gtin": DigitFormat("gtin", (8, 12, 13, 14), check="ean"),
+    "card": DigitFormat("card", tuple(range(13, 20)), check="luhn"),
+    "imei": DigitFormat("imei", (15,), check="luhn"),
+}
+
+
+def register_format(name, digit_format):
+    """Registra un formato utilizable por nombre en SCANNER_DIGIT_FORMATS"""
+    FORMATS[name] = digit_format
+
+
+def _parse_lengths(text):
+    lengths = []
+    for part in text.split("|"):
+        low, sep, high = part.partition("-")
+        lengths.extend(range(int(low), int(high) + 1) if sep else [int(low)])
+    return tuple(lengths)
+
+
+def parse_formats(spec):
+    """Convierte 'ean13;len=6-8:check=mod11;regex=^0\\d{9}$' en una lista de formatos
+
+    Los formatos se separan con ';'. Cada uno es un nombre registrado
+    (ean13, ean8, upca, gtin, card, imei) o parámetros ``clave=valor``
+    separados por ':': ``len`` (``8|13`` o ``6-10``), ``regex`` y ``check``
+    (luhn, ean, mod11).
+    """
+    formats = []
+    for chunk in spec.split(";"):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        if chunk in FORMATS:
+            formats.append(FORMATS[chunk])
+            continue
+        options = {}
+        # ':' separa parámetros sólo si le sigue clave=, así la regex puede contener ':'
+        for param in re.split(r":(?=\w+=)", chunk):
+            key, sep, value = param.partition("=")
+            if not sep or key not in ("len", "regex", "check"):
+                raise ValueError(f"Formato de dígitos inválido: '{chunk}'")
+            options[key] = value
+        formats.append(DigitFormat(
+            name=chunk,
+            lengths=_parse_lengths(options["len"]) if "len" in options else (),
+            pattern=options.get("regex"),
+            check=options.get("check"),
+        ))
+    return formats
+
+
+@dataclass
+class FormatMatch:
+    """Lectura válida elegida: dígitos, probabilidad de cada uno, formato y cambios hechos"""
+    digits: str
+    confidences: list
+    format: str
+    changes: int
+    share: float
+
+
+def position_distributions(readings):
+    """Distribución de dígitos por posición a partir de lecturas de la misma longitud
+
+    Cada lectura es (dígitos, confianzas por dígito, alternativas por dígito);
+    las alternativas son diccionarios dígito → puntuación (pueden faltar). Las
+    distribuciones de varias lecturas se promedian.
+    """
+    length = len(readings[0][0])
+    positions = []
+    for index in range(length):
+        merged = {}
+        for digits, confidences, alternatives in readings:
+            confidence = confidences[index] if index < len(confidences) else 0.5
+            confidence = min(max(confidence, 0.05), 0.99)
+            primary = digits[index]
+            distribution = {primary: confidence}
+            others = alternatives[index] if index < len(alternatives) else None
+            others = {d: s for d, s in (others or {}).items() if d != primary and s > 0}
+            if not others:
+                confusions = DIGIT_CONFUSIONS.get(primary, "")
+                others = {d: CONFUSION_SHARE / len(confusions) for d in confusions}
+            total = sum(others.values()) or 1.0
+            for digit, score in others.items():
+                distribution[digit] = distribution.get(digit, 0.0) + (1 - confidence) * score / total
+            for digit, probability in distribution.items():
+                merged[digit] = merged.get(digit, 0.0) + probability / len(readings)
+        positions.append(merged)
+    return positions
+
+
+def _candidates(positions, max_changes):
+    """(cadena, log-probabilidad, cambios) con hasta ``max_changes`` sustituciones"""
+    best = [max(p.items(), key=lambda item: item[1]) for p in positions]
+    base = sum(math.log(probability) for _, probability in best)
+    yield "".join(d for d, _ in best), base, 0
+
+    # Buscar sólo en las posiciones más dudosas
+    doubtful = sorted(range(len(positions)), key=lambda i: best[i][1])[:MAX_SEARCH_POSITIONS]
+    for changes in range(1, max_changes + 1):
+        for chosen in itertools.combinations(sorted(doubtful), changes):
+            options = [[(d, p) for d, p in positions[i].items() if d != best[i][0]] for i in chosen]
+            for replacement in itertools.product(*options):
+                digits = [d for d, _ in best]
+                score = base
+                for index, (digit, probability) in zip(chosen, replacement):
+                    digits[index] = digit
+                    score += math.log(probability) - math.log(best[index][1])
+                yield "".join(digits), score, changes
+
+
+def _without(values, index):
+    """Copia de ``values`` sin la posición ``index`` (si la tiene)"""
+    return list(values[:index]) + list(values[index + 1:])
+
+
+def best_valid(readings, formats, max_changes=None, min_share=None):
+    """Lectura válida más probable (FormatMatch) o None si no hay o es ambigua
+
+    ``readings`` son tuplas (dígitos, confianzas, alternativas); se agrupan
+    por longitud y sólo se prueban las longitudes que admite algún formato.
+    Una lectura con un glifo de más también se prueba sin él (como un cambio).
+    ``min_share`` es la proporción mínima de probabilidad que debe tener la
+    elegida frente al resto de cadenas válidas.
+    """
+    max_changes = max_changes if max_changes is not None else get_setting("postprocess_max_changes")
+    min_share = min_share if min_share is not None else get_setting("postprocess_min_share")
+    readings = [r for r in readings if r[0]]
+
+    groups = {}
+    for digits, confidences, alternatives in readings:
+        groups.setdefault(len(digits), []).append((digits, confidences, alternatives))
+        # Glifo espurio (borde, suciedad): probar la lectura sin cada posición
+        if any(f.accepts_length(len(digits) - 1) and f.lengths for f in formats):
+            for index in range(len(digits)):
+                penalty = 1 - min(max(confidences[index] if index < len(confidences) else 0.5, 0.05), 0.99)
+                groups.setdefault(("drop", len(digits) - 1), []).append(
+                    (digits[:index] + digits[index + 1:], _without(confidences, index),
+                     _without(alternatives, index), penalty))
+
+    valid = {}
+    for key, group in groups.items():
+        if key and isinstance(key, tuple):
+            # Cada eliminación es una hipótesis aparte con su penalización
+            for digits, confidences, alternatives, penalty in group:
+                _collect(valid, [(digits, confidences, alternatives)], formats, max_changes - 1,
+                         math.log(penalty), 1)
+        else:
+            _collect(valid, group, formats, max_changes, 0.0, 0)
+    if not valid:
+        return None
+
+    ranked = sorted(valid.items(), key=lambda item: item[1][0], reverse=True)
+    total = sum(math.exp(score) for score, *_ in valid.values())
+    digits, (score, changes, name, confidences) = ranked[0]
+    share = math.exp(score) / total
+    if share < min_share:
+        return None
+    return FormatMatch(digits, confidences, name, changes, round(share, 4))
+
+
+def _collect(valid, group, formats, max_changes, offset, extra_changes):
+    if max_changes < 0 or not any(f.accepts_length(len(group[0][0])) for f in formats):
+        return
+    positions = position_distributions(group)
+    for digits, score, changes in _candidates(positions, max_changes):
+        digit_format = next((f for f in formats if f.matches(digits)), None)
+        if digit_format is None:
+            continue
+        score += offset
+        if digits not in valid or score > valid[digits][0]:
+            confidences = [round(positions[i][d], 3) for i, d in enumerate(digits)]
+            valid[digits] = (score, changes + extra_changes, digit_format.name, confidences)
@@ -0,0 +1,88 @@
+"""Preprocesado por captura: una pasada sobre la imagen completa y vistas por ROI
+
+Al evaluar varias regiones candidatas (o varias escalas) de una misma captura,
+convertir a gris y mejorar el contraste de cada recorte por separado repite el
+mismo trabajo. ``FrameContext`` aplica una sola vez a la imagen completa el
+prefijo de etapas ``frame_level`` del pipeline (gris, filtrado y, con
+``clahe:frame=1``, el contraste) y entrega cada ROI como una vista NumPy de ese
+resultado, sin copiarla; sólo las etapas que dependen del recorte (CLAHE por
+defecto, umbral, enderezado, escala) se ejecutan por ROI. Los ROIs se preparan
+cuando se piden y se memorizan, así que detenerse en la primera candidata
+fiable no paga el preprocesado de las demás.
+"""
+import threading
+
+import cv2
+
+from .imaging import resolve_roi
+from .preprocess import PreprocessPipeline, get_preprocessor
+
+
+class FrameContext:
+    """Una captura preprocesada bajo demanda, compartida por todos sus ROIs
+
+    ``preprocess`` es un PreprocessPipeline (por defecto el de
+    SCANNER_PREPROCESS); cualquier otra función se aplica entera a cada
+    recorte. Las vistas son de sólo lectura: quien necesite modificarlas debe
+    copiarlas.
+    """
+
+    def __init__(self, image, preprocess=None):
+        self.image = image
+        preprocess = preprocess or get_preprocessor()
+        if isinstance(preprocess, PreprocessPipeline):
+            self.frame_stages, self.crop_stages = preprocess.split()
+        else:
+            self.frame_stages, self.crop_stages = PreprocessPipeline([]), preprocess
+        self._lock = threading.Lock()
+        self._levels = {}     # escala → captura con las etapas de captura aplicadas
+        self._prepared = {}   # (roi, escala) → recorte preprocesado
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def level(self, scale=1.0):
+        """Captura completa reescalada y con las etapas de captura aplicadas (se calcula una vez)"""
+        with self._lock:
+            level = self._levels.get(scale)
+            if level is None:
+                source = self.image
+                if scale != 1.0:
+                    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+                    source = cv2.resize(source, None, fx=scale, fy=scale, interpolation=interpolation)
+                # view(): marcar como sólo lectura sin tocar el array del llamador
+                level = (self.frame_stages(source) if self.frame_stages.stages else source).view()
+                level.setflags(write=False)
+                self._levels[scale] = level
+            return level
+
+    def view(self, roi, scale=1.0):
+        """ROI (en coordenadas de la captura original) como vista del nivel ``scale``, sin copia"""
+        x, y, w, h = resolve_roi(roi, self.image.shape)
+        level = self.level(scale)
+        height, width = level.shape[:2]
+        x0, y0 = min(width, int(round(x * scale))), min(height, int(round(y * scale)))
+        x1, y1 = min(width, int(round((x + w) * scale))), min(height, int(round((y + h) * scale)))
+        return level[y0:y1, x0:x1]
+
+    def prepare(self, roi, scale=1.0):
+        """ROI listo para el reconocedor: vista + etapas de recorte (memorizado)"""
+        key = (tuple(resolve_roi(roi, self.image.shape)), scale)
+        with self._lock:
+            prepared = self._prepared.get(key)
+        if prepared is None:
+            crop = self.view(roi, scale)
+            prepared = self.crop_stages(crop) if crop.size else crop
+            with self._lock:
+                self._prepared[key] = prepared
+        return prepared
+
+    def prepare_many(self, rois, scale=1.0):
+        """Recortes preparados de cada ROI, generados según se piden
+
+        Consumirlo con ``recognize_first_confident`` evita preparar las
+        candidatas que ya no hacen falta tras una lectura fiable.
+        """
+        for roi in rois:
+            yield self.prepare(roi, scale)
@@ -0,0 +1,138 @@
+"""Utilidades de imagen compartidas por la app y los motores OCR"""
+import base64
+import io
+import logging
+from dataclasses import dataclass
+
+import cv2
+from PIL import Image
+
+from .metrics import timed
+from .preprocess import Clahe, Grayscale
+
+logger = logging.getLogger(__name__)
+
+# Tamaño por defecto del rectángulo de análisis (px)
+DEFAULT_ROI_WIDTH = 250
+DEFAULT_ROI_HEIGHT = 120
+
+
+@timed("crop")
+def get_roi(image, x, y, width, height):
+    """Extrae región de interés"""
+    return image[y:y + height, x:x + width]
+
+
+def centered_roi(shape, width=DEFAULT_ROI_WIDTH, height=DEFAULT_ROI_HEIGHT):
+    """Rectángulo (x, y, ancho, alto) centrado en la imagen y recortado a sus límites"""
+    img_height, img_width = shape[:2]
+    width = min(width, img_width)
+    height = min(height, img_height)
+    x = (img_width - width) // 2
+    y = (img_height - height) // 2
+    return x, y, width, height
+
+
+@dataclass(frozen=True)
+class NormalizedROI:
+    """ROI en coordenadas relativas (centro, ancho y alto en fracción de la imagen)"""
+    cx: float
+    cy: float
+    width: float
+    height: float
+
+    def to_pixels(self, shape):
+        """Rectángulo (x, y, ancho, alto) en píxeles para una imagen de esa forma"""
+        img_height, img_width = shape[:2]
+        width = max(1, min(img_width, int(round(self.width * img_width))))
+        height = max(1, min(img_height, int(round(self.height * img_height))))
+        x = int(round(self.cx * img_width - width / 2.0))
+        y = int(round(self.cy * img_height - height / 2.0))
+        x = max(0, min(x, img_width - width))
+        y = max(0, min(y, img_height - height))
+        return x, y, width, height
+
+    @classmethod
+    def from_pixels(cls, roi, shape):
+        """Convierte un rectángulo en píxeles a coordenadas relativas"""
+        x, y, width, height = roi
+        img_height, img_width = shape[:2]
+        return cls(
+            (x + width / 2.0) / img_width,
+            (y + height / 2.0) / img_height,
+            width / float(img_width),
+            height / float(img_height),
+        )
+
+
+# Rectángulo por defecto: 250×120 px sobre el fotograma 640×480 de st.camera_input,
+# escalado proporcionalmente en capturas de cualquier resolución
+REFERENCE_FRAME = (480, 640)
+DEFAULT_ROI = NormalizedROI.from_pixels(
+    centered_roi(REFERENCE_FRAME, DEFAULT_ROI_WIDTH, DEFAULT_ROI_HEIGHT), REFERENCE_FRAME
+)
+
+
+def default_roi(shape):
+    """Rectángulo por defecto en píxeles para una imagen de esa forma
+
+    Crece proporcionalmente con la resolución (DEFAULT_ROI) pero nunca es
+    menor que los 250×120 px originales, para que las capturas pequeñas o ya
+    recortadas se sigan analizando casi enteras.
+    """
+    _, _, width, height = DEFAULT_ROI.to_pixels(shape)
+    return centered_roi(shape, max(width, DEFAULT_ROI_WIDTH), max(height, DEFAULT_ROI_HEIGHT))
+
+
+def resolve_roi(roi, shape):
+    """Acepta un rectángulo en píxeles o un NormalizedROI y devuelve píxeles
+
+    El rectángulo se recorta a los límites de la imagen: un índice negativo en
+    el slicing de numpy contaría desde el borde opuesto.
+    """
+    if isinstance(roi, NormalizedROI):
+        return roi.to_pixels(shape)
+    img_height, img_width = shape[:2]
+    x, y, width, height = (int(v) for v in roi)
+    x0, y0 = min(max(0, x), img_width), min(max(0, y), img_height)
+    x1, y1 = max(x0, min(x + width, img_width)), max(y0, min(y + height, img_height))
+    return x0, y0, x1 - x0, y1 - y0
+
+
+@timed("encode")
+def image_to_base64(image):
+    """Convierte imagen OpenCV a base64"""
+    try:
+        # Convertir BGR to RGB
+        if len(image.shape) == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        # Convertir a PIL Image
+        pil_image = Image.fromarray(image)
+        # Convertir a bytes
+        buffered = io.BytesIO()
+        pil_image.save(buffered, format="JPEG", quality=85)
+        # Convertir a base64
+        img_str = base64.b64encode(buffered.getvalue()).decode()
+        return img_str
+    except Exception as e:
+        logger.error("Error convirtiendo imagen: %s", e)
+        return None
+
+
+# Etapas compartidas: el objeto CLAHE se crea una vez y no en cada llamada
+_GRAY = Grayscale()
+_CLAHE = Clahe(clip=2.0, tile=8)
+
+
+def preprocess_image(image):
+    """Preprocesamiento simple para mejorar la imagen
+
+    Sin medir: la usan la detección y la subida, que ya tienen su etapa; la
+    etapa «preprocess» es la del PreprocessPipeline.
+    """
+    try:
+        # Mejorar contraste
+        return _CLAHE(_GRAY(image))
+
+    except Exception:
+        return image
@@ -0,0 +1,242 @@
+"""Cola de trabajos en segundo plano con concurrencia acotada y reparto justo
+
+Los reconocimientos se encolan y devuelven un ``job_id`` al instante; un
+número fijo de hilos los ejecuta atendiendo a los propietarios (sesiones) por
+turnos, de modo que un usuario con muchos trabajos no retrasa a los demás.
+El estado de cada trabajo se consulta con ``get`` y puede cancelarse o
+reintentarse.
+"""
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from .config import get_setting
+from .errors import ErrorKind, QueueFullError
+from .metrics import inc, observe
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+@dataclass
+class Job:
+    """Trabajo encolado: función, estado y resultado"""
+    job_id: str
+    owner: str
+    func: object
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    status: str = QUEUED
+    result: object = None
+    error: str = None
+    error_kind: ErrorKind = None
+    attempt: int = 1
+    submitted: float = field(default_factory=time.monotonic)
+    started: float = None
+    finished: float = None
+    cancel_requested: bool = False
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    @property
+    def elapsed(self):
+        """Segundos desde que se encoló hasta que terminó (o hasta ahora)"""
+        return (self.finished or time.monotonic()) - self.submitted
+
+
+class JobQueue:
+    """Ejecutor compartido: ``workers`` hilos y como mucho ``max_pending`` trabajos por propietario"""
+
+    def __init__(self, workers=None, max_pending=None, ttl=None):
+        self.workers = workers or get_setting("jobs_workers")
+        self.max_pending = max_pending or get_setting("jobs_max_pending")
+        self.ttl = ttl if ttl is not None else get_setting("jobs_ttl")
+        self._cond = threading.Condition()
+        self._jobs = OrderedDict()   # job_id → Job, en orden de llegada
+        self._queues = {}            # propietario → deque de job_id pendientes
+        self._turns = deque()        # propietarios con trabajo pendiente, por turno
+        self._running = 0
+        self._threads = []
+        self._counter = itertools.count(1)
+
+    def _start_workers(self):
+        # Llamado con el lock tomado: los hilos se crean con el primer trabajo
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"scanner-job-{len(self._threads)}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, owner, func, *args, **kwargs):
+        """Encola ``func(*args, **kwargs)`` para ``owner`` y devuelve el job_id
+
+        Lanza QueueFullError si el propietario ya tiene ``max_pending`` trabajos
+        sin terminar.
+        """
+        with self._cond:
+            self._expire()
+            pending = sum(1 for job in self._jobs.values() if job.owner == owner and not job.done)
+            if pending >= self.max_pending:
+                inc("scanner_jobs_total", status="rejected")
+                raise QueueFullError(f"Ya hay {pending} análisis en curso; espera a que terminen")
+            job = Job(job_id=f"{next(self._counter)}-{uuid.uuid4().hex[:8]}", owner=owner,
+                      func=func, args=args, kwargs=kwargs)
+            self._enqueue(job)
+            self._start_workers()
+            return job.job_id
+
+    def _enqueue(self, job):
+        self._jobs[job.job_id] = job
+        queue = self._queues.setdefault(job.owner, deque())
+        if not queue:
+            self._turns.append(job.owner)
+        queue.append(job.job_id)
+        inc("scanner_jobs_total", status=QUEUED)
+        self._cond.notify()
+
+    def _next_job(self):
+        # Turno rotatorio: un trabajo de cada propietario antes de repetir
+        while self._turns:
+            owner = self._turns.popleft()
+            queue = self._queues[owner]
+            job_id = queue.popleft()
+            if queue:
+                self._turns.append(owner)
+            else:
+                del self._queues[owner]
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == QUEUED:
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                job.status = RUNNING
+                job.started = time.monotonic()
+                self._running += 1
+            observe("scanner_job_wait_seconds", job.started - job.submitted)
+
+            try:
+                result, error, error_kind = job.func(*job.args, **job.kwargs), None, None
+            except Exception as e:
+                result, error = None, str(e) or type(e).__name__
+                error_kind = getattr(e, "kind", ErrorKind.INTERNAL)
+
+            with self._cond:
+                self._running -= 1
+                job.finished = time.monotonic()
+                if job.cancel_requested:
+                    # No se puede interrumpir una llamada en curso: se descarta su resultado
+                    job.status = CANCELLED
+                elif error is None:
+                    job.status, job.result = DONE, result
+                else:
+                    job.status, job.error, job.error_kind = FAILED, error, error_kind
+                self._cond.notify_all()
+            observe("scanner_job_run_seconds", job.finished - job.started)
+            inc("scanner_jobs_total", status=job.status)
+
+    def get(self, job_id):
+        """Trabajo por id, o None si no existe o ya caducó"""
+        with self._cond:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def position(self, job_id):
+        """Trabajos que se atenderán antes que éste (0 si está en marcha o terminado)"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return 0
+            # Simular los turnos sobre una copia de las colas
+            queues = {owner: [other for other in queue
+                              if getattr(self._jobs.get(other), "status", None) == QUEUED]
+                      for owner, queue in self._queues.items()}
+            turns = deque(owner for owner in self._turns if queues[owner])
+            ahead = 0
+            while turns:
+                owner = turns.popleft()
+                if queues[owner].pop(0) == job_id:
+                    return ahead
+                ahead += 1
+                if queues[owner]:
+                    turns.append(owner)
+            return ahead
+
+    def wait(self, job_id, timeout=None):
+        """Espera a que termine el trabajo y lo devuelve (o None si no existe)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None or job.done:
+                    return job
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return job
+                self._cond.wait(remaining)
+
+    def cancel(self, job_id):
+        """Cancela un trabajo pendiente; si ya está en marcha, su resultado se descartará"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished = time.monotonic()
+                inc("scanner_jobs_total", status=CANCELLED)
+                self._cond.notify_all()
+            else:
+                job.cancel_requested = True
+            return True
+
+    def retry(self, job_id):
+        """Vuelve a encolar un trabajo terminado con los mismos argumentos; devuelve el nuevo id"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or not job.done:
+                raise KeyError(job_id)
+        new_id = self.submit(job.owner, job.func, *job.args, **job.kwargs)
+        with self._cond:
+            self._jobs[new_id].attempt = job.attempt + 1
+        return new_id
+
+    def _expire(self):
+        # Llamado con el lock tomado: olvidar los trabajos terminados hace más de ttl s
+        deadline = time.monotonic() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.done and job.finished < deadline]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._cond:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": statuses.count(QUEUED),
+                "owners": len(self._queues),
+                "finished": sum(1 for status in statuses if status in FINISHED),
+            }
+
+
+@lru_cache(maxsize=1)
+def get_job_queue():
+    """Cola compartida por todas las sesiones del proceso (SCANNER_JOBS_*)"""
+    return JobQueue()
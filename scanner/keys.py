@@ -0,0 +1,228 @@
+"""Rotación de claves de OCR.space con cuota y límite de ritmo por clave
+
+Cada clave tiene un cubo de tokens (``rate`` peticiones/s con ráfagas de
+hasta ``burst``), un contador diario frente a ``daily_quota`` y un periodo de
+enfriamiento tras un 429 (demasiadas peticiones) o un 403 (clave rechazada o
+cuota agotada). Un 429 aislado sólo aparta la clave lo que pida Retry-After
+o unos segundos crecientes; el enfriamiento largo llega tras ``strikes`` 429
+seguidos, para no bloquear a todos los procesos por un pico momentáneo.
+Cada petición usa la clave con más margen. El estado se guarda en un fichero
+JSON protegido con un cerrojo, así varios procesos de Streamlit se reparten
+las mismas claves sin pisarse.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from .config import get_setting
+from .errors import OCRRateLimitError
+from .metrics import inc
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: sin cerrojo entre procesos, sólo entre hilos
+    fcntl = None
+
+
+def key_id(key):
+    """Identificador de una clave para el fichero de estado y las métricas (nunca la clave)"""
+    return hashlib.sha256(key.encode()).hexdigest()[:12]
+
+
+def load_keys():
+    """Claves de SCANNER_OCR_API_KEYS (separadas por comas) o, si no hay, SCANNER_OCR_API_KEY"""
+    keys = [key.strip() for key in get_setting("ocr_api_keys").split(",") if key.strip()]
+    return keys or [get_setting("ocr_api_key")]
+
+
+class KeyManager:
+    """Reparte las peticiones entre varias claves según su margen disponible
+
+    ``rate`` 0 desactiva el límite de ritmo y ``daily_quota`` 0 el de cuota;
+    sin ``state_path`` el estado sólo se comparte dentro del proceso.
+    """
+
+    def __init__(self, keys, rate=None, burst=None, daily_quota=None, cooldown=None,
+                 forbidden_cooldown=None, state_path=None, max_wait=None, strikes=None):
+        if not keys:
+            raise ValueError("No hay claves de OCR.space configuradas")
+        self.keys = list(dict.fromkeys(keys))
+        self.rate = rate if rate is not None else get_setting("ocr_key_rate")
+        self.burst = burst if burst is not None else get_setting("ocr_key_burst")
+        self.daily_quota = daily_quota if daily_quota is not None else get_setting("ocr_key_daily_quota")
+        self.cooldown = cooldown if cooldown is not None else get_setting("ocr_key_cooldown")
+        self.forbidden_cooldown = (forbidden_cooldown if forbidden_cooldown is not None
+                                   else get_setting("ocr_key_forbidden_cooldown"))
+        self.state_path = state_path if state_path is not None else get_setting("ocr_key_state")
+        self.max_wait = max_wait if max_wait is not None else get_setting("ocr_key_max_wait")
+        self.strikes = strikes if strikes is not None else get_setting("ocr_key_strikes")
+        self._ids = {key: key_id(key) for key in self.keys}
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._dirty = False
+
+    # ---------- estado compartido ----------
+    @contextmanager
+    def _locked_state(self):
+        """Estado de todas las claves, leído bajo cerrojo
+
+        Sólo se reescribe el fichero si el bloque llamó a ``_changed`` (una
+        petición reservada, un enfriamiento o un cambio en los 429 seguidos):
+        el relleno del cubo de tokens se recalcula al leer y no hace falta
+        guardarlo, así que las consultas y las respuestas correctas no escriben.
+        """
+        with self._lock:
+            self._dirty = False
+            if not self.state_path:
+                yield self._memory
+                return
+            directory = os.path.dirname(os.path.abspath(self.state_path))
+            os.makedirs(directory, exist_ok=True)
+            with open(self.state_path + ".lock", "a+") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    try:
+                        with open(self.state_path, encoding="utf-8") as f:
+                            state = json.load(f)
+                    except (OSError, ValueError):
+                        state = {}
+                    yield state
+                    if self._dirty:
+                        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                        with os.fdopen(fd, "w", encoding="utf-8") as f:
+                            json.dump(state, f)
+                        os.replace(tmp_path, self.state_path)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _changed(self):
+        """Indica que el estado cambió y debe guardarse al salir de _locked_state"""
+        self._dirty = True
+
+    def _entry(self, state, key, now):
+        entry = state.setdefault(self._ids[key], {})
+        today = time.strftime("%Y-%m-%d", time.gmtime(now))
+        if entry.get("day") != today:
+            entry.update(day=today, used=0)
+        entry.setdefault("cooldown_until", 0.0)
+        entry.setdefault("strikes", 0)
+        # Rellenar el cubo con el tiempo transcurrido desde la última petición
+        if self.rate:
+            elapsed = max(0.0, now - entry.get("updated", now))
+            entry["tokens"] = min(self.burst, entry.get("tokens", self.burst) + elapsed * self.rate)
+        else:
+            entry["tokens"] = self.burst
+        entry["updated"] = now
+        return entry
+
+    def _wait_for(self, entry, now):
+        """Segundos hasta que la clave pueda usarse (None si no se recupera hoy)"""
+        if self.daily_quota and entry["used"] >= self.daily_quota:
+            return None
+        wait = max(0.0, entry["cooldown_until"] - now)
+        if self.rate and entry["tokens"] < 1:
+            wait = max(wait, (1 - entry["tokens"]) / self.rate)
+        return wait
+
+    def _headroom(self, entry):
+        quota = (1 - entry["used"] / float(self.daily_quota)) if self.daily_quota else 1.0
+        return entry["tokens"] + quota
+
+    # ---------- API ----------
+    def acquire(self, exclude=()):
+        """Reserva una petición en la clave con más margen y la devuelve
+
+        Espera como mucho ``max_wait`` s a que alguna clave recupere tokens;
+        si ninguna puede usarse a tiempo lanza OCRRateLimitError.
+        """
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            now = time.time()
+            with self._locked_state() as state:
+                waits = {}
+                for key in self.keys:
+                    if key in exclude and len(exclude) < len(self.keys):
+                        continue
+                    entry = self._entry(state, key, now)
+                    waits[key] = (self._wait_for(entry, now), entry)
+                # Más margen primero; a igualdad, la clave menos usada hoy
+                ready = [(self._headroom(entry), -entry["used"], key)
+                         for key, (wait, entry) in waits.items() if wait == 0]
+                if ready:
+                    key = max(ready)[2]
+                    entry = waits[key][1]
+                    entry["tokens"] -= 1
+                    entry["used"] += 1
+                    self._changed()
+                    inc("scanner_ocr_key_requests_total", key=self._ids[key])
+                    return key
+                pending = [wait for wait, _ in waits.values() if wait is not None]
+
+            inc("scanner_ocr_key_throttled_total")
+            if not pending or time.monotonic() + min(pending) > deadline:
+                raise OCRRateLimitError("Todas las claves de OCR.space agotaron su cuota o su ritmo")
+            time.sleep(min(pending) + 0.01)
+
+    def report(self, key, status_code, retry_after=None):
+        """Registra la respuesta HTTP de una clave: 429 y 403 la dejan en enfriamiento
+
+        Un 429 espera ``retry_after`` (o 1, 2, 4... s) y sólo tras ``strikes``
+        seguidos se aplica ``cooldown``; una respuesta correcta pone la cuenta a cero.
+        """
+        if status_code not in (403, 429):
+            with self._locked_state() as state:
+                entry = state.get(self._ids[key])
+                if entry and entry.get("strikes"):
+                    entry["strikes"] = 0
+                    self._changed()
+            return
+        now = time.time()
+        with self._locked_state() as state:
+            entry = self._entry(state, key, now)
+            if status_code == 403:
+                cooldown = self.forbidden_cooldown
+            else:
+                entry["strikes"] += 1
+                if entry["strikes"] >= self.strikes:
+                    cooldown = self.cooldown
+                elif retry_after is not None:
+                    cooldown = min(retry_after, self.cooldown)
+                else:
+                    cooldown = min(2.0 ** (entry["strikes"] - 1), self.cooldown)
+            entry["cooldown_until"] = max(entry["cooldown_until"], now + cooldown)
+            entry["tokens"] = min(entry["tokens"], 0.0)
+            self._changed()
+        inc("scanner_ocr_key_rejections_total", key=self._ids[key], status=status_code)
+
+    def available(self, exclude=()):
+        """Indica si alguna clave (fuera de ``exclude``) puede usarse ya"""
+        now = time.time()
+        with self._locked_state() as state:
+            return any(self._wait_for(self._entry(state, key, now), now) == 0
+                       for key in self.keys if key not in exclude)
+
+    def snapshot(self):
+        """Estado por clave para diagnóstico (identificadores, nunca las claves)"""
+        now = time.time()
+        with self._locked_state() as state:
+            return [{
+                "key": self._ids[key],
+                "tokens": round(entry["tokens"], 2),
+                "used_today": entry["used"],
+                "quota": self.daily_quota or None,
+                "cooldown_s": round(max(0.0, entry["cooldown_until"] - now), 1),
+            } for key, entry in ((key, self._entry(state, key, now)) for key in self.keys)]
+
+
+@lru_cache(maxsize=1)
+def get_key_manager():
+    """Gestor de claves configurado (SCANNER_OCR_API_KEYS, SCANNER_OCR_KEY_*), uno por proceso"""
+    return KeyManager(load_keys())
@@ -0,0 +1,413 @@
+"""Prueba de carga de la aplicación completa con OCR.space simulado
+
+Lanza ``streamlit run app.py`` contra el servidor stub (SCANNER_OCR_API_URL) y
+abre N sesiones simultáneas por el mismo WebSocket que usa el navegador. Cada
+sesión recorre la aplicación como un usuario: carga la página, sube una foto
+con la cámara (paso 1), pasa a la alineación (paso 2), pulsa «Analizar» y
+sigue los refrescos del paso 3 hasta ver el resultado. Con el flujo ``crop``
+la foto llega ya recortada, como desde el componente de recorte en el
+navegador, y se analiza sin pasar por el paso 2.
+
+Se mide el rendimiento (sesiones por segundo) y la latencia de cada paso con
+sus percentiles, junto con lo que sirvió el stub (códigos HTTP y latencia).
+"""
+import asyncio
+import base64
+import io
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+
+import requests
+from PIL import Image
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ClientState_pb2 import ClientState
+from streamlit.proto.Common_pb2 import FileUploaderState, UploadedFileInfo
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+from .bench import percentiles
+from .scan import iter_image_paths
+from .stub_server import start_stub_server
+
+try:
+    import websockets
+except ImportError:
+    # Streamlit < 1.50 usa tornado y no instala websockets
+    websockets = None
+
+FLOWS = ("camera", "crop")
+# Pasos medidos en cada flujo, en orden
+STEPS = {
+    "camera": ("load", "capture", "align", "analyze"),
+    "crop": ("load", "capture", "analyze"),
+}
+_RESULT = re.compile(r'class="digits-result">([^<]*)<')
+
+
+class SessionError(Exception):
+    """La sesión no pudo completar el recorrido"""
+
+
+class AppSession:
+    """Cliente mínimo del protocolo del navegador (BackMsg/ForwardMsg protobuf por WebSocket)"""
+
+    def __init__(self, base_url, timeout=60.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session_id = None
+        self.page_script_hash = ""
+        self.elements = []      # (tipo, elemento) del último run completo
+        self.auto_reruns = {}   # fragment_id → intervalo en s (st.fragment(run_every=...))
+        self.widgets = {}       # id → WidgetState que el navegador reenvía en cada run
+        self._ws = None
+        self._file_urls = {}
+        self._requests = 0
+
+    async def connect(self):
+        if websockets is None:
+            raise RuntimeError("La prueba de carga necesita el paquete websockets (pip install websockets)")
+        url = "ws" + self.base_url[len("http"):] + "/_stcore/stream"
+        self._ws = await websockets.connect(url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def _send(self, msg):
+        await self._ws.send(msg.SerializeToString())
+
+    async def _receive(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise SessionError("Tiempo de espera agotado")
+        try:
+            data = await asyncio.wait_for(self._ws.recv(), remaining)
+        except asyncio.TimeoutError:
+            raise SessionError("Tiempo de espera agotado") from None
+        msg = ForwardMsg()
+        msg.ParseFromString(data)
+        return msg
+
+    def _handle(self, msg):
+        """Aplica un mensaje del servidor; devuelve el estado de fin de run o None"""
+        kind = msg.WhichOneof("type")
+        if kind == "new_session":
+            if msg.new_session.HasField("initialize"):
+                self.session_id = msg.new_session.initialize.session_id
+            self.page_script_hash = msg.new_session.page_script_hash
+            if not msg.new_session.fragment_ids_this_run:
+                # Un run completo redibuja la página y anula los refrescos anteriores
+                self.elements = []
+                self.auto_reruns = {}
+        elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+            element = msg.delta.new_element
+            self.elements.append((element.WhichOneof("type"), element))
+        elif kind == "auto_rerun":
+            self.auto_reruns[msg.auto_rerun.fragment_id] = msg.auto_rerun.interval
+        elif kind == "stop_auto_rerun":
+            for fragment_id in msg.stop_auto_rerun.fragment_ids:
+                self.auto_reruns.pop(fragment_id, None)
+        elif kind == "file_urls_response":
+            self._file_urls[msg.file_urls_response.response_id] = msg.file_urls_response
+        elif kind == "script_finished":
+            return msg.script_finished
+        return None
+
+    async def run(self, triggers=(), fragment_id=""):
+        """Pide un run del script (como un clic o un refresco) y espera a que termine
+
+        Los st.rerun() del script encadenan runs: se espera al último.
+        """
+        state = ClientState(query_string="", page_script_hash=self.page_script_hash,
+                            fragment_id=fragment_id, is_auto_rerun=bool(fragment_id))
+        state.widget_states.widgets.extend(self.widgets.values())
+        for widget_id in triggers:
+            state.widget_states.widgets.add(id=widget_id, trigger_value=True)
+        msg = BackMsg()
+        msg.rerun_script.CopyFrom(state)
+        await self._send(msg)
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            status = self._handle(await self._receive(deadline))
+            if status in (ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY):
+                break
+            if status == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                raise SessionError("Error de compilación en el script")
+        # El navegador sólo reenvía el estado de los widgets que siguen en pantalla
+        if not fragment_id:
+            present = {getattr(element, kind).id for kind, element in self.elements
+                       if hasattr(getattr(element, kind), "id")}
+            self.widgets = {key: value for key, value in self.widgets.items() if key in present}
+        exceptions = [element.exception.message for kind, element in self.elements if kind == "exception"]
+        if exceptions:
+            raise SessionError(f"Excepción en el script: {exceptions[0]}")
+
+    def find(self, kind, label=None):
+        """Primer elemento de ese tipo (y cuya etiqueta contiene ``label``) del último run"""
+        for element_kind, element in self.elements:
+            if element_kind == kind and (label is None or label in getattr(element, kind).label):
+                return getattr(element, kind)
+        raise SessionError(f"No aparece {kind} {label or ''} en la página".rstrip())
+
+    async def click(self, label):
+        await self.run(triggers=[self.find("button", label).id])
+
+    def set_json(self, widget_id, value):
+        self.widgets[widget_id] = WidgetState(id=widget_id, json_value=json.dumps(value))
+
+    async def upload(self, widget_id, name, data, http):
+        """Sube un fichero como lo hace st.camera_input y deja su estado listo para el siguiente run"""
+        self._requests += 1
+        msg = BackMsg()
+        msg.file_urls_request.request_id = str(self._requests)
+        msg.file_urls_request.file_names.append(name)
+        msg.file_urls_request.session_id = self.session_id or ""
+        await self._send(msg)
+        deadline = time.monotonic() + self.timeout
+        while str(self._requests) not in self._file_urls:
+            self._handle(await self._receive(deadline))
+        response = self._file_urls.pop(str(self._requests))
+        if response.error_msg:
+            raise SessionError(f"Subida rechazada: {response.error_msg}")
+        urls = response.file_urls[0]
+
+        upload_url = urls.upload_url if "://" in urls.upload_url else self.base_url + urls.upload_url
+        reply = await asyncio.to_thread(http.put, upload_url, files={"file": (name, data, "image/jpeg")},
+                                        timeout=self.timeout)
+        if reply.status_code >= 400:
+            raise SessionError(f"Subida rechazada: HTTP {reply.status_code}")
+        info = UploadedFileInfo(name=name, size=len(data), file_id=urls.file_id, file_urls=urls)
+        self.widgets[widget_id] = WidgetState(
+            id=widget_id, file_uploader_state_value=FileUploaderState(uploaded_file_info=[info]))
+
+    def result(self):
+        """Dígitos mostrados en el paso 3 o SessionError con el mensaje de la página"""
+        for kind, element in self.elements:
+            if kind == "markdown":
+                match = _RESULT.search(element.markdown.body)
+                # La página también pinta ahí algunos errores (cortocircuito, límite de ritmo)
+                if match and match.group(1).isdigit():
+                    return match.group(1)
+                if match:
+                    raise SessionError(match.group(1))
+        alerts = [element.alert.body for kind, element in self.elements
+                  if kind == "alert" and element.alert.format in (1, 2)]
+        raise SessionError(alerts[0] if alerts else "Sin resultado en el paso 3")
+
+
+def load_captures(images):
+    """Fotos de prueba: (nombre, JPEG, ancho, alto) de los ficheros o directorios dados"""
+    captures = []
+    for path in iter_image_paths(images if isinstance(images, (list, tuple)) else [images]):
+        with open(path, "rb") as f:
+            data = f.read()
+        width, height = Image.open(io.BytesIO(data)).size
+        captures.append((os.path.basename(path), data, width, height))
+    if not captures:
+        raise ValueError(f"No hay imágenes de prueba en {images}")
+    return captures
+
+
+def _crop_value(capture):
+    # Lo que envía el componente roi_crop: la foto entera hace de recorte
+    name, data, width, height = capture
+    return {"image": base64.b64encode(data).decode(), "width": width, "height": height,
+            "roi": [0, 0, width, height], "source": [width, height]}
+
+
+async def run_session(base_url, capture, flow="camera", timeout=60.0):
+    """Recorre los pasos de la aplicación con una sesión nueva
+
+    Devuelve (ms por paso, dígitos); lanza SessionError si algo falla.
+    """
+    timings = {}
+    session = AppSession(base_url, timeout)
+    http = requests.Session()
+    mark = time.perf_counter()
+
+    def lap(step):
+        nonlocal mark
+        now = time.perf_counter()
+        timings[step] = (now - mark) * 1000
+        mark = now
+
+    try:
+        await session.connect()
+        await session.run()
+        lap("load")
+
+        if flow == "crop":
+            session.set_json(session.find("component_instance").id, _crop_value(capture))
+            await session.run()
+            lap("capture")
+        else:
+            await session.upload(session.find("camera_input").id, capture[0], capture[1], http)
+            await session.run()
+            lap("capture")
+            await session.click("Continuar")
+            lap("align")
+
+        # Paso 3: seguir los refrescos del fragmento de progreso hasta el resultado
+        await session.click("ANALIZAR")
+        deadline = time.monotonic() + timeout
+        while session.auto_reruns:
+            if time.monotonic() > deadline:
+                raise SessionError("El análisis no terminó a tiempo")
+            fragment_id, interval = next(iter(session.auto_reruns.items()))
+            await asyncio.sleep(interval)
+            await session.run(fragment_id=fragment_id)
+        digits = session.result()
+        lap("analyze")
+        return timings, digits
+    finally:
+        http.close()
+        await session.close()
+
+
+async def drive(base_url, captures, sessions=20, concurrency=5, flow="camera", timeout=60.0):
+    """``concurrency`` usuarios simultáneos que encadenan sesiones hasta completar ``sessions``"""
+    results = []
+    counter = iter(range(sessions))
+
+    async def user():
+        for index in counter:
+            start = time.perf_counter()
+            try:
+                timings, digits = await run_session(base_url, captures[index % len(captures)], flow, timeout)
+                error = None
+            except (SessionError, OSError) as e:
+                timings, digits, error = {}, None, str(e) or type(e).__name__
+            except Exception as e:
+                # Conexión cerrada por el servidor, protocolo inesperado...
+                timings, digits, error = {}, None, f"{type(e).__name__}: {e}"
+            results.append({"timings": timings, "digits": digits, "error": error,
+                            "total": (time.perf_counter() - start) * 1000})
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return results
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(app_path, port, env, log, ready_timeout=60.0):
+    """Arranca ``streamlit run`` en segundo plano y espera a que responda"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.abspath(app_path),
+         "--server.headless=true", f"--server.port={port}", "--server.address=127.0.0.1",
+         "--server.fileWatcherType=none", "--browser.gatherUsageStats=false",
+         # Las subidas del driver no llevan el token XSRF del navegador
+         "--server.enableXsrfProtection=false"],
+        env=env, cwd=os.path.dirname(os.path.abspath(app_path)), stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as reply:
+                if reply.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    log.seek(0)
+    tail = log.read().decode(errors="replace")[-2000:]
+    raise RuntimeError(f"La aplicación no arrancó:\n{tail}")
+
+
+def load_test(app_path="app.py", images="temp", sessions=20, concurrency=5, flow="camera",
+              engine="api", url=None, timeout=60.0, stub=None):
+    """Prueba de carga completa; devuelve un informe serializable a JSON
+
+    Sin ``url`` se arranca el stub (con las opciones de ``stub``, ver
+    StubOCRServer) y la aplicación apuntando a él; con ``url`` se usa una
+    aplicación ya en marcha (y su configuración de OCR). La aplicación lanzada
+    usa el motor ``engine``, sin caché de resultados ni límite de ritmo por
+    clave, salvo que el entorno diga otra cosa: así cada análisis llega al stub.
+    """
+    if flow not in FLOWS:
+        raise ValueError(f"Flujo desconocido: {flow}")
+    captures = load_captures(images)
+    server = process = log = workdir = None
+    try:
+        if url is None:
+            server = start_stub_server(**(stub or {}))
+            # Estado de claves propio: los 429 del stub no deben enfriar las claves reales
+            workdir = tempfile.mkdtemp(prefix="scanner-load-")
+            env = dict(os.environ, SCANNER_OCR_API_URL=server.url, SCANNER_OCR_ENGINE=engine,
+                       SCANNER_CLIENT_CROP="1" if flow == "crop" else "0")
+            for name, value in (("SCANNER_CACHE_BACKEND", "off"), ("SCANNER_OCR_KEY_RATE", "0"),
+                                ("SCANNER_OCR_KEY_STATE", os.path.join(workdir, "ocr_keys.json"))):
+                env.setdefault(name, value)
+            port = _free_port()
+            log = tempfile.TemporaryFile()
+            process = start_app(app_path, port, env, log)
+            url = f"http://127.0.0.1:{port}"
+
+        start = time.perf_counter()
+        results = asyncio.run(drive(url, captures, sessions, concurrency, flow, timeout))
+        duration = time.perf_counter() - start
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if log is not None:
+            log.close()
+        if server is not None:
+            server.shutdown()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    completed = [r for r in results if r["error"] is None]
+    return {
+        "url": url,
+        "flow": flow,
+        "engine": engine if server is not None else None,
+        "sessions": len(results),
+        "concurrency": concurrency,
+        "completed": len(completed),
+        "errors": dict(Counter(r["error"] for r in results if r["error"] is not None).most_common()),
+        "duration_s": round(duration, 3),
+        "throughput": round(len(completed) / duration, 3) if duration else 0.0,
+        "steps": {step: percentiles([r["timings"][step] for r in completed])
+                  for step in STEPS[flow]},
+        "total": percentiles([r["total"] for r in completed]),
+        "stub": server.stats() if server is not None else None,
+    }
+
+
+def format_load_report(report):
+    """Resumen legible de la prueba de carga"""
+    lines = [f"{report['sessions']} sesiones ({report['concurrency']} simultáneas, flujo {report['flow']}) "
+             f"en {report['duration_s']:.1f} s · {report['completed']} completas · "
+             f"{report['throughput']:.2f} sesiones/s"]
+    lines.append(f"{'paso':<10}{'p50':>10}{'p95':>10}{'p99':>10}   (ms)")
+    for step, stats in list(report["steps"].items()) + [("total", report["total"])]:
+        if stats["count"]:
+            lines.append(f"{step:<10}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}")
+    for error, count in report["errors"].items():
+        lines.append(f"{count} × {error}")
+    if report["stub"]:
+        stub = report["stub"]
+        codes = ", ".join(f"{status}: {count}" for status, count in stub["statuses"].items())
+        latency = stub["latency_ms"]
+        lines.append(f"Stub: {stub['requests']} peticiones ({codes or 'ninguna'})"
+                     + (f" · p50 {latency['p50']:.0f} ms, p99 {latency['p99']:.0f} ms" if latency else ""))
+    return "\n".join(lines)
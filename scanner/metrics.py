@@ -0,0 +1,268 @@
+"""Instrumentación: tiempos por etapa, contadores y tamaños de payload
+
+Las mediciones se acumulan en ``REGISTRY`` (un registro por proceso) y se
+exportan en formato de texto de Prometheus (``/metrics``), como JSON
+(``/metrics.json``) o como un log JSON-lines con un evento por medición.
+"""
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from .config import get_setting
+from .server import register_route, start_server
+
+# Límites de los histogramas de duración (segundos) y de tamaño (bytes)
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 131072, 262144, 524288, 1048576, 4194304)
+
+# Descripción de cada métrica para el exportador de Prometheus
+HELP = {
+    "scanner_stage_seconds": "Duración de cada etapa del escaneo",
+    "scanner_preprocess_step_seconds": "Duración de cada paso del pipeline de preprocesado",
+    "scanner_recognize_seconds": "Duración del reconocimiento por motor",
+    "scanner_recognitions_total": "Reconocimientos por motor y resultado",
+    "scanner_errors_total": "Errores por categoría",
+    "scanner_http_request_seconds": "Duración de cada intento HTTP al servicio OCR",
+    "scanner_http_requests_total": "Intentos HTTP al servicio OCR por resultado",
+    "scanner_http_retries_total": "Reintentos HTTP al servicio OCR",
+    "scanner_payload_bytes": "Tamaño de las peticiones y respuestas OCR",
+    "scanner_ensemble_exits_total": "Nivel del modo auto que dio la lectura (o 'combined')",
+    "scanner_postprocess_total": "Lecturas validadas por formato: válidas, corregidas, releídas o inválidas",
+    "scanner_sweep_total": "Barridos de giros y escalas con lectura fiable (hit) o sin ella (miss)",
+    "scanner_sweep_recognitions_total": "Variantes del barrido enviadas al motor",
+    "scanner_results_written_total": "Lecturas volcadas al log de resultados",
+    "scanner_results_dropped_total": "Lecturas descartadas por búfer lleno antes de volcarse",
+    "scanner_jobs_total": "Trabajos en segundo plano por estado",
+    "scanner_job_wait_seconds": "Tiempo en cola de cada trabajo",
+    "scanner_job_run_seconds": "Tiempo de ejecución de cada trabajo",
+    "scanner_ocr_key_requests_total": "Peticiones OCR asignadas a cada clave",
+    "scanner_ocr_key_rejections_total": "Respuestas 429/403 por clave",
+    "scanner_ocr_key_throttled_total": "Esperas por falta de tokens o cuota en todas las claves",
+    "scanner_video_frames_total": "Fotogramas de vídeo descartados, reconocidos o saltados",
+}
+
+
+class Histogram:
+    """Histograma acumulativo con límites fijos"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def quantile(self, q):
+        """Cuantil aproximado interpolando dentro del intervalo (como histogram_quantile)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            if count and seen + count >= rank:
+                if bound == float("inf"):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return lower
+
+
+def _key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsRegistry:
+    """Contadores e histogramas con etiquetas, seguros entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._sinks = []
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            key = (name, _key(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._emit(name, value, labels)
+
+    def observe(self, name, value, buckets=TIME_BUCKETS, **labels):
+        with self._lock:
+            key = (name, _key(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+        self._emit(name, value, labels)
+
+    @contextmanager
+    def timer(self, name="scanner_stage_seconds", **labels):
+        """Mide el bloque y lo registra en segundos"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def add_sink(self, sink):
+        """Recibe cada medición como dict (p. ej. JsonLinesSink)"""
+        self._sinks.append(sink)
+
+    def _emit(self, name, value, labels):
+        if not self._sinks:
+            return
+        event = {"ts": round(time.time(), 3), "metric": name, "value": value,
+                 "labels": {k: str(v) for k, v in labels.items()}}
+        for sink in list(self._sinks):
+            sink(event)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """Estado serializable a JSON: contadores e histogramas con sus cuantiles"""
+        with self._lock:
+            counters = [{"metric": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [{
+                "metric": name,
+                "labels": dict(labels),
+                "count": h.count,
+                "sum": round(h.sum, 6),
+                "p50": h.quantile(0.5),
+                "p95": h.quantile(0.95),
+                "p99": h.quantile(0.99),
+            } for (name, labels), h in sorted(self._histograms.items())]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self):
+        """Exposición en formato de texto de Prometheus"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (h.buckets, list(h.counts), h.count, h.sum))
+                                for key, h in self._histograms.items())
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), (buckets, counts, count, total) in histograms:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class JsonLinesSink:
+    """Añade cada medición como una línea JSON a un fichero"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, event):
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+REGISTRY = MetricsRegistry()
+
+
+def inc(name, value=1, **labels):
+    REGISTRY.inc(name, value, **labels)
+
+
+def observe(name, value, buckets=TIME_BUCKETS, **labels):
+    REGISTRY.observe(name, value, buckets, **labels)
+
+
+def timer(stage):
+    """Context manager que mide una etapa en scanner_stage_seconds"""
+    return REGISTRY.timer("scanner_stage_seconds", stage=stage)
+
+
+def timed(stage):
+    """Decorador equivalente a ``with timer(stage)``"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_result(result):
+    """Registra duración y resultado (ok o categoría de error) de un reconocimiento"""
+    outcome = "ok" if result.ok else (result.error_kind or "error")
+    observe("scanner_recognize_seconds", result.elapsed_ms / 1000.0, engine=result.engine)
+    inc("scanner_recognitions_total", engine=result.engine, outcome=getattr(outcome, "value", outcome))
+    if result.error_kind is not None:
+        inc("scanner_errors_total", kind=result.error_kind.value)
+
+
+def configure(port=None, log_path=None, host=None):
+    """Activa el endpoint HTTP y el log JSON-lines según SCANNER_METRICS_*
+
+    Devuelve el servidor arrancado o None si no hay puerto configurado.
+    """
+    port = port if port is not None else get_setting("metrics_port")
+    log_path = log_path if log_path is not None else get_setting("metrics_log")
+    if log_path:
+        REGISTRY.add_sink(JsonLinesSink(log_path))
+    if port:
+        return start_server(host or get_setting("metrics_host"), port)
+    return None
+
+
+def _prometheus_route(query):
+    return 200, "text/plain; version=0.0.4; charset=utf-8", REGISTRY.to_prometheus()
+
+
+def _json_route(query):
+    return 200, "application/json", json.dumps(REGISTRY.snapshot(), ensure_ascii=False)
+
+
+register_route("/metrics", _prometheus_route)
+register_route("/metrics.json", _json_route)
@@ -0,0 +1,218 @@
+"""Cliente HTTP de OCR.space con conexiones persistentes, reintentos y cortocircuito"""
+import asyncio
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import get_setting
+from .errors import (
+    CircuitOpenError,
+    ErrorKind,
+    OCRAPIError,
+    OCRConnectionError,
+    OCRHTTPError,
+    OCRRateLimitError,
+    OCRTimeoutError,
+)
+from .keys import KeyManager, get_key_manager
+from .metrics import BYTE_BUCKETS, inc, observe
+
+# Códigos HTTP que merecen reintento (sobrecarga o fallo transitorio del servidor)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Códigos que señalan un problema de la clave: se reintenta con otra
+KEY_STATUS = {403, 429}
+
+
+def _retry_after(response):
+    """Segundos de la cabecera Retry-After (None si falta o es una fecha)"""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Corta las llamadas tras varios fallos seguidos y las reanuda tras una pausa"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Indica si se puede intentar una llamada"""
+        return self.state != self.OPEN
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            # En semiabierto basta un fallo para volver a abrir
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class OCRSpaceClient:
+    """Cliente síncrono de /parse/image con un pool de conexiones reutilizable"""
+
+    def __init__(self, url=None, api_key=None, connect_timeout=None, read_timeout=None,
+                 retries=None, backoff=None, backoff_max=None, pool_size=None, breaker=None,
+                 keys=None):
+        self.url = url or get_setting("ocr_api_url")
+        # Una clave explícita no se limita; si no, el gestor de claves compartido
+        if keys is None:
+            keys = (KeyManager([api_key], rate=0, daily_quota=0, state_path="")
+                    if api_key else get_key_manager())
+        self.keys = keys
+        self.connect_timeout = connect_timeout or get_setting("ocr_connect_timeout")
+        self.read_timeout = read_timeout or get_setting("ocr_timeout")
+        self.retries = retries if retries is not None else get_setting("ocr_retries")
+        self.backoff = backoff if backoff is not None else get_setting("ocr_backoff")
+        self.backoff_max = backoff_max or get_setting("ocr_backoff_max")
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=get_setting("ocr_breaker_threshold"),
+            reset_timeout=get_setting("ocr_breaker_reset"),
+        )
+
+        pool_size = pool_size or get_setting("ocr_pool_size")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _sleep_before_retry(self, attempt):
+        # Backoff exponencial con jitter completo
+        delay = min(self.backoff_max, self.backoff * (2 ** attempt))
+        time.sleep(random.uniform(0, delay))
+
+    def _post(self, payload):
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            response = self.session.post(
+                self.url, data=payload, timeout=(self.connect_timeout, self.read_timeout)
+            )
+            observe("scanner_payload_bytes", len(response.content), BYTE_BUCKETS, kind="response")
+            if response.status_code != 200:
+                outcome = str(response.status_code)
+                raise OCRHTTPError(response.status_code, retry_after=_retry_after(response))
+            try:
+                return response.json()
+            except ValueError as e:
+                outcome = ErrorKind.API.value
+                raise OCRAPIError("Respuesta no válida del servicio OCR") from e
+        except requests.exceptions.Timeout as e:
+            outcome = ErrorKind.TIMEOUT.value
+            raise OCRTimeoutError(str(e)) from e
+        except requests.exceptions.RequestException as e:
+            outcome = ErrorKind.CONNECTION.value
+            raise OCRConnectionError(str(e)) from e
+        finally:
+            observe("scanner_http_request_seconds", time.perf_counter() - start)
+            inc("scanner_http_requests_total", outcome=outcome)
+
+    def parse_image(self, base64_image, ocr_engine=None, overlay=False, language="eng",
+                    mime="image/jpeg", **params):
+        """Envía una imagen en base64 y devuelve la respuesta JSON ya validada"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("Servicio OCR temporalmente no disponible")
+
+        payload = {
+            "base64Image": f"data:{mime};base64,{base64_image}",
+            "language": language,
+            "isOverlayRequired": overlay,
+            "OCREngine": ocr_engine or get_setting("ocr_api_engine"),
+        }
+        payload.update(params)
+        observe("scanner_payload_bytes", len(payload["base64Image"]), BYTE_BUCKETS, kind="request")
+
+        rejected = set()
+        for attempt in range(self.retries + 1):
+            try:
+                key = self.keys.acquire(exclude=rejected)
+            except OCRRateLimitError as e:
+                # Sin clave a tiempo: seguir con el backoff normal en lugar de rendirse ya
+                if attempt == self.retries:
+                    raise
+                inc("scanner_http_retries_total", kind=e.kind.value)
+                self._sleep_before_retry(attempt)
+                continue
+            payload["apikey"] = key
+            try:
+                result = self._post(payload)
+                self.keys.report(key, 200)
+                break
+            except (OCRTimeoutError, OCRConnectionError, OCRHTTPError) as e:
+                status = getattr(e, "status_code", None)
+                if status in KEY_STATUS:
+                    self.keys.report(key, status, retry_after=e.retry_after)
+                    rejected.add(key)
+                retryable = not isinstance(e, OCRHTTPError) or status in RETRYABLE_STATUS
+                # Un 403 sólo se reintenta si queda otra clave que probar
+                if status == 403 and len(rejected) < len(self.keys.keys):
+                    retryable = True
+                if not retryable:
+                    raise
+                if attempt == self.retries:
+                    # Sólo cuenta para el circuito la llamada que agotó sus reintentos
+                    self.breaker.record_failure()
+                    raise
+                inc("scanner_http_retries_total", kind=e.kind.value)
+                # Con otra clave disponible no hace falta esperar
+                if status not in KEY_STATUS or not self.keys.available(exclude=rejected):
+                    self._sleep_before_retry(attempt)
+
+        self.breaker.record_success()
+
+        if result.get("IsErroredOnProcessing"):
+            message = result.get("ErrorMessage") or "Error desconocido"
+            if isinstance(message, list):
+                message = "; ".join(message)
+            raise OCRAPIError(message)
+        return result
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncOCRSpaceClient:
+    """Variante asyncio: ejecuta el cliente síncrono en hilos con concurrencia acotada"""
+
+    def __init__(self, client=None, max_concurrency=None):
+        self.client = client or OCRSpaceClient()
+        self.max_concurrency = max_concurrency or get_setting("ocr_pool_size")
+        self._semaphore = None
+
+    async def parse_image(self, base64_image, **options):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await asyncio.to_thread(self.client.parse_image, base64_image, **options)
+
+    async def parse_many(self, base64_images, **options):
+        """Procesa varias imágenes en paralelo; los errores se devuelven en su posición"""
+        return await asyncio.gather(
+            *(self.parse_image(image, **options) for image in base64_images),
+            return_exceptions=True,
+        )
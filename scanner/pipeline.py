@@ -0,0 +1,165 @@
+"""Pipeline paralelo: decodificar/recortar en procesos → reconocer en hilos"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from .config import get_setting
+from .detect import propose_regions, recognize_first_confident
+from .errors import ErrorKind
+from .frame import FrameContext
+from .metrics import observe
+from .preprocess import PreprocessPipeline, get_preprocessor
+from .scan import crop_rois, iter_image_paths, load_image, make_record
+
+
+def _load_crops(path, rois, preprocess, detect):
+    """Etapa de CPU (en un proceso hijo): lee, decodifica, recorta y preprocesa
+
+    Devuelve (ruta, recortes, error, ms, candidatas): con ``candidatas`` a True
+    los recortes son regiones detectadas, de mejor a peor, y basta con leer una.
+    """
+    start = time.perf_counter()
+    try:
+        image = load_image(path)
+    except (OSError, ValueError) as e:
+        return path, None, str(e), (time.perf_counter() - start) * 1000, False
+
+    candidates = propose_regions(image) if detect and not rois else []
+    if candidates:
+        # El rectángulo centrado queda como último recurso tras las regiones detectadas
+        regions = [c.roi for c in candidates]
+        regions.extend(roi for roi, crop in crop_rois(image) if crop is not None)
+        # Todas viajan al hilo de reconocimiento: la captura se preprocesa una vez
+        frame = FrameContext(image, preprocess or PreprocessPipeline([]))
+        crops = list(zip(regions, frame.prepare_many(regions)))
+    else:
+        crops = crop_rois(image, rois)
+        if preprocess is not None:
+            crops = [(roi, preprocess(crop) if crop is not None else None) for roi, crop in crops]
+    return path, crops, None, (time.perf_counter() - start) * 1000, bool(candidates)
+
+
+def _recognize_candidates(recognizer, crops):
+    """Etapa de E/S para regiones detectadas: la primera lectura fiable gana"""
+    result, index = recognize_first_confident([crop for _, crop in crops], recognizer)
+    return result, crops[index][0]
+
+
+class ScanPipeline:
+    """Escaneo masivo con colas acotadas entre etapas y cancelación ordenada
+
+    Las imágenes se decodifican y recortan en un pool de procesos (CPU) y los
+    recortes se reconocen en un pool de hilos (E/S hacia la API). Como mucho
+    ``max_pending`` ficheros están a la vez entre la lectura y la entrega, lo
+    que limita la memoria aunque el consumidor sea lento.
+    """
+
+    def __init__(self, recognizer, rois=None, processes=None, threads=None,
+                 max_pending=None, ordered=False, preprocess=None, detect=False):
+        self.recognizer = recognizer
+        self.rois = rois
+        self.processes = processes or get_setting("pipeline_processes") or os.cpu_count() or 1
+        self.threads = threads or get_setting("pipeline_threads")
+        self.max_pending = max_pending or max(2 * self.processes, self.threads)
+        self.ordered = ordered
+        # Función serializable aplicada a cada recorte en el proceso hijo
+        # (por defecto el pipeline de SCANNER_PREPROCESS)
+        self.preprocess = preprocess or get_preprocessor()
+        # Sin ROIs explícitos, localizar las líneas de dígitos de cada imagen
+        self.detect = detect
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Deja de admitir ficheros y descarta el trabajo pendiente"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self, paths):
+        """Genera los registros de cada ROI; en modo ordenado, en el orden de entrada"""
+        paths = iter(enumerate(iter_image_paths(paths)))
+        decode_pool = ProcessPoolExecutor(max_workers=self.processes)
+        recognize_pool = ThreadPoolExecutor(max_workers=self.threads)
+
+        decoding = {}      # future → índice del fichero
+        recognizing = {}   # future → (índice, posición del ROI)
+        partial = {}       # índice → lista de registros (None = pendiente)
+        finished = {}      # índice → registros completos aún sin entregar
+        next_index = 0
+        in_flight = 0
+        exhausted = False
+
+        try:
+            while not self.cancelled:
+                # Alimentar la etapa de decodificación respetando el límite de ficheros en vuelo
+                while not exhausted and in_flight < self.max_pending:
+                    item = next(paths, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    index, path = item
+                    future = decode_pool.submit(_load_crops, path, self.rois,
+                                                self.preprocess, self.detect)
+                    decoding[future] = index
+                    in_flight += 1
+
+                if not decoding and not recognizing:
+                    break
+
+                done, _ = wait(list(decoding) + list(recognizing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in decoding:
+                        index = decoding.pop(future)
+                        path, crops, error, elapsed_ms, detected = future.result()
+                        # Las métricas del proceso hijo no llegan al registro: medir aquí la etapa
+                        observe("scanner_stage_seconds", elapsed_ms / 1000.0, stage="load")
+                        if crops is None:
+                            finished[index] = [make_record(path, None, error=error,
+                                                           error_kind=ErrorKind.DECODE,
+                                                           elapsed_ms=elapsed_ms)]
+                            continue
+                        if detected:
+                            partial[index] = [None]
+                            task = recognize_pool.submit(_recognize_candidates, self.recognizer, crops)
+                            recognizing[task] = (index, 0, path, None)
+                            continue
+                        partial[index] = [None] * len(crops)
+                        for position, (roi, crop) in enumerate(crops):
+                            if crop is None:
+                                partial[index][position] = make_record(
+                                    path, roi, error="ROI fuera de la imagen",
+                                    error_kind=ErrorKind.INVALID_ROI)
+                                continue
+                            task = recognize_pool.submit(self.recognizer.recognize, crop)
+                            recognizing[task] = (index, position, path, roi)
+                        if all(record is not None for record in partial[index]):
+                            finished[index] = partial.pop(index)
+                    else:
+                        index, position, path, roi = recognizing.pop(future)
+                        result = future.result()
+                        if roi is None:
+                            result, roi = result
+                        partial[index][position] = make_record(path, roi, result)
+                        if all(record is not None for record in partial[index]):
+                            finished[index] = partial.pop(index)
+
+                # Entregar resultados (en orden o según terminan)
+                if self.ordered:
+                    while next_index in finished:
+                        records = finished.pop(next_index)
+                        next_index += 1
+                        in_flight -= 1
+                        yield from records
+                else:
+                    for index in sorted(finished):
+                        in_flight -= 1
+                        yield from finished.pop(index)
+        finally:
+            # Cancelación ordenada: descartar lo pendiente sin esperar a la API
+            for future in list(decoding) + list(recognizing):
+                future.cancel()
+            decode_pool.shutdown(wait=False, cancel_futures=True)
+            recognize_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,286 @@
+"""Pipeline de preprocesado declarativo: gris → CLAHE → filtrado → umbral → enderezado → escala
+
+Cada etapa es un objeto reutilizable (los recursos caros, como el CLAHE de
+OpenCV, se crean una sola vez) y el pipeline mide cuánto tarda cada una. Se
+configura con una especificación de texto, p. ej.::
+
+    SCANNER_PREPROCESS="gray,clahe:clip=3.0,denoise:method=bilateral,deskew"
+"""
+import threading
+import time
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from .config import get_setting
+from .metrics import observe
+
+
+class Stage:
+    """Etapa de preprocesado: recibe una imagen y devuelve otra
+
+    ``frame_level`` indica que la etapa puede aplicarse una sola vez a la
+    captura completa y recortar después (operaciones píxel a píxel o de
+    vecindad local); las que dependen del recorte entero (umbral, enderezado,
+    escala) se aplican a cada ROI.
+    """
+    name = "stage"
+    frame_level = False
+
+    def __call__(self, image):
+        raise NotImplementedError
+
+    def __repr__(self):
+        params = ", ".join(f"{k}={v!r}" for k, v in vars(self).items() if not k.startswith("_"))
+        return f"{type(self).__name__}({params})"
+
+
+class Grayscale(Stage):
+    name = "gray"
+    frame_level = True
+
+    def __call__(self, image):
+        if len(image.shape) == 3:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
+
+
+class Clahe(Stage):
+    """Ecualización adaptativa del contraste (CLAHE)
+
+    La rejilla de ``tile``×``tile`` se reparte sobre la imagen recibida, así
+    que aplicarla a la captura completa no equivale a aplicarla a cada
+    recorte; ``frame=1`` lo permite (más rápido con muchas regiones, pero
+    cambia el contraste de cada ROI).
+    """
+    name = "clahe"
+
+    def __init__(self, clip=2.0, tile=8, frame=False):
+        self.clip = float(clip)
+        self.tile = int(tile)
+        self.frame_level = bool(frame)
+        # cv2.CLAHE guarda búferes internos: un objeto por hilo, creado una sola vez
+        self._local = threading.local()
+
+    def _clahe(self):
+        clahe = getattr(self._local, "clahe", None)
+        if clahe is None:
+            clahe = cv2.createCLAHE(clipLimit=self.clip, tileGridSize=(self.tile, self.tile))
+            self._local.clahe = clahe
+        return clahe
+
+    def __call__(self, image):
+        return self._clahe().apply(Grayscale()(image))
+
+    def __getstate__(self):
+        # Los objetos de OpenCV no se serializan: se recrean en el proceso destino
+        return {"clip": self.clip, "tile": self.tile, "frame": self.frame_level}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+class Denoise(Stage):
+    """Reducción de ruido: 'median', 'bilateral' o 'nlmeans' (más lento)"""
+    name = "denoise"
+    frame_level = True
+
+    def __init__(self, method="median", strength=3):
+        if method not in ("median", "bilateral", "nlmeans"):
+            raise ValueError(f"Método de filtrado desconocido: {method}")
+        self.method = method
+        self.strength = int(strength)
+
+    def __call__(self, image):
+        if self.method == "median":
+            return cv2.medianBlur(image, self.strength | 1)
+        if self.method == "bilateral":
+            return cv2.bilateralFilter(image, 5, self.strength * 25, self.strength * 25)
+        if len(image.shape) == 3:
+            return cv2.fastNlMeansDenoisingColored(image, None, self.strength * 3, self.strength * 3)
+        return cv2.fastNlMeansDenoising(image, None, self.strength * 3)
+
+
+class AdaptiveThreshold(Stage):
+    """Binarización local, robusta ante iluminación desigual (texto negro sobre blanco)"""
+    name = "threshold"
+
+    def __init__(self, block=31, c=10):
+        self.block = int(block) | 1
+        self.c = float(c)
+
+    def __call__(self, image):
+        gray = Grayscale()(image)
+        binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv2.THRESH_BINARY, self.block, self.c)
+        # Texto claro sobre fondo oscuro: invertir para dejar siempre tinta negra
+        if np.count_nonzero(binary) < binary.size / 2:
+            binary = cv2.bitwise_not(binary)
+        return binary
+
+
+class Deskew(Stage):
+    """Endereza el texto según el rectángulo mínimo que envuelve la tinta"""
+    name = "deskew"
+
+    def __init__(self, max_angle=15.0, min_angle=0.5):
+        self.max_angle = float(max_angle)
+        self.min_angle = float(min_angle)
+
+    def angle(self, image):
+        """Inclinación estimada en grados (0 si no hay tinta suficiente)"""
+        gray = Grayscale()(image)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        if np.count_nonzero(binary) > binary.size / 2:
+            binary = cv2.bitwise_not(binary)
+        points = cv2.findNonZero(binary)
+        if points is None or len(points) < 20:
+            return 0.0
+        angle = cv2.minAreaRect(points)[2]
+        # El rango de minAreaRect cambia entre versiones de OpenCV ([-90, 0) o
+        # (0, 90]); plegar módulo 90 a [-45, 45) da el giro del lado más
+        # horizontal del rectángulo, sea cual sea la versión
+        return ((angle + 45) % 90) - 45
+
+    def __call__(self, image):
+        angle = self.angle(image)
+        if abs(angle) < self.min_angle or abs(angle) > self.max_angle:
+            return image
+        height, width = image.shape[:2]
+        matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), angle, 1.0)
+        return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_CUBIC,
+                              borderMode=cv2.BORDER_REPLICATE)
+
+
+class Resize(Stage):
+    """Lleva la altura de la imagen al intervalo [min_height, max_height] (0 = sin límite)"""
+    name = "resize"
+
+    def __init__(self, min_height=48, max_height=400):
+        self.min_height = int(min_height)
+        self.max_height = int(max_height)
+
+    def __call__(self, image):
+        height = image.shape[0]
+        if self.min_height and height < self.min_height:
+            scale = self.min_height / float(height)
+        elif self.max_height and height > self.max_height:
+            scale = self.max_height / float(height)
+        else:
+            return image
+        interpolation = cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+
+
+STAGES = {stage.name: stage for stage in (Grayscale, Clahe, Denoise, AdaptiveThreshold, Deskew, Resize)}
+
+
+def register_stage(name, factory):
+    """Registra una etapa adicional utilizable en la especificación"""
+    STAGES[name] = factory
+
+
+class PreprocessPipeline:
+    """Secuencia de etapas con tiempos por etapa
+
+    Llamarlo devuelve sólo la imagen; ``run`` devuelve además los milisegundos
+    de cada etapa. Los tiempos se acumulan en ``stats()`` para diagnóstico.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def run(self, image):
+        """Devuelve (imagen procesada, [(etapa, ms), ...])"""
+        timings = []
+        for stage in self.stages:
+            start = time.perf_counter()
+            image = stage(image)
+            timings.append((stage.name, (time.perf_counter() - start) * 1000))
+        with self._lock:
+            for name, elapsed_ms in timings:
+                count, total, worst = self._totals.get(name, (0, 0.0, 0.0))
+                self._totals[name] = (count + 1, total + elapsed_ms, max(worst, elapsed_ms))
+        for name, elapsed_ms in timings:
+            observe("scanner_preprocess_step_seconds", elapsed_ms / 1000.0, step=name)
+        observe("scanner_stage_seconds", sum(ms for _, ms in timings) / 1000.0, stage="preprocess")
+        return image, timings
+
+    def __call__(self, image):
+        return self.run(image)[0]
+
+    def split(self):
+        """Divide el pipeline en (etapas de captura, etapas de recorte)
+
+        La primera parte es el prefijo de etapas ``frame_level``; a partir de
+        la primera que no lo es, todo se aplica a cada recorte.
+        """
+        index = 0
+        while index < len(self.stages) and getattr(self.stages[index], "frame_level", False):
+            index += 1
+        parts = PreprocessPipeline(self.stages[:index]), PreprocessPipeline(self.stages[index:])
+        for part in parts:
+            # Los tiempos de ambas partes se acumulan en las estadísticas de este pipeline
+            part._lock, part._totals = self._lock, self._totals
+        return parts
+
+    def stats(self):
+        """Por etapa: número de ejecuciones, ms medio y ms máximo"""
+        with self._lock:
+            return {name: {"count": count, "mean_ms": round(total / count, 3), "max_ms": round(worst, 3)}
+                    for name, (count, total, worst) in self._totals.items()}
+
+    def __getstate__(self):
+        return {"stages": self.stages}
+
+    def __setstate__(self, state):
+        self.__init__(state["stages"])
+
+    def __repr__(self):
+        return " → ".join(stage.name for stage in self.stages) or "(sin preprocesado)"
+
+
+def _parse_value(text):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_spec(spec):
+    """Convierte 'gray,clahe:clip=3,deskew' en una lista de etapas
+
+    'none' (o una cadena vacía) produce un pipeline sin etapas.
+    """
+    stages = []
+    for chunk in spec.split(","):
+        chunk = chunk.strip()
+        if not chunk or chunk == "none":
+            continue
+        name, *params = chunk.split(":")
+        if name not in STAGES:
+            raise ValueError(f"Etapa de preprocesado desconocida: {name}")
+        options = {}
+        for param in params:
+            key, sep, value = param.partition("=")
+            if not sep:
+                raise ValueError(f"Parámetro inválido en '{chunk}' (formato clave=valor)")
+            options[key.strip()] = _parse_value(value.strip())
+        stages.append(STAGES[name](**options))
+    return stages
+
+
+def build_pipeline(spec=None):
+    """Pipeline a partir de una especificación (por defecto SCANNER_PREPROCESS)"""
+    return PreprocessPipeline(parse_spec(spec if spec is not None else get_setting("preprocess")))
+
+
+@lru_cache(maxsize=8)
+def get_preprocessor(spec=None):
+    """Pipeline configurado, compartido por todo el proceso"""
+    return build_pipeline(spec)
@@ -0,0 +1,588 @@
+"""Motores de reconocimiento de dígitos intercambiables"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .config import get_setting
+from .errors import (
+    CircuitOpenError,
+    ErrorKind,
+    OCRAPIError,
+    OCRConnectionError,
+    OCRHTTPError,
+    OCRRateLimitError,
+    OCRTimeoutError,
+)
+from .formats import best_valid, parse_formats
+from .imaging import preprocess_image
+from .metrics import inc, record_result
+from .ocr_client import OCRSpaceClient
+from .preprocess import build_pipeline
+from .segmentation import normalize_glyph, segment_glyphs
+from .upload import optimize_for_upload
+
+
+@dataclass
+class RecognitionResult:
+    """Resultado de un motor: dígitos leídos o mensaje de error
+
+    ``error`` es el texto para el usuario; ``error_kind`` la categoría
+    (ErrorKind) que usan las métricas y los registros.
+    """
+    digits: str = ""
+    error: str = None
+    error_kind: ErrorKind = None
+    engine: str = ""
+    confidence: float = 0.0
+    glyph_confidences: list = field(default_factory=list)
+    # Por dígito, otras lecturas posibles con su puntuación ({"3": 0.2, ...})
+    glyph_alternatives: list = field(default_factory=list)
+    elapsed_ms: float = 0.0
+    cached: bool = False
+    # Formato que cumple la lectura y dígitos corregidos para cumplirlo
+    format: str = None
+    corrections: int = 0
+
+    @property
+    def ok(self):
+        return self.error is None and bool(self.digits)
+
+    def as_text(self):
+        """Texto mostrado al usuario: los dígitos o el mensaje de error"""
+        if self.ok:
+            return self.digits
+        return self.error or "No se encontraron dígitos"
+
+
+class Recognizer:
+    """Interfaz común de los motores de reconocimiento"""
+    name = "base"
+
+    def recognize(self, image):
+        """Reconoce los dígitos de un ROI (BGR o escala de grises)"""
+        raise NotImplementedError
+
+    def close(self):
+        """Libera los recursos propios del motor (hilos); por defecto no hay ninguno"""
+
+
+# ========== MOTOR REMOTO (OCR.space) ==========
+# Letras que un OCR de texto general devuelve en lugar de dígitos
+CONFUSABLE_DIGITS = {
+    "O": "0", "o": "0", "D": "0", "Q": "0",
+    "I": "1", "l": "1", "i": "1", "|": "1", "!": "1",
+    "Z": "2", "z": "2",
+    "S": "5", "s": "5",
+    "G": "6", "b": "6",
+    "T": "7",
+    "B": "8",
+    "g": "9", "q": "9",
+}
+# Confianza de un dígito recuperado de una letra confundible
+CONFUSABLE_CONFIDENCE = 0.6
+# Letras que suelen ser unidades o rótulos («500g», «10s», «12b», «T1»): sólo
+# se convierten entre dos dígitos, nunca al principio o al final de un token
+UNIT_LETTERS = "gsbT"
+
+
+def digits_from_text(text):
+    """Extrae los dígitos de un texto OCR con una confianza por dígito
+
+    Los dígitos leídos como tales valen 1.0. Una letra confundible («O», «l»,
+    «S»...) se convierte con CONFUSABLE_CONFIDENCE si está entre dos dígitos
+    (``1O5`` → ``105``) o si todo el token parece un número (``l23``); las de
+    UNIT_LETTERS sólo entre dígitos. El resto de caracteres se descarta.
+    """
+    digits, confidences = [], []
+    for token in text.split():
+        numeric = any(c.isdigit() for c in token) and all(c.isdigit() or c in CONFUSABLE_DIGITS
+                                                          for c in token)
+        for index, char in enumerate(token):
+            if char.isdigit():
+                digits.append(char)
+                confidences.append(1.0)
+            elif char in CONFUSABLE_DIGITS:
+                between = (0 < index < len(token) - 1 and token[index - 1].isdigit()
+                           and token[index + 1].isdigit())
+                if between or (numeric and char not in UNIT_LETTERS):
+                    digits.append(CONFUSABLE_DIGITS[char])
+                    confidences.append(CONFUSABLE_CONFIDENCE)
+    return "".join(digits), confidences
+
+
+class OCRSpaceRecognizer(Recognizer):
+    """Reconocimiento usando la API de OCR.space"""
+    name = "api"
+
+    def __init__(self, api_key=None, url=None, ocr_engine=None, timeout=None, client=None, name=None):
+        self.ocr_engine = ocr_engine or get_setting("ocr_api_engine")
+        self.client = client or OCRSpaceClient(url=url, api_key=api_key, read_timeout=timeout)
+        if name:
+            self.name = name
+
+    def recognize(self, image):
+        start = time.perf_counter()
+        result = self._recognize(image)
+        result.engine = self.name
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+        record_result(result)
+        return result
+
+    def _recognize(self, image):
+        try:
+            # Reducir, pasar a grises y codificar dentro del presupuesto de bytes
+            upload = optimize_for_upload(image)
+            if upload is None:
+                return RecognitionResult(error="Error procesando imagen", error_kind=ErrorKind.ENCODE)
+
+            # Motor 2 es mejor para dígitos
+            result = self.client.parse_image(upload.base64, ocr_engine=self.ocr_engine,
+                                             mime=upload.mime)
+
+            # Extraer texto de los resultados
+            parsed_results = result.get('ParsedResults', [])
+            if not parsed_results:
+                return RecognitionResult(error="No se pudieron procesar los resultados",
+                                         error_kind=ErrorKind.API)
+
+            text = parsed_results[0].get('ParsedText', '').strip()
+
+            # Dígitos y letras confundibles junto a dígitos (O→0, l→1...)
+            digits, confidences = digits_from_text(text)
+            if not digits:
+                return RecognitionResult(error="No se encontraron dígitos", error_kind=ErrorKind.NO_DIGITS)
+
+            # La API no informa confianza: 1.0 por dígito leído, menos si vino de una letra
+            confidence = float(np.mean(confidences))
+            if min(confidences) < 1.0:
+                # Con alguna letra convertida la lectura nunca es fiable: el modo auto escala
+                confidence = min(confidence, CONFUSABLE_CONFIDENCE,
+                                 get_setting("local_min_confidence") - 0.01)
+            return RecognitionResult(digits=digits, confidence=confidence,
+                                     glyph_confidences=confidences)
+
+        except CircuitOpenError as e:
+            return RecognitionResult(error="Servicio OCR temporalmente no disponible", error_kind=e.kind)
+        except OCRRateLimitError as e:
+            return RecognitionResult(error="Límite de peticiones OCR alcanzado; inténtalo en unos segundos",
+                                     error_kind=e.kind)
+        except OCRTimeoutError as e:
+            return RecognitionResult(error="Timeout: La API tardó demasiado en responder", error_kind=e.kind)
+        except OCRConnectionError as e:
+            return RecognitionResult(error=f"Error de conexión: {str(e)}", error_kind=e.kind)
+        except OCRHTTPError as e:
+            return RecognitionResult(error=f"Error HTTP: {e.status_code}", error_kind=e.kind)
+        except OCRAPIError as e:
+            return RecognitionResult(error=f"Error API: {str(e)}", error_kind=e.kind)
+        except Exception as e:
+            return RecognitionResult(error=f"Error inesperado: {str(e)}", error_kind=ErrorKind.INTERNAL)
+
+
+# ========== MOTOR LOCAL (k-NN sobre plantillas) ==========
+# Fuentes Hershey usadas para sintetizar las plantillas del modelo
+TEMPLATE_FONTS = (
+    cv2.FONT_HERSHEY_SIMPLEX,
+    cv2.FONT_HERSHEY_DUPLEX,
+    cv2.FONT_HERSHEY_COMPLEX,
+    cv2.FONT_HERSHEY_TRIPLEX,
+    cv2.FONT_HERSHEY_PLAIN,
+    cv2.FONT_ITALIC | cv2.FONT_HERSHEY_SIMPLEX,
+)
+TEMPLATE_THICKNESS = (2, 3, 5, 7)
+# Grosor de trazo e inclinación para la fuente sans-serif incluida en Pillow
+TEMPLATE_STROKES = (0, 2, 4, 6, 8)
+TEMPLATE_SHEARS = (-0.12, 0.0, 0.12)
+
+
+def _hershey_templates():
+    """Plantillas dibujadas con las fuentes vectoriales de OpenCV"""
+    for font in TEMPLATE_FONTS:
+        for thickness in TEMPLATE_THICKNESS:
+            for digit in range(10):
+                canvas = np.zeros((160, 160), np.uint8)
+                cv2.putText(canvas, str(digit), (20, 125), font, 4, 255,
+                            thickness, cv2.LINE_AA)
+                yield digit, canvas
+
+
+def _pillow_templates():
+    """Plantillas con la fuente TrueType incluida en Pillow (si está disponible)"""
+    try:
+        font = ImageFont.load_default(size=100)
+    except TypeError:
+        # Pillow < 10.1 sólo incluye una fuente bitmap sin tamaño configurable
+        return
+
+    for stroke in TEMPLATE_STROKES:
+        for shear in TEMPLATE_SHEARS:
+            matrix = np.float32([[1, shear, -shear * 80], [0, 1, 0]])
+            for digit in range(10):
+                image = Image.new("L", (160, 160), 0)
+                ImageDraw.Draw(image).text((30, 10), str(digit), font=font, fill=255,
+                                           stroke_width=stroke, stroke_fill=255)
+                yield digit, cv2.warpAffine(np.array(image), matrix, (160, 160))
+
+
+@lru_cache(maxsize=1)
+def load_digit_model():
+    """Genera el modelo de plantillas (una sola vez por proceso)"""
+    samples = []
+    labels = []
+    for source in (_hershey_templates, _pillow_templates):
+        for digit, canvas in source():
+            _, canvas = cv2.threshold(canvas, 127, 255, cv2.THRESH_BINARY)
+            feature = normalize_glyph(canvas)
+            if feature is not None:
+                samples.append(feature)
+                labels.append(digit)
+
+    return np.array(samples, np.float32), np.array(labels, np.int32)
+
+
+class LocalDigitRecognizer(Recognizer):
+    """Reconocimiento local: componentes conexos + k-NN sobre plantillas sintéticas"""
+    name = "local"
+
+    def __init__(self, k=5, min_glyph_confidence=0.2):
+        self.k = k
+        self.min_glyph_confidence = min_glyph_confidence
+        self.samples, self.labels = load_digit_model()
+
+    def classify(self, feature):
+        """Devuelve (dígito, confianza) para un glifo normalizado"""
+        distances = np.sum((self.samples - feature) ** 2, axis=1)
+        nearest = np.argpartition(distances, self.k)[:self.k]
+        votes = np.bincount(self.labels[nearest], minlength=10)
+        digit = int(np.argmax(votes))
+
+        # Confianza: proporción de votos ponderada por la separación entre la
+        # plantilla más cercana del dígito elegido y la de cualquier otro dígito.
+        # La cercanía absoluta no basta: un borde o una letra quedan a la misma
+        # distancia de varios dígitos y darían lecturas equivocadas muy seguras
+        per_class = np.full(10, np.inf)
+        np.minimum.at(per_class, self.labels, distances)
+        own = per_class[digit]
+        per_class[digit] = np.inf
+        other = per_class.min()
+        margin = max(0.0, 1.0 - own / other) if other > 0 else 0.0
+        return digit, float(votes[digit]) / self.k * float(margin)
+
+    def alternatives(self, feature):
+        """Otros dígitos posibles para un glifo: votos de los 2k vecinos más cercanos"""
+        distances = np.sum((self.samples - feature) ** 2, axis=1)
+        nearest = np.argpartition(distances, 2 * self.k)[:2 * self.k]
+        votes = np.bincount(self.labels[nearest], minlength=10)
+        return {str(digit): round(float(count) / (2 * self.k), 3)
+                for digit, count in enumerate(votes) if count}
+
+    def recognize(self, image):
+        start = time.perf_counter()
+        try:
+            # Una imagen en gris ya viene del pipeline de preprocesado
+            enhanced = image if len(image.shape) == 2 else preprocess_image(image)
+            _, glyphs = segment_glyphs(enhanced)
+
+            digits = []
+            confidences = []
+            alternatives = []
+            for _, mask in glyphs:
+                feature = normalize_glyph(mask)
+                if feature is None:
+                    continue
+                digit, confidence = self.classify(feature)
+                if confidence < self.min_glyph_confidence:
+                    continue
+                digits.append(str(digit))
+                confidences.append(round(confidence, 3))
+                alternatives.append(self.alternatives(feature))
+
+            if digits:
+                result = RecognitionResult(
+                    digits="".join(digits),
+                    confidence=float(np.mean(confidences)),
+                    glyph_confidences=confidences,
+                    glyph_alternatives=alternatives,
+                )
+            else:
+                result = RecognitionResult(error="No se encontraron dígitos", error_kind=ErrorKind.NO_DIGITS)
+        except Exception as e:
+            result = RecognitionResult(error=f"Error inesperado: {str(e)}", error_kind=ErrorKind.INTERNAL)
+
+        result.engine = self.name
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+        record_result(result)
+        return result
+
+
+# ========== SELECCIÓN DE MOTOR ==========
+# Fallos en los que el motor no llegó a analizar la imagen: no contradicen una lectura anterior
+UNAVAILABLE = (ErrorKind.TIMEOUT, ErrorKind.CONNECTION, ErrorKind.CIRCUIT_OPEN, ErrorKind.RATE_LIMITED)
+
+
+def answered(result):
+    """Indica si el motor dio una respuesta (lectura, «sin dígitos», error de la API...)"""
+    return result.ok or result.error_kind not in UNAVAILABLE
+
+
+class FallbackRecognizer(Recognizer):
+    """Prueba los motores en orden y se queda con el primero suficientemente confiable
+
+    Si ninguno lo es, responde el último motor que contestó: una lectura dudosa
+    de un motor anterior sólo se conserva si los siguientes no estaban
+    disponibles (timeout, conexión, cortocircuito, límite de ritmo).
+    """
+    name = "auto"
+
+    def __init__(self, recognizers, min_confidence=None):
+        self.recognizers = list(recognizers)
+        self.min_confidence = (min_confidence if min_confidence is not None
+                               else get_setting("local_min_confidence"))
+
+    def recognize(self, image):
+        best = None
+        for recognizer in self.recognizers:
+            result = recognizer.recognize(image)
+            if result.ok and result.confidence >= self.min_confidence:
+                return result
+            if best is None or answered(result) or (result.ok and not best.ok):
+                best = result
+        return best or RecognitionResult(error="OCR no disponible", error_kind=ErrorKind.INTERNAL)
+
+
+class EnsembleRecognizer(Recognizer):
+    """Motores por niveles: primero los rápidos y, sólo si no convencen, los lentos o remotos
+
+    Cada nivel es una lista de motores que se lanzan en paralelo; en cuanto
+    uno devuelve una lectura con confianza ≥ ``min_confidence`` se responde sin
+    esperar al resto ni escalar al siguiente nivel. Si ningún nivel convence,
+    se combinan todas las lecturas: las que coinciden entre motores refuerzan
+    su confianza y gana la más confiable.
+    """
+    name = "auto"
+
+    def __init__(self, tiers, min_confidence=None, timeout=None):
+        self.tiers = [list(tier) for tier in tiers if tier]
+        self.min_confidence = (min_confidence if min_confidence is not None
+                               else get_setting("local_min_confidence"))
+        self.timeout = timeout or get_setting("ocr_timeout") * 2
+        width = max((len(tier) for tier in self.tiers), default=1)
+        self._executor = ThreadPoolExecutor(max_workers=width) if width > 1 else None
+
+    def close(self):
+        """Detiene el pool de los niveles en paralelo; después los motores se llaman en serie"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _confident(self, result):
+        return result.ok and result.confidence >= self.min_confidence
+
+    def _run_tier(self, tier, image):
+        """Lecturas del nivel en orden de llegada; se puede dejar de iterar en cualquier momento"""
+        if len(tier) == 1 or self._executor is None:
+            for recognizer in tier:
+                yield recognizer.recognize(image)
+            return
+        pending = {self._executor.submit(recognizer.recognize, image) for recognizer in tier}
+        deadline = time.perf_counter() + self.timeout
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.perf_counter()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                yield RecognitionResult(error="Timeout: ningún motor respondió a tiempo",
+                                        error_kind=ErrorKind.TIMEOUT)
+                return
+            for future in done:
+                yield future.result()
+
+    def recognize(self, image):
+        start = time.perf_counter()
+        results = []
+        final = []
+        for level, tier in enumerate(self.tiers):
+            final = []
+            for result in self._run_tier(tier, image):
+                results.append(result)
+                final.append(result)
+                if self._confident(result):
+                    # Los motores aún en marcha terminan en segundo plano y se ignoran
+                    inc("scanner_ensemble_exits_total", tier=level, engine=result.engine)
+                    return replace(result, elapsed_ms=(time.perf_counter() - start) * 1000)
+        inc("scanner_ensemble_exits_total", tier="combined", engine="")
+        result = combine_results(results, self.min_confidence, final)
+        return replace(result, elapsed_ms=(time.perf_counter() - start) * 1000)
+
+
+def combine_results(results, min_confidence=None, final=()):
+    """Mejor lectura de varios motores; las coincidencias suman confianza
+
+    La confianza de una lectura repetida por varios motores es la probabilidad
+    de que no fallen todos: 1 - Π(1 - c). Sin lecturas válidas devuelve el
+    primer error. ``final`` son las respuestas del último nivel: si la mejor
+    lectura no alcanza ``min_confidence``, ningún otro motor la confirma y
+    viene de un nivel anterior, se devuelve la respuesta del último nivel
+    (p. ej. «sin dígitos» de la API) en lugar de esa conjetura, salvo que el
+    último nivel no estuviera disponible.
+    """
+    groups = {}
+    for result in results:
+        if result.ok:
+            groups.setdefault(result.digits, []).append(result)
+    if not groups:
+        return results[0] if results else RecognitionResult(error="OCR no disponible",
+                                                             error_kind=ErrorKind.INTERNAL)
+
+    def agreement(values):
+        return 1.0 - float(np.prod([1.0 - min(v, 1.0) for v in values]))
+
+    digits, group = max(groups.items(), key=lambda item: agreement([r.confidence for r in item[1]]))
+    if len(group) == 1:
+        best = group[0]
+        if (min_confidence is None or best.confidence >= min_confidence
+                or any(result is best for result in final)):
+            return best
+        answers = [result for result in final if answered(result)]
+        return max(answers, key=lambda r: (r.ok, r.confidence)) if answers else best
+    glyphs = [r.glyph_confidences for r in group if len(r.glyph_confidences) == len(digits)]
+    return RecognitionResult(
+        digits=digits,
+        engine="+".join(r.engine for r in group),
+        confidence=agreement([r.confidence for r in group]),
+        glyph_confidences=[round(agreement(values), 3) for values in zip(*glyphs)] if glyphs else [],
+    )
+
+
+def validate_results(results, formats, max_changes=None, min_share=None):
+    """Lectura que cumple alguno de ``formats`` a partir de varias del mismo ROI
+
+    Devuelve la primera lectura ya válida o, si ninguna lo es, la cadena válida
+    más probable combinando las confianzas y alternativas de todas (ver
+    scanner.formats), con ``format`` y ``corrections`` rellenos. Si no hay una
+    clara devuelve un error INVALID_FORMAT en vez de unos dígitos equivocados.
+    """
+    readings = [result for result in results if result.ok]
+    if not readings:
+        return results[0] if results else RecognitionResult(error="OCR no disponible",
+                                                             error_kind=ErrorKind.INTERNAL)
+    for result in readings:
+        name = next((f.name for f in formats if f.matches(result.digits)), None)
+        if name is not None:
+            return replace(result, format=name)
+
+    match = best_valid([(r.digits, r.glyph_confidences, r.glyph_alternatives) for r in readings],
+                       formats, max_changes, min_share)
+    first = readings[0]
+    if match is None:
+        return RecognitionResult(
+            error=f"La lectura {first.digits} no cumple el formato esperado; vuelve a capturar",
+            error_kind=ErrorKind.INVALID_FORMAT, engine=first.engine, elapsed_ms=first.elapsed_ms)
+    return replace(first, digits=match.digits, confidence=float(np.mean(match.confidences)),
+                   glyph_confidences=match.confidences, glyph_alternatives=[],
+                   format=match.format, corrections=match.changes)
+
+
+class ValidatingRecognizer(Recognizer):
+    """Valida la lectura contra los formatos esperados y la corrige antes de pedir otra
+
+    Una lectura inválida se corrige con validate_results; sólo si no hay una
+    corrección clara se vuelve a leer el mismo ROI con las variantes de
+    preprocesado de ``retry`` (una a una, hasta obtener una válida) y se
+    combinan todas las lecturas.
+    """
+
+    def __init__(self, recognizer, formats, retry=None, max_changes=None, min_share=None):
+        self.recognizer = recognizer
+        self.formats = parse_formats(formats) if isinstance(formats, str) else list(formats)
+        if not self.formats:
+            raise ValueError("No hay formatos de dígitos configurados")
+        # Espacio de nombres propio en la caché: la lectura validada depende de los formatos
+        self.name = "+".join([recognizer.name] + [f.name for f in self.formats])
+        retry = retry if retry is not None else get_setting("postprocess_retry")
+        self.retry = [build_pipeline(spec) for spec in retry.split(";") if spec.strip()]
+        self.max_changes = (max_changes if max_changes is not None
+                            else get_setting("postprocess_max_changes"))
+        self.min_share = min_share if min_share is not None else get_setting("postprocess_min_share")
+
+    def recognize(self, image):
+        start = time.perf_counter()
+        results = [self.recognizer.recognize(image)]
+        if not results[0].ok:
+            return results[0]
+        checked = validate_results(results, self.formats, self.max_changes, self.min_share)
+        outcome = "corrected" if checked.corrections else "valid"
+        # Releer con otras variantes sólo si las alternativas no bastan
+        for pipeline in self.retry if not checked.ok else ():
+            outcome = "retried"
+            results.append(self.recognizer.recognize(pipeline(image)))
+            checked = validate_results(results, self.formats, self.max_changes, self.min_share)
+            if checked.ok:
+                break
+        inc("scanner_postprocess_total", outcome=outcome if checked.ok else "invalid")
+        return replace(checked, elapsed_ms=(time.perf_counter() - start) * 1000)
+
+    def close(self):
+        self.recognizer.close()
+
+
+def parse_tiers(spec, **api_options):
+    """Convierte 'local;api:2,api:1' en niveles de motores
+
+    Los niveles se separan con ';' y los motores de un nivel (en paralelo) con
+    ','. ``api:N`` es OCR.space con el motor N.
+    """
+    tiers = []
+    for chunk in spec.split(";"):
+        tier = []
+        for name in (part.strip() for part in chunk.split(",")):
+            if not name:
+                continue
+            base, _, option = name.partition(":")
+            if base == "api":
+                options = dict(api_options)
+                if option:
+                    options.update(ocr_engine=int(option), name=f"api{option}")
+                tier.append(OCRSpaceRecognizer(**options))
+            elif base in RECOGNIZERS and not option:
+                tier.append(RECOGNIZERS[base]())
+            else:
+                raise ValueError(f"Motor OCR desconocido en SCANNER_ENSEMBLE_TIERS: {name}")
+        if tier:
+            tiers.append(tier)
+    return tiers
+
+
+RECOGNIZERS = {
+    "api": OCRSpaceRecognizer,
+    "local": LocalDigitRecognizer,
+}
+
+
+def register_recognizer(name, factory):
+    """Registra un motor adicional seleccionable por configuración"""
+    RECOGNIZERS[name] = factory
+
+
+def get_recognizer(name=None, formats=None, **api_options):
+    """Construye el motor configurado ('api', 'local', 'auto' o uno registrado)
+
+    Con formatos (``formats`` o SCANNER_DIGIT_FORMATS) el motor se envuelve en
+    un ValidatingRecognizer.
+    """
+    name = name or get_setting("ocr_engine")
+    if name == "auto":
+        recognizer = EnsembleRecognizer(parse_tiers(get_setting("ensemble_tiers"), **api_options))
+    elif name not in RECOGNIZERS:
+        raise ValueError(f"Motor OCR desconocido: {name}")
+    elif name == "api":
+        recognizer = OCRSpaceRecognizer(**api_options)
+    else:
+        recognizer = RECOGNIZERS[name]()
+    formats = formats if formats is not None else get_setting("digit_formats")
+    if formats:
+        recognizer = ValidatingRecognizer(recognizer, formats)
+    return recognizer
@@ -0,0 +1,327 @@
+"""Registro de lecturas en un log JSONL comprimido y exportación en streaming
+
+Cada lectura de la app se guarda como un ``ResultRecord`` compacto (dígitos,
+confianza, motor, ROI, tiempos y hash de la captura). ``ResultLog`` los
+acumula en un búfer de memoria acotado y un hilo los vuelca cada
+``results_flush_interval`` segundos a ficheros ``.jsonl.gz`` que rotan por
+tamaño; cada volcado es un miembro gzip completo, así que un corte a mitad de
+escritura sólo pierde el último lote. La exportación (``iter_records``,
+``export_jsonl``, ``export_csv`` y las rutas HTTP ``/results.jsonl`` y
+``/results.csv``) lee los ficheros línea a línea: millones de lecturas se
+exportan sin cargarlas en memoria.
+"""
+import atexit
+import csv
+import glob
+import gzip
+import io
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+
+from .config import get_setting
+from .metrics import inc
+from .server import register_route
+
+FIELDS = ("created", "capture_id", "roi", "engine", "digits", "confidence", "elapsed_ms",
+          "error_kind", "timings")
+
+
+@dataclass(slots=True)
+class ResultRecord:
+    """Lectura compacta: sin __dict__ por instancia, para millones en exportación"""
+    created: float
+    capture_id: str
+    roi: tuple
+    engine: str
+    digits: str
+    confidence: float
+    elapsed_ms: float
+    error_kind: str = None
+    timings: dict = None
+
+    @classmethod
+    def from_result(cls, result, roi=None, capture_id="", timings=None, created=None):
+        """Registro a partir de un RecognitionResult; ``timings`` son ms por etapa"""
+        return cls(
+            created=round(created if created is not None else time.time(), 3),
+            capture_id=capture_id or "",
+            roi=tuple(int(v) for v in roi) if roi else None,
+            engine=result.engine,
+            digits=result.digits,
+            confidence=round(result.confidence, 4),
+            elapsed_ms=round(result.elapsed_ms, 2),
+            error_kind=result.error_kind.value if result.error_kind else None,
+            timings={name: round(ms, 2) for name, ms in dict(timings).items()} if timings else None,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        roi = data.get("roi")
+        return cls(
+            created=data.get("created", 0.0),
+            capture_id=data.get("capture_id", ""),
+            roi=tuple(roi) if roi else None,
+            engine=data.get("engine", ""),
+            digits=data.get("digits", ""),
+            confidence=data.get("confidence", 0.0),
+            elapsed_ms=data.get("elapsed_ms", 0.0),
+            error_kind=data.get("error_kind"),
+            timings=data.get("timings"),
+        )
+
+    def to_dict(self):
+        """Campos con valor (los vacíos se omiten para que cada línea ocupe menos)"""
+        data = {}
+        for name in FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = list(value) if name == "roi" else value
+        return data
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    def to_row(self):
+        """Valores en el orden de FIELDS para CSV (ROI y tiempos como JSON)"""
+        return [
+            self.created, self.capture_id,
+            json.dumps(list(self.roi)) if self.roi else "",
+            self.engine, self.digits, self.confidence, self.elapsed_ms, self.error_kind or "",
+            json.dumps(self.timings, separators=(",", ":")) if self.timings else "",
+        ]
+
+
+def _file_pid(path):
+    """Pid del proceso que escribió un fichero del log (None si el nombre no lo indica)"""
+    parts = os.path.basename(path).split("-")
+    try:
+        return int(parts[3])
+    except (IndexError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    """Indica si el proceso sigue vivo (en Windows se supone que sí)"""
+    if os.name == "nt":
+        # os.kill con señal 0 terminaría el proceso en Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class ResultLog:
+    """Log rotativo de lecturas con búfer acotado y volcado en segundo plano
+
+    Si el búfer se llena antes de volcarse (disco lento o bloqueado) se
+    descartan las lecturas más antiguas y se cuentan en
+    ``scanner_results_dropped_total``: registrar nunca bloquea a la app.
+    """
+
+    def __init__(self, root=None, buffer_size=None, flush_interval=None, max_file_bytes=None,
+                 max_files=None):
+        self.root = root or get_setting("results_dir")
+        self.buffer_size = buffer_size or get_setting("results_buffer")
+        self.flush_interval = flush_interval if flush_interval is not None else get_setting("results_flush_interval")
+        self.max_file_bytes = max_file_bytes or get_setting("results_max_file_bytes")
+        self.max_files = max_files if max_files is not None else get_setting("results_max_files")
+        self._cond = threading.Condition()
+        self._buffer = deque(maxlen=self.buffer_size)
+        self._write_lock = threading.Lock()
+        self._path = None
+        self._sequence = itertools.count(1)
+        self._thread = None
+        self._closed = False
+        os.makedirs(self.root, exist_ok=True)
+
+    def append(self, record):
+        """Encola un ResultRecord para el próximo volcado"""
+        with self._cond:
+            if len(self._buffer) == self.buffer_size:
+                inc("scanner_results_dropped_total")
+            self._buffer.append(record)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._flusher, name="scanner-results", daemon=True)
+                self._thread.start()
+            # Medio búfer lleno: volcar ya en lugar de esperar al intervalo
+            if len(self._buffer) >= self.buffer_size // 2:
+                self._cond.notify()
+
+    def _flusher(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.buffer_size // 2:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def _take(self):
+        with self._cond:
+            batch = list(self._buffer)
+            self._buffer.clear()
+        return batch
+
+    def flush(self):
+        """Escribe lo acumulado como un miembro gzip del fichero actual; devuelve cuántas lecturas"""
+        with self._write_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            data = "".join(record.to_json() + "\n" for record in batch).encode("utf-8")
+            path = self._current_path()
+            with open(path, "ab") as f:
+                f.write(gzip.compress(data))
+            inc("scanner_results_written_total", len(batch))
+            return len(batch)
+
+    def _current_path(self):
+        # Rotar por tamaño comprimido; el pid evita mezclar escrituras de varios
+        # procesos y el contador, reutilizar un nombre dentro del mismo segundo
+        if self._path is None or (os.path.exists(self._path)
+                                  and os.path.getsize(self._path) >= self.max_file_bytes):
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            name = f"results-{stamp}-{os.getpid()}-{next(self._sequence):04d}.jsonl.gz"
+            self._path = os.path.join(self.root, name)
+            self._prune()
+        return self._path
+
+    def _prune(self):
+        # Sólo ficheros cerrados: ni el actual, ni los de otro proceso vivo (que
+        # puede seguir añadiendo a su fichero actual) ni los escritos hace menos
+        # de un intervalo de volcado
+        if not self.max_files:
+            return
+        files = self.files()
+        excess = len(files) - (self.max_files - 1)
+        cutoff = time.time() - self.flush_interval
+        for path in files:
+            if excess <= 0:
+                break
+            pid = _file_pid(path)
+            if path == self._path or (pid is not None and pid != os.getpid() and _pid_alive(pid)):
+                continue
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+            excess -= 1
+
+    def files(self):
+        """Ficheros del log de más antiguo a más reciente"""
+        return sorted(glob.glob(os.path.join(self.root, "results-*.jsonl.gz")))
+
+    def close(self):
+        """Vuelca lo pendiente y detiene el hilo"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=10)
+        self.flush()
+
+
+def iter_records(root=None, since=None, until=None, engine=None):
+    """Lecturas del log en orden de fichero, leídas en streaming
+
+    ``since``/``until`` son instantes epoch (s) y ``engine`` filtra por
+    motor. Los ficheros modificados antes de ``since`` no se abren. Las
+    líneas dañadas (p. ej. un volcado interrumpido) se saltan.
+    """
+    root = root or get_setting("results_dir")
+    for path in sorted(glob.glob(os.path.join(root, "results-*.jsonl.gz"))):
+        try:
+            if since is not None and os.path.getmtime(path) < since:
+                continue
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = ResultRecord.from_dict(json.loads(line))
+                    except (ValueError, TypeError):
+                        continue
+                    if since is not None and record.created < since:
+                        continue
+                    if until is not None and record.created >= until:
+                        continue
+                    if engine and record.engine != engine:
+                        continue
+                    yield record
+        except (OSError, EOFError):
+            # Fichero borrado por la retención o truncado al final: seguir con el siguiente
+            continue
+
+
+def export_jsonl(records):
+    """Líneas JSONL de cada registro (generador)"""
+    for record in records:
+        yield record.to_json() + "\n"
+
+
+def export_csv(records, header=True):
+    """Líneas CSV con cabecera (generador); el búfer se reutiliza entre filas"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(FIELDS)
+    for record in records:
+        writer.writerow(record.to_row())
+        # Vaciar cada ~64 KB: pocas escrituras y memoria constante
+        if buffer.tell() >= 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+EXPORTERS = {
+    "jsonl": (export_jsonl, "application/x-ndjson"),
+    "csv": (export_csv, "text/csv; charset=utf-8"),
+}
+
+
+@lru_cache(maxsize=1)
+def get_result_log():
+    """Log de lecturas compartido por el proceso (se vuelca al salir)"""
+    log = ResultLog()
+    atexit.register(log.close)
+    return log
+
+
+def _float(query, name):
+    return float(query[name]) if query.get(name) else None
+
+
+def _export_route(kind):
+    exporter, content_type = EXPORTERS[kind]
+
+    def route(query):
+        # Incluir lo que aún está en el búfer de este proceso
+        if get_setting("results_enabled"):
+            get_result_log().flush()
+        records = iter_records(since=_float(query, "since"), until=_float(query, "until"),
+                               engine=query.get("engine"))
+        chunks = (chunk.encode("utf-8") for chunk in exporter(records))
+        return 200, content_type, chunks, {
+            "Content-Disposition": f'attachment; filename="results.{kind}"'}
+    return route
+
+
+register_route("/results.jsonl", _export_route("jsonl"))
+register_route("/results.csv", _export_route("csv"))
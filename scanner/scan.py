@@ -0,0 +1,134 @@
+"""API de escaneo sin interfaz: imágenes en disco → lecturas de dígitos"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from .detect import propose_regions, recognize_first_confident
+from .errors import ErrorKind
+from .frame import FrameContext
+from .imaging import default_roi, get_roi, resolve_roi
+from .metrics import timed
+from .preprocess import get_preprocessor
+from .sweep import sweep_if_unreliable
+
+
+@timed("decode")
+def load_image(path):
+    """Lee una imagen en BGR (admite rutas con caracteres no ASCII)"""
+    data = np.fromfile(path, np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR) if data.size else None
+    if image is None:
+        raise ValueError(f"No se pudo decodificar la imagen: {path}")
+    return image
+
+
+def make_record(source, roi, result=None, error=None, elapsed_ms=0.0, error_kind=None):
+    """Registro serializable a JSON con la lectura de un ROI"""
+    if result is None:
+        return {"source": source, "roi": list(roi) if roi else None, "digits": "",
+                "error": error, "error_kind": error_kind.value if error_kind else None,
+                "engine": "", "confidence": 0.0, "elapsed_ms": round(elapsed_ms, 2)}
+    return {
+        "source": source,
+        "roi": list(roi) if roi else None,
+        "digits": result.digits,
+        "error": result.error,
+        "error_kind": result.error_kind.value if result.error_kind else None,
+        "engine": result.engine,
+        "confidence": round(result.confidence, 4),
+        "elapsed_ms": round(result.elapsed_ms, 2),
+    }
+
+
+def crop_rois(image, rois=None):
+    """Recorta cada ROI (o el rectángulo por defecto); None si queda fuera de la imagen"""
+    crops = []
+    for roi in rois or [default_roi(image.shape)]:
+        roi = resolve_roi(roi, image.shape)
+        crop = get_roi(image, *roi)
+        crops.append((roi, crop if crop.size > 0 else None))
+    return crops
+
+
+def scan_image(image, recognizer, rois=None, source="", detect=False, preprocess=None, sweep=False):
+    """Reconoce cada ROI de una imagen; sin ROIs usa el rectángulo por defecto
+
+    Con ``detect`` y sin ROIs explícitos se localizan las líneas de dígitos y
+    se devuelve un único registro con la mejor lectura (el rectángulo por
+    defecto queda como último recurso). Cada recorte pasa por ``preprocess``
+    (por defecto el pipeline de SCANNER_PREPROCESS) antes de reconocerse.
+    Con ``sweep`` las lecturas poco fiables se repiten con el barrido de
+    giros, escalas y filtros (scanner.sweep).
+    """
+    preprocess = preprocess or get_preprocessor()
+    frame = FrameContext(image, preprocess)
+    if detect and not rois:
+        candidates = propose_regions(image)
+        if candidates:
+            regions = [c.roi for c in candidates]
+            regions.extend(roi for roi, crop in crop_rois(image) if crop is not None)
+            result, index = recognize_first_confident(frame.prepare_many(regions), recognizer)
+            if sweep:
+                result = sweep_if_unreliable(image, regions[index], result, recognizer, preprocess, frame)
+            return [make_record(source, regions[index], result)]
+
+    records = []
+    for roi, crop in crop_rois(image, rois):
+        if crop is None:
+            records.append(make_record(source, roi, error="ROI fuera de la imagen",
+                                       error_kind=ErrorKind.INVALID_ROI))
+            continue
+        result = recognizer.recognize(preprocess(crop))
+        if sweep:
+            result = sweep_if_unreliable(image, roi, result, recognizer, preprocess, frame)
+        records.append(make_record(source, roi, result))
+    return records
+
+
+def scan_file(path, recognizer, rois=None, detect=False, preprocess=None, sweep=False):
+    """Escanea un fichero; los errores de lectura se devuelven como registro"""
+    start = time.perf_counter()
+    try:
+        image = load_image(path)
+    except (OSError, ValueError) as e:
+        return [make_record(path, None, error=str(e), error_kind=ErrorKind.DECODE,
+                            elapsed_ms=(time.perf_counter() - start) * 1000)]
+    return scan_image(image, recognizer, rois=rois, source=path, detect=detect,
+                      preprocess=preprocess, sweep=sweep)
+
+
+def iter_image_paths(paths, extensions=(".jpg", ".jpeg", ".png", ".bmp")):
+    """Expande directorios a los ficheros de imagen que contienen"""
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(extensions):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def scan_paths(paths, recognizer, rois=None, workers=1, detect=False, preprocess=None,
+               sweep=False):
+    """Escanea ficheros en paralelo y produce los registros según van terminando"""
+    paths = iter_image_paths(paths)
+    if workers <= 1:
+        for path in paths:
+            yield from scan_file(path, recognizer, rois, detect, preprocess, sweep)
+        return
+
+    # Como mucho 2×workers ficheros en vuelo para no cargar todo el directorio
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for path in paths:
+            pending.add(executor.submit(scan_file, path, recognizer, rois, detect, preprocess,
+                                        sweep))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in pending:
+            yield from future.result()
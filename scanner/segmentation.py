@@ -0,0 +1,95 @@
+"""Segmentación de la imagen en glifos candidatos a dígito"""
+import cv2
+import numpy as np
+
+# Lado del lienzo normalizado de cada glifo y de la caja donde se encaja
+GLYPH_SIZE = 20
+GLYPH_BOX = 16
+
+
+def normalize_glyph(mask):
+    """Centra un glifo binario en un lienzo GLYPH_SIZE×GLYPH_SIZE conservando su proporción"""
+    ys, xs = np.nonzero(mask)
+    if len(xs) == 0:
+        return None
+    glyph = mask[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+
+    h, w = glyph.shape
+    scale = GLYPH_BOX / max(h, w)
+    new_w = max(1, int(round(w * scale)))
+    new_h = max(1, int(round(h * scale)))
+    glyph = cv2.resize(glyph, (new_w, new_h), interpolation=cv2.INTER_AREA)
+
+    canvas = np.zeros((GLYPH_SIZE, GLYPH_SIZE), np.float32)
+    off_x = (GLYPH_SIZE - new_w) // 2
+    off_y = (GLYPH_SIZE - new_h) // 2
+    canvas[off_y:off_y + new_h, off_x:off_x + new_w] = glyph
+    return canvas.ravel() / 255.0
+
+
+def _split_wide_component(x, y, w, h, mask):
+    """Separa glifos fusionados cortando por los mínimos de la proyección vertical"""
+    parts = int(round(w / (0.8 * h)))
+    if parts < 2:
+        return [(x, y, w, h, mask)]
+
+    profile = (mask > 0).sum(axis=0)
+    step = w / float(parts)
+    cuts = [0]
+    for part in range(1, parts):
+        center = int(part * step)
+        lo = max(cuts[-1] + 1, center - int(step * 0.3))
+        hi = min(w - 1, center + int(step * 0.3))
+        cuts.append(lo + int(np.argmin(profile[lo:hi + 1])) if hi > lo else center)
+    cuts.append(w)
+
+    pieces = []
+    for left, right in zip(cuts, cuts[1:]):
+        if right - left > 1:
+            pieces.append((x + left, y, right - left, h, mask[:, left:right]))
+    return pieces
+
+
+def segment_glyphs(gray, min_height_ratio=0.12):
+    """Segmenta la imagen mejorada en componentes conexos candidatos a dígito"""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Los dígitos son minoría: si el primer plano domina, la polaridad es inversa
+    if cv2.countNonZero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
+
+    img_h, img_w = binary.shape
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+
+    candidates = []
+    for index in range(1, count):
+        x, y, w, h, area = stats[index]
+        if h < max(8, img_h * min_height_ratio) or h >= img_h - 1:
+            continue
+        if w > h * 3.5 or w >= img_w - 1:
+            continue
+        fill = area / float(w * h)
+        if fill < 0.1 or fill > 0.95:
+            continue
+        mask = np.where(labels[y:y + h, x:x + w] == index, 255, 0).astype(np.uint8)
+        if w > h * 1.2:
+            candidates.extend(_split_wide_component(x, y, w, h, mask))
+        else:
+            candidates.append((x, y, w, h, mask))
+
+    if not candidates:
+        return binary, []
+
+    # Quedarse con la línea de texto dominante: el grupo más numeroso de glifos
+    # de altura similar que comparten banda vertical
+    def same_line(ref, other):
+        ref_center = ref[1] + ref[3] / 2.0
+        return (0.7 * ref[3] <= other[3] <= 1.4 * ref[3]
+                and other[1] <= ref_center <= other[1] + other[3])
+
+    line = max(
+        ([c for c in candidates if same_line(ref, c)] for ref in candidates),
+        key=lambda group: (len(group), max(c[3] for c in group)),
+    )
+    line.sort(key=lambda c: c[0])
+
+    return binary, [((x, y, w, h), mask) for x, y, w, h, mask in line]
@@ -0,0 +1,77 @@
+"""Servidor HTTP ligero para endpoints de servicio (métricas, exportaciones)
+
+Cada módulo registra sus rutas con ``register_route``; el manejador recibe
+los parámetros de la query y devuelve (estado, content-type, cuerpo) o
+(estado, content-type, cuerpo, cabeceras). Un cuerpo iterable de bytes se
+envía en streaming según se genera, sin Content-Length (la conexión se cierra
+al terminar).
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# ruta → función(query) -> (estado, content_type, cuerpo en str, bytes o iterable de bytes[, cabeceras])
+ROUTES = {}
+
+
+def register_route(path, handler):
+    """Publica ``handler`` en ``path`` para todos los servidores arrancados"""
+    ROUTES[path] = handler
+
+
+class RouteHandler(BaseHTTPRequestHandler):
+    """Despacha GET a las rutas registradas"""
+
+    def log_message(self, format, *args):
+        # Silenciar el log de cada petición
+        pass
+
+    def _send(self, status, content_type, body, headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if isinstance(body, bytes):
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        # Streaming: HTTP/1.0 sin longitud, el cliente lee hasta el cierre
+        self.close_connection = True
+        self.end_headers()
+        try:
+            for chunk in body:
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente canceló la descarga
+            pass
+        finally:
+            close = getattr(body, "close", None)
+            if close is not None:
+                close()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        handler = ROUTES.get(url.path)
+        if handler is None:
+            self._send(404, "text/plain; charset=utf-8", "Not found\n")
+            return
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            status, content_type, body, *headers = handler(query)
+        except Exception as e:
+            status, content_type, body, headers = 500, "text/plain; charset=utf-8", f"{type(e).__name__}: {e}\n", []
+        self._send(status, content_type, body, *headers)
+
+
+def start_server(host="127.0.0.1", port=0):
+    """Arranca el servidor en un hilo y lo devuelve; su URL base está en server.url"""
+    server = ThreadingHTTPServer((host, port), RouteHandler)
+    server.daemon_threads = True
+    server.url = f"http://{host}:{server.server_address[1]}"
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
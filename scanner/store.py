@@ -0,0 +1,307 @@
+"""Almacén de capturas en disco con índice SQLite, retención y reprocesado
+
+Cada captura se guarda una sola vez (el identificador es el hash de su
+contenido) en ``root/ab/cd/<capture_id>.jpg`` con escritura atómica. El índice
+relaciona cada captura con sus lecturas (ROI, motor, dígitos, latencia), de
+modo que consultar, reprocesar o liberar espacio no requiere recorrer el
+directorio.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+from PIL import Image
+
+from .config import get_setting
+from .errors import ErrorKind
+from .scan import iter_image_paths, load_image, make_record, scan_image
+
+# capture_<epoch>.jpg: nombre de las capturas antiguas de temp/
+CAPTURE_NAME = re.compile(r"capture_(\d+)\.\w+$")
+
+
+def capture_id_for(data):
+    """Identificador estable de una captura: hash de sus bytes"""
+    return hashlib.sha256(data).hexdigest()[:24]
+
+
+class CaptureStore:
+    """Capturas en un árbol de directorios repartido por hash e indexadas en SQLite"""
+
+    def __init__(self, root=None, index_path=None, max_bytes=None, max_age=None):
+        self.root = root or get_setting("store_root")
+        self.index_path = index_path or os.path.join(self.root, "index.sqlite3")
+        self.max_bytes = max_bytes if max_bytes is not None else get_setting("store_max_bytes")
+        self.max_age = max_age if max_age is not None else get_setting("store_max_age")
+        self._lock = threading.Lock()
+
+        os.makedirs(self.root, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS captures ("
+                " capture_id TEXT PRIMARY KEY,"
+                " path TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " bytes INTEGER NOT NULL,"
+                " width INTEGER NOT NULL,"
+                " height INTEGER NOT NULL,"
+                " source TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS readings ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " capture_id TEXT NOT NULL REFERENCES captures (capture_id) ON DELETE CASCADE,"
+                " created REAL NOT NULL,"
+                " roi TEXT,"
+                " engine TEXT,"
+                " digits TEXT,"
+                " error_kind TEXT,"
+                " confidence REAL,"
+                " latency_ms REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS captures_created ON captures (created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS readings_capture ON readings (capture_id, id)")
+
+    def _connect(self):
+        # Una conexión por operación: seguro entre hilos y procesos
+        conn = sqlite3.connect(self.index_path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _relative_path(self, capture_id, extension):
+        return os.path.join(capture_id[:2], capture_id[2:4], capture_id + extension)
+
+    def _write_atomic(self, path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Fichero temporal en el mismo directorio + os.replace: nunca hay JPEG a medias
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def add(self, data, created=None, source=None):
+        """Guarda una imagen codificada y devuelve su capture_id (idempotente)"""
+        data = bytes(data)
+        try:
+            with Image.open(io.BytesIO(data)) as probe:
+                width, height = probe.size
+                extension = "." + (probe.format or "jpg").lower().replace("jpeg", "jpg")
+        except Exception as e:
+            raise ValueError(f"Imagen no válida: {e}") from e
+
+        capture_id = capture_id_for(data)
+        relative = self._relative_path(capture_id, extension)
+        path = os.path.join(self.root, relative)
+        with self._lock:
+            if not os.path.exists(path):
+                self._write_atomic(path, data)
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO captures (capture_id, path, created, bytes, width, height, source)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (capture_id, relative, created or time.time(), len(data), width, height, source),
+                )
+        if self.max_bytes or self.max_age:
+            self.evict()
+        return capture_id
+
+    def record(self, capture_id, roi, result):
+        """Asocia una lectura (RecognitionResult) a la captura"""
+        self._insert_reading(capture_id, roi, result.engine, result.digits,
+                             result.error_kind.value if result.error_kind else None,
+                             result.confidence, result.elapsed_ms)
+
+    def _insert_reading(self, capture_id, roi, engine, digits, error_kind, confidence, latency_ms):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO readings (capture_id, created, roi, engine, digits, error_kind, confidence, latency_ms)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (capture_id, time.time(), json.dumps(list(roi)) if roi else None, engine,
+                 digits, error_kind, confidence, latency_ms),
+            )
+
+    def get(self, capture_id):
+        """Captura con su última lectura, o None"""
+        rows = self.query(capture_id=capture_id, limit=1)
+        return rows[0] if rows else None
+
+    def path(self, capture_id):
+        """Ruta absoluta del fichero de la captura, o None si no está indexada"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT path FROM captures WHERE capture_id = ?", (capture_id,)).fetchone()
+        return os.path.join(self.root, row["path"]) if row else None
+
+    def load(self, capture_id):
+        """Bytes de la captura"""
+        path = self.path(capture_id)
+        if path is None:
+            raise KeyError(capture_id)
+        with open(path, "rb") as f:
+            return f.read()
+
+    def readings(self, capture_id):
+        """Todas las lecturas de una captura, de la más antigua a la más reciente"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM readings WHERE capture_id = ? ORDER BY id",
+                                (capture_id,)).fetchall()
+        return [self._reading(row) for row in rows]
+
+    @staticmethod
+    def _reading(row):
+        reading = dict(row)
+        reading["roi"] = json.loads(reading["roi"]) if reading["roi"] else None
+        return reading
+
+    def query(self, capture_id=None, since=None, until=None, engine=None, digits=None,
+              has_digits=None, unread=False, limit=100, offset=0):
+        """Capturas (más recientes primero) con su última lectura
+
+        Filtros: intervalo de fechas (epoch), motor y dígitos de la última
+        lectura (``digits`` admite comodines SQL ``%``), ``has_digits`` y
+        ``unread`` (capturas aún sin ninguna lectura).
+        """
+        where, params = [], []
+        if capture_id is not None:
+            where.append("c.capture_id = ?")
+            params.append(capture_id)
+        if since is not None:
+            where.append("c.created >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("c.created < ?")
+            params.append(until)
+        if engine is not None:
+            where.append("r.engine = ?")
+            params.append(engine)
+        if digits is not None:
+            where.append("r.digits LIKE ?")
+            params.append(digits)
+        if has_digits is not None:
+            where.append("COALESCE(r.digits, '') != ''" if has_digits else "COALESCE(r.digits, '') = ''")
+        if unread:
+            where.append("r.id IS NULL")
+
+        sql = (
+            "SELECT c.*, r.id AS reading_id, r.roi, r.engine, r.digits, r.error_kind,"
+            " r.confidence, r.latency_ms, r.created AS read_at"
+            " FROM captures c LEFT JOIN readings r ON r.id ="
+            " (SELECT MAX(id) FROM readings WHERE capture_id = c.capture_id)"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY c.created DESC LIMIT ? OFFSET ?"
+        params.extend([limit if limit is not None else -1, offset])
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [self._reading(row) for row in rows]
+
+    def stats(self):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS captures, COALESCE(SUM(bytes), 0) AS bytes,"
+                " MIN(created) AS oldest, MAX(created) AS newest FROM captures"
+            ).fetchone()
+            readings = conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+        return dict(row, readings=readings)
+
+    def evict(self, max_bytes=None, max_age=None):
+        """Borra las capturas más antiguas que ``max_age`` s o que excedan ``max_bytes``
+
+        Todo se decide con el índice. Devuelve (capturas borradas, bytes liberados).
+        """
+        max_bytes = max_bytes if max_bytes is not None else self.max_bytes
+        max_age = max_age if max_age is not None else self.max_age
+        victims = []
+        with self._lock, self._connect() as conn:
+            if max_age:
+                victims.extend(conn.execute(
+                    "SELECT capture_id, path, bytes FROM captures WHERE created < ?",
+                    (time.time() - max_age,),
+                ).fetchall())
+            if max_bytes:
+                total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM captures").fetchone()[0]
+                total -= sum(row["bytes"] for row in victims)
+                if total > max_bytes:
+                    seen = {row["capture_id"] for row in victims}
+                    for row in conn.execute("SELECT capture_id, path, bytes FROM captures ORDER BY created"):
+                        if total <= max_bytes:
+                            break
+                        if row["capture_id"] in seen:
+                            continue
+                        victims.append(row)
+                        total -= row["bytes"]
+
+            # Primero el índice: una captura sin fila ya no es visible aunque falle el borrado
+            conn.executemany("DELETE FROM captures WHERE capture_id = ?",
+                             [(row["capture_id"],) for row in victims])
+
+        for row in victims:
+            try:
+                os.unlink(os.path.join(self.root, row["path"]))
+            except FileNotFoundError:
+                pass
+        return len(victims), sum(row["bytes"] for row in victims)
+
+    def import_directory(self, directory, remove=False):
+        """Indexa las imágenes de un directorio (p. ej. las capturas antiguas de temp/)
+
+        La fecha se toma del nombre ``capture_<epoch>`` o, si no, de la
+        modificación del fichero. Devuelve los capture_id importados.
+        """
+        imported = []
+        for path in iter_image_paths([directory]):
+            match = CAPTURE_NAME.search(os.path.basename(path))
+            created = float(match.group(1)) if match else os.path.getmtime(path)
+            with open(path, "rb") as f:
+                data = f.read()
+            try:
+                imported.append(self.add(data, created=created, source=os.path.basename(path)))
+            except ValueError:
+                continue
+            if remove:
+                os.unlink(path)
+        return imported
+
+    def reprocess(self, recognizer, rois=None, detect=False, preprocess=None, **filters):
+        """Vuelve a reconocer las capturas que cumplan ``filters`` y guarda las lecturas
+
+        Produce los registros JSON de cada ROI igual que ``scan_paths``.
+        """
+        filters.setdefault("limit", None)
+        for capture in self.query(**filters):
+            path = os.path.join(self.root, capture["path"])
+            try:
+                image = load_image(path)
+            except (OSError, ValueError) as e:
+                yield make_record(capture["capture_id"], None, error=str(e), error_kind=ErrorKind.DECODE)
+                continue
+            for record in scan_image(image, recognizer, rois=rois, source=capture["capture_id"],
+                                     detect=detect, preprocess=preprocess):
+                if record["engine"]:
+                    self._insert_reading(capture["capture_id"], record["roi"], record["engine"],
+                                         record["digits"], record["error_kind"],
+                                         record["confidence"], record["elapsed_ms"])
+                yield record
+
+
+@lru_cache(maxsize=1)
+def get_store():
+    """Almacén configurado (SCANNER_STORE_*), compartido por el proceso"""
+    return CaptureStore()
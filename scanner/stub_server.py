@@ -0,0 +1,217 @@
+"""Servidor local que imita /parse/image de OCR.space para pruebas sin red
+
+Además de la respuesta normal puede simular lo que hace el servicio real bajo
+carga: latencia variable (``latency``), errores HTTP 500 (``error_rate``),
+errores de procesamiento con HTTP 200 (``api_error_rate``), peticiones que no
+responden a tiempo (``timeout_rate``) y límite de ritmo por clave con 429
+(``rate``/``burst``) o cuota diaria agotada con 403 (``daily_quota``).
+"""
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Muestras de latencia conservadas para las estadísticas
+MAX_SAMPLES = 100000
+
+
+def parse_latency(spec):
+    """Convierte una especificación de latencia en una función rng → segundos
+
+    ``0.3`` o ``fixed:0.3`` (constante), ``uniform:low=0.1:high=0.6``,
+    ``lognormal:median=0.8:sigma=0.5`` (cola larga, como el servicio real) y
+    ``exp:mean=0.4``. Un número se interpreta como latencia fija.
+    """
+    if spec is None or isinstance(spec, (int, float)):
+        value = float(spec or 0.0)
+        return lambda rng: value
+    name, *params = str(spec).split(":")
+    try:
+        if not params:
+            value = float(name)
+            return lambda rng: value
+        if name == "fixed" and len(params) == 1 and "=" not in params[0]:
+            value = float(params[0])
+            return lambda rng: value
+        options = {}
+        for param in params:
+            key, sep, value = param.partition("=")
+            if not sep:
+                raise ValueError(param)
+            options[key] = float(value)
+    except ValueError:
+        raise ValueError(f"Latencia inválida: '{spec}'") from None
+
+    if name == "uniform":
+        low, high = options.get("low", 0.0), options.get("high", 1.0)
+        return lambda rng: rng.uniform(low, high)
+    if name == "lognormal":
+        mu, sigma = math.log(options.get("median", 0.5)), options.get("sigma", 0.5)
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    if name == "exp":
+        mean = options.get("mean", 0.5)
+        return lambda rng: rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+    if name == "fixed":
+        value = options.get("value", 0.0)
+        return lambda rng: value
+    raise ValueError(f"Distribución de latencia desconocida: '{name}'")
+
+
+class StubOCRHandler(BaseHTTPRequestHandler):
+    """Responde con el mismo contrato JSON que OCR.space"""
+
+    def log_message(self, format, *args):
+        # Silenciar el log de cada petición
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _reply(self, start, status, body):
+        self._send_json(status, body)
+        self.server.record(status, time.perf_counter() - start)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode(errors="replace"))
+        server = self.server
+        with server.lock:
+            server.requests_seen += 1
+
+        if self.path.split("?")[0] != "/parse/image":
+            self._reply(start, 404, {"IsErroredOnProcessing": True, "ErrorMessage": ["Not found"]})
+            return
+        # Respuesta por clave (p. ej. 429 o 403) para probar la rotación
+        key = form.get("apikey", [""])[0]
+        with server.lock:
+            server.requests_by_key[key] = server.requests_by_key.get(key, 0) + 1
+            status = server.key_status.get(key, server.status)
+            if status == 200:
+                status = server.admit(key)
+            latency = server.latency(server.rng)
+            roll = server.rng.random()
+        if status != 200:
+            messages = {429: "You may only perform this action upto maximum number of times",
+                        403: "The daily quota for this key has been exceeded"}
+            self._reply(start, status, {"IsErroredOnProcessing": True,
+                                        "ErrorMessage": [messages.get(status, "Stub error")]})
+            return
+
+        # Fallos inyectados: sin respuesta a tiempo, 500 o error de procesamiento con 200
+        if roll < server.timeout_rate:
+            time.sleep(server.hang)
+            self._reply(start, 504, {"IsErroredOnProcessing": True, "ErrorMessage": ["Timed out"]})
+            return
+        time.sleep(max(0.0, latency))
+        roll -= server.timeout_rate
+        if roll < server.error_rate:
+            self._reply(start, 500, {"IsErroredOnProcessing": True,
+                                     "ErrorMessage": ["Internal server error"]})
+            return
+        roll -= server.error_rate
+        if roll < server.api_error_rate:
+            self._reply(start, 200, {"OCRExitCode": 3, "IsErroredOnProcessing": True,
+                                     "ErrorMessage": ["Timed out waiting for results"]})
+            return
+        if "base64Image" not in form:
+            self._reply(start, 200, {"IsErroredOnProcessing": True,
+                                     "ErrorMessage": ["No image provided"]})
+            return
+
+        self._reply(start, 200, {
+            "ParsedResults": [{
+                "ParsedText": server.text,
+                "FileParseExitCode": 1,
+                "ErrorMessage": "",
+            }],
+            "OCRExitCode": 1,
+            "IsErroredOnProcessing": False,
+        })
+
+
+class StubOCRServer(ThreadingHTTPServer):
+    """Servidor con los parámetros de la simulación y contadores de lo servido"""
+    daemon_threads = True
+
+    def __init__(self, address, text="12345", status=200, latency=0.0, error_rate=0.0,
+                 api_error_rate=0.0, timeout_rate=0.0, hang=60.0, rate=0.0, burst=5,
+                 daily_quota=0, seed=None):
+        super().__init__(address, StubOCRHandler)
+        self.text = text
+        self.status = status
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.api_error_rate = api_error_rate
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+        self.rate = rate
+        self.burst = burst
+        self.daily_quota = daily_quota
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests_seen = 0
+        self.requests_by_key = {}
+        self.key_status = {}
+        self._buckets = {}
+        self._statuses = {}
+        self._latencies = []
+
+    def admit(self, key):
+        """Cubo de tokens y cuota por clave (con el lock tomado): 200, 429 o 403"""
+        if self.daily_quota and self.requests_by_key[key] > self.daily_quota:
+            return 403
+        if not self.rate:
+            return 200
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return 429
+        self._buckets[key] = (tokens - 1, now)
+        return 200
+
+    def record(self, status, elapsed):
+        with self.lock:
+            self._statuses[status] = self._statuses.get(status, 0) + 1
+            if len(self._latencies) < MAX_SAMPLES:
+                self._latencies.append(elapsed)
+
+    def stats(self):
+        """Peticiones por código HTTP y latencia servida (ms)"""
+        with self.lock:
+            latencies = sorted(self._latencies)
+            statuses = dict(sorted(self._statuses.items()))
+
+        def quantile(q):
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+
+        return {
+            "requests": self.requests_seen,
+            "statuses": statuses,
+            "latency_ms": {"p50": quantile(0.5), "p95": quantile(0.95), "p99": quantile(0.99)}
+            if latencies else {},
+        }
+
+
+def start_stub_server(host="127.0.0.1", port=0, text="12345", status=200, **options):
+    """Arranca el servidor en un hilo y lo devuelve; su URL está en server.url
+
+    ``options`` son los parámetros de simulación de StubOCRServer (latency,
+    error_rate, api_error_rate, timeout_rate, hang, rate, burst, daily_quota, seed).
+    """
+    server = StubOCRServer((host, port), text=text, status=status, **options)
+    server.url = f"http://{host}:{server.server_address[1]}/parse/image"
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,220 @@
+"""Barrido de giros, escalas y filtros cuando la lectura del rectángulo no es fiable
+
+Una etiqueta inclinada o unos dígitos pequeños hacen fallar el intento único
+sobre el recorte centrado. En lugar de pedir al usuario que vuelva a alinear,
+se generan variantes del ROI a partir de la captura ya decodificada (giros
+alrededor de la inclinación estimada, dos o tres escalas y filtros como el
+umbral adaptativo), se puntúan con el análisis local, que cuesta unos pocos
+milisegundos, y sólo las más prometedoras van al motor, de mejor a peor,
+hasta la primera lectura fiable y válida.
+"""
+import math
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+from .config import get_setting
+from .formats import parse_formats
+from .frame import FrameContext
+from .imaging import default_roi, resolve_roi
+from .metrics import inc, timer
+from .preprocess import Deskew, PreprocessPipeline, build_pipeline
+from .recognizers import LocalDigitRecognizer
+from .segmentation import normalize_glyph, segment_glyphs
+
+
+@dataclass
+class Variant:
+    """Variante del ROI: transformación aplicada, puntuación local e imagen preparada"""
+    angle: float
+    scale: float
+    filter: str
+    score: float = 0.0
+    digits: str = ""
+    image: object = field(default=None, repr=False)
+
+    @property
+    def label(self):
+        return f"{self.angle:+.1f}° ×{self.scale:g} {self.filter}"
+
+
+def _parse_floats(text):
+    return [float(value) for value in text.split(",") if value.strip()]
+
+
+def _to_gray(image):
+    return image if len(image.shape) == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def transform_roi(image, roi, angle=0.0, scale=1.0):
+    """ROI girado ``angle`` grados alrededor de su centro y escalado, con el contexto de la captura
+
+    Se usa la imagen alrededor del ROI, así que el giro no introduce esquinas
+    vacías salvo en el borde de la captura.
+    """
+    x, y, w, h = roi
+    height, width = image.shape[:2]
+    radians = math.radians(abs(angle))
+    pad = int(math.ceil(max(w, h) * math.sin(radians))) + 2
+    x0, y0 = max(0, x - pad), max(0, y - pad)
+    x1, y1 = min(width, x + w + pad), min(height, y + h + pad)
+    region = image[y0:y1, x0:x1]
+
+    center = (x + w / 2.0 - x0, y + h / 2.0 - y0)
+    out_w, out_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+    matrix = cv2.getRotationMatrix2D(center, angle, scale)
+    # Llevar el centro del ROI al centro de la salida
+    matrix[0, 2] += out_w / 2.0 - center[0]
+    matrix[1, 2] += out_h / 2.0 - center[1]
+    interpolation = cv2.INTER_CUBIC if scale > 1 else cv2.INTER_LINEAR
+    return cv2.warpAffine(region, matrix, (out_w, out_h), flags=interpolation,
+                          borderMode=cv2.BORDER_REPLICATE)
+
+
+def candidate_angles(gray_roi, offsets):
+    """0°, la inclinación estimada (rectángulo mínimo de la tinta) y desvíos de ambos"""
+    deskew = Deskew()
+    estimate = deskew.angle(gray_roi)
+    bases = [0.0]
+    if deskew.min_angle <= abs(estimate) <= deskew.max_angle:
+        bases.append(estimate)
+    angles = []
+    for base in bases:
+        for offset in [0.0] + list(offsets):
+            angle = round((base + offset) * 2) / 2.0
+            if abs(angle) <= deskew.max_angle and angle not in angles:
+                angles.append(angle)
+    return angles
+
+
+def score_variant(image, classifier, min_glyph_confidence=0.2):
+    """Puntuación 0-1 de una variante y los dígitos que lee el análisis local
+
+    Combina cuántos glifos hay (hasta 8), cuánto se parecen a dígitos y lo
+    recta que queda la línea que forman (una variante bien enderezada tiene
+    los centros alineados en horizontal).
+    """
+    _, glyphs = segment_glyphs(_to_gray(image))
+    digits, confidences, centers = [], [], []
+    for (x, y, w, h), mask in glyphs:
+        feature = normalize_glyph(mask)
+        if feature is None:
+            continue
+        digit, confidence = classifier.classify(feature)
+        if confidence < min_glyph_confidence:
+            continue
+        digits.append(str(digit))
+        confidences.append(confidence)
+        centers.append((x + w / 2.0, y + h / 2.0))
+    if len(digits) < 2:
+        return 0.0, "".join(digits)
+
+    straightness = 1.0
+    if len(centers) >= 3:
+        xs, ys = zip(*centers)
+        slope = abs(np.polyfit(xs, ys, 1)[0])
+        straightness = max(0.0, 1.0 - slope * 5)
+    score = min(len(digits), 8) / 8.0 * float(np.mean(confidences)) * straightness
+    return score, "".join(digits)
+
+
+def sweep_variants(image, roi=None, preprocess=None, angles=None, scales=None, filters=None,
+                   frame=None, formats=None):
+    """Variantes del ROI ordenadas de más a menos prometedora
+
+    ``angles`` son desvíos en grados respecto a 0° y a la inclinación
+    estimada (SCANNER_SWEEP_ANGLES), ``scales`` factores de escala
+    (SCANNER_SWEEP_SCALES) y ``filters`` especificaciones de preprocesado
+    separadas por ';' que se aplican al final (SCANNER_SWEEP_FILTERS). Las
+    etapas de captura de ``preprocess`` se aplican una sola vez (``frame``
+    permite reutilizar un FrameContext ya calculado); de las de recorte se
+    omite el enderezado, que aquí sustituyen los giros. Las variantes cuya
+    lectura local cumple alguno de ``formats`` van primero.
+    """
+    angles = angles if angles is not None else _parse_floats(get_setting("sweep_angles"))
+    scales = scales if scales is not None else _parse_floats(get_setting("sweep_scales"))
+    filters = filters if filters is not None else get_setting("sweep_filters")
+    if isinstance(filters, str):
+        filters = [spec.strip() for spec in filters.split(";") if spec.strip()] or ["none"]
+    formats = formats if formats is not None else parse_formats(get_setting("digit_formats"))
+
+    frame = frame or FrameContext(image, preprocess)
+    roi = resolve_roi(roi, image.shape) if roi is not None else default_roi(image.shape)
+    level = frame.level()
+    crop_stages = frame.crop_stages
+    if isinstance(crop_stages, PreprocessPipeline):
+        crop_stages = PreprocessPipeline([stage for stage in crop_stages.stages if not isinstance(stage, Deskew)])
+    pipelines = [(spec, build_pipeline(spec)) for spec in filters]
+    classifier = LocalDigitRecognizer()
+
+    variants = []
+    with timer("sweep"):
+        for angle in candidate_angles(_to_gray(frame.view(roi)), angles):
+            for scale in scales:
+                base = crop_stages(transform_roi(level, roi, angle, scale))
+                for spec, pipeline in pipelines:
+                    prepared = pipeline(base) if pipeline.stages else base
+                    score, digits = score_variant(prepared, classifier)
+                    if formats and any(f.matches(digits) for f in formats):
+                        score += 1.0
+                    variants.append(Variant(angle, scale, spec, round(score, 4), digits, prepared))
+    variants.sort(key=lambda variant: variant.score, reverse=True)
+    return variants
+
+
+def recognize_sweep(image, recognizer, roi=None, preprocess=None, max_attempts=None,
+                    min_confidence=None, formats=None, frame=None):
+    """Reconoce las mejores variantes del ROI hasta la primera lectura fiable y válida
+
+    Como mucho ``max_attempts`` llamadas al motor (SCANNER_SWEEP_MAX_ATTEMPTS);
+    una variante que el análisis local lee igual que otra ya enviada se
+    salta, y las que no muestran ningún dígito no se envían. Devuelve
+    (resultado, variante); si ninguna convence, la mejor lectura obtenida, y
+    (None, None) si no hubo ninguna variante que enviar.
+    """
+    max_attempts = max_attempts if max_attempts is not None else get_setting("sweep_max_attempts")
+    min_confidence = (min_confidence if min_confidence is not None
+                      else get_setting("local_min_confidence"))
+    formats = formats if formats is not None else parse_formats(get_setting("digit_formats"))
+
+    best = (None, None)
+    tried = set()
+    attempts = 0
+    for variant in sweep_variants(image, roi, preprocess, frame=frame, formats=formats):
+        if attempts >= max_attempts or variant.score <= 0:
+            break
+        if variant.digits in tried:
+            continue
+        tried.add(variant.digits)
+        result = recognizer.recognize(variant.image)
+        attempts += 1
+        inc("scanner_sweep_recognitions_total")
+        valid = not formats or any(f.matches(result.digits) for f in formats)
+        if result.ok and valid and result.confidence >= min_confidence:
+            inc("scanner_sweep_total", outcome="hit")
+            return result, variant
+        current = best[0]
+        if current is None or (result.ok and (not current.ok or result.confidence > current.confidence)):
+            best = (result, variant)
+    inc("scanner_sweep_total", outcome="miss")
+    return best
+
+
+def sweep_if_unreliable(image, roi, result, recognizer, preprocess=None, frame=None):
+    """Repite la lectura con el barrido de giros y escalas si no es fiable
+
+    La lectura del barrido sólo sustituye a la original si es fiable por sí
+    misma (confianza ≥ SCANNER_LOCAL_MIN_CONFIDENCE y válida para
+    SCANNER_DIGIT_FORMATS): una lectura dudosa no reemplaza a «sin dígitos».
+    """
+    min_confidence = get_setting("local_min_confidence")
+    if result.ok and result.confidence >= min_confidence:
+        return result
+    formats = parse_formats(get_setting("digit_formats"))
+    swept, _ = recognize_sweep(image, recognizer, roi, preprocess, min_confidence=min_confidence,
+                               formats=formats, frame=frame)
+    if (swept is not None and swept.ok and swept.confidence >= min_confidence
+            and (not formats or any(f.matches(swept.digits) for f in formats))):
+        return swept
+    return result
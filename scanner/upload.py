@@ -0,0 +1,104 @@
+"""Optimización del ROI antes de subirlo a la API (tamaño, color y formato)"""
+import base64
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from .config import get_setting
+from .imaging import preprocess_image
+from .metrics import BYTE_BUCKETS, observe, timed
+from .segmentation import segment_glyphs
+
+# Calidades JPEG probadas, de mejor a peor, hasta cumplir el presupuesto
+JPEG_QUALITIES = (90, 80, 70, 60, 50, 40)
+
+
+@dataclass
+class UploadImage:
+    """Imagen codificada lista para enviar"""
+    data: bytes
+    mime: str
+    scale: float
+    width: int
+    height: int
+
+    @property
+    def base64(self):
+        return base64.b64encode(self.data).decode()
+
+
+def estimate_glyph_height(gray):
+    """Altura mediana de los glifos de la línea dominante, o None si no hay"""
+    _, glyphs = segment_glyphs(preprocess_image(gray))
+    if not glyphs:
+        return None
+    return float(np.median([box[3] for box, _ in glyphs]))
+
+
+def _convert(image, color_mode):
+    if color_mode == "color":
+        return image
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    if color_mode == "binary":
+        _, gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return gray
+
+
+def _encode_candidates(image, binary):
+    """Codificaciones posibles de mayor a menor calidad"""
+    if binary:
+        # PNG comprime muy bien imágenes de dos niveles y no introduce artefactos
+        ok, buffer = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, 9])
+        if ok:
+            yield buffer.tobytes(), "image/png"
+    for quality in JPEG_QUALITIES:
+        ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            yield buffer.tobytes(), "image/jpeg"
+
+
+@timed("encode")
+def optimize_for_upload(image, target_glyph_height=None, color_mode=None, byte_budget=None,
+                        max_side=None):
+    """Normaliza el ROI a una altura de glifo objetivo y lo codifica dentro del presupuesto
+
+    - Escala la imagen para que los dígitos midan ``target_glyph_height`` px
+      (sin glifos detectables sólo se limita el lado mayor a ``max_side``)
+    - Convierte a escala de grises o binaria según ``color_mode``
+    - Prueba PNG (binaria) y JPEG de mayor a menor calidad; si nada cabe en
+      ``byte_budget`` reduce la imagen y vuelve a intentarlo
+    """
+    target_glyph_height = target_glyph_height or get_setting("upload_glyph_height")
+    color_mode = color_mode or get_setting("upload_color_mode")
+    byte_budget = byte_budget or get_setting("upload_byte_budget")
+    max_side = max_side or get_setting("upload_max_side")
+
+    converted = _convert(image, color_mode)
+    height, width = converted.shape[:2]
+
+    glyph_height = estimate_glyph_height(converted)
+    scale = target_glyph_height / glyph_height if glyph_height else 1.0
+    # No ampliar más de 3× ni reducir por debajo de una cuarta parte
+    scale = min(max(scale, 0.25), 3.0)
+    scale = min(scale, max_side / float(max(height, width) * 1.0))
+
+    encoded = None
+    while True:
+        new_size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+        resized = converted if scale == 1.0 else cv2.resize(converted, new_size, interpolation=interpolation)
+        if color_mode == "binary" and scale != 1.0:
+            _, resized = cv2.threshold(resized, 127, 255, cv2.THRESH_BINARY)
+
+        for data, mime in _encode_candidates(resized, color_mode == "binary"):
+            encoded = UploadImage(data, mime, scale, resized.shape[1], resized.shape[0])
+            if len(data) <= byte_budget:
+                observe("scanner_payload_bytes", len(data), BYTE_BUCKETS, kind="encoded")
+                return encoded
+
+        if min(new_size) <= 16:
+            # Ya no se puede reducir más: enviar la versión más pequeña obtenida
+            observe("scanner_payload_bytes", len(encoded.data), BYTE_BUCKETS, kind="encoded")
+            return encoded
+        scale *= 0.75
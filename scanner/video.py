@@ -0,0 +1,287 @@
+"""Escaneo continuo de vídeo: selección de fotogramas y votación temporal
+
+En lugar de reconocer cada fotograma, cada uno recibe una puntuación barata
+(nitidez por varianza del laplaciano, exposición y presencia de glifos) sobre
+el ROI reducido a una altura fija. Sólo el mejor fotograma de cada ventana de
+``window`` segundos se envía al motor, y el resultado sale de votar dígito a
+dígito entre las lecturas recientes, así un fotograma movido o un dígito mal
+leído no decide la lectura.
+"""
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import cv2
+
+from .config import get_setting
+from .imaging import default_roi, get_roi, resolve_roi
+from .metrics import inc, timer
+from .preprocess import Grayscale, get_preprocessor
+from .segmentation import segment_glyphs
+
+_GRAY = Grayscale()
+
+
+@dataclass
+class FrameScore:
+    """Calidad estimada de un fotograma para el reconocimiento"""
+    sharpness: float = 0.0
+    exposure: float = 0.0
+    glyphs: int = 0
+
+    @property
+    def value(self):
+        """Puntuación combinada: sólo compara fotogramas que ya superaron los umbrales"""
+        return self.sharpness * self.exposure * min(self.glyphs, 12)
+
+
+def score_frame(image, roi=None, analysis_height=None):
+    """Puntúa el ROI de un fotograma (por defecto el rectángulo centrado)
+
+    La imagen se reduce a ``analysis_height`` px de alto (SCANNER_VIDEO_ANALYSIS_HEIGHT)
+    antes de medir, de modo que el coste no depende de la resolución de la
+    cámara y la nitidez es comparable entre fuentes.
+    """
+    analysis_height = analysis_height or get_setting("video_analysis_height")
+    with timer("frame_score"):
+        roi = resolve_roi(roi, image.shape) if roi is not None else default_roi(image.shape)
+        crop = get_roi(image, *roi)
+        if crop.size == 0:
+            return FrameScore()
+        gray = _GRAY(crop)
+        scale = analysis_height / float(gray.shape[0])
+        if scale < 1:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        # Exposición: media cercana al gris medio y pocos píxeles saturados
+        mean = float(gray.mean())
+        clipped = float(((gray < 8) | (gray > 247)).mean())
+        exposure = max(0.0, 1.0 - abs(mean - 128.0) / 128.0) * (1.0 - clipped)
+        _, glyphs = segment_glyphs(gray)
+    return FrameScore(sharpness, exposure, len(glyphs))
+
+
+class FrameSelector:
+    """Conserva el mejor fotograma de cada ventana temporal
+
+    ``offer`` devuelve el mejor fotograma (timestamp, imagen, puntuación) de
+    la ventana anterior cuando llega el primero de la siguiente; los que no
+    superan los umbrales se descartan sin copiarlos.
+    """
+
+    def __init__(self, window=None, min_sharpness=None, min_exposure=None, min_glyphs=None):
+        self.window = window if window is not None else get_setting("video_window")
+        self.min_sharpness = min_sharpness if min_sharpness is not None else get_setting("video_min_sharpness")
+        self.min_exposure = min_exposure if min_exposure is not None else get_setting("video_min_exposure")
+        self.min_glyphs = min_glyphs if min_glyphs is not None else get_setting("video_min_glyphs")
+        self._window_start = None
+        self._best = None
+
+    def acceptable(self, score):
+        return (score.sharpness >= self.min_sharpness and score.exposure >= self.min_exposure
+                and score.glyphs >= self.min_glyphs)
+
+    def offer(self, timestamp, image, score):
+        selected = None
+        if self._window_start is None:
+            self._window_start = timestamp
+        elif timestamp - self._window_start >= self.window:
+            selected = self.flush()
+            self._window_start = timestamp
+
+        if not self.acceptable(score):
+            inc("scanner_video_frames_total", outcome="rejected")
+        elif self._best is None or score.value > self._best[2].value:
+            # Copia: algunos orígenes reutilizan el búfer del fotograma
+            self._best = (timestamp, image.copy(), score)
+        return selected
+
+    def flush(self):
+        """Mejor fotograma de la ventana en curso (o None) y vacía la ventana"""
+        best, self._best = self._best, None
+        return best
+
+
+class DigitVoter:
+    """Votación temporal de lecturas, posición a posición
+
+    Entre las últimas ``history`` lecturas válidas se toma la longitud más
+    votada y, para cada posición, el dígito con más peso (la confianza de cada
+    lectura). Hay consenso cuando al menos ``min_votes`` lecturas tienen esa
+    longitud y cada posición gana con una proporción ≥ ``agreement``.
+    """
+
+    def __init__(self, min_votes=None, agreement=None, history=None):
+        self.min_votes = min_votes or get_setting("video_votes")
+        self.agreement = agreement if agreement is not None else get_setting("video_agreement")
+        self.readings = deque(maxlen=history or max(2 * self.min_votes, 5))
+
+    def add(self, result):
+        if result.ok:
+            self.readings.append((result.digits, max(result.confidence, 0.05)))
+
+    def consensus(self):
+        """(dígitos, confianza) si hay consenso, si no None"""
+        leader = self.leader()
+        if leader is None or leader[2] < self.min_votes or leader[1] < self.agreement:
+            return None
+        return leader[:2]
+
+    def leader(self):
+        """Lectura fusionada provisional: (dígitos, proporción mínima por posición, apoyos)"""
+        if not self.readings:
+            return None
+        length, support = Counter(len(d) for d, _ in self.readings).most_common(1)[0]
+        readings = [(d, w) for d, w in self.readings if len(d) == length]
+        total = sum(w for _, w in readings)
+        digits, shares = [], []
+        for position in range(length):
+            weights = Counter()
+            for d, w in readings:
+                weights[d[position]] += w
+            digit, weight = weights.most_common(1)[0]
+            digits.append(digit)
+            shares.append(weight / total)
+        return "".join(digits), min(shares), support
+
+
+@dataclass
+class StreamState:
+    """Estado de un escaneo continuo, consultable mientras llega el vídeo"""
+    frames: int = 0
+    recognitions: int = 0
+    dropped: int = 0
+    digits: str = ""
+    confidence: float = 0.0
+    candidate: str = ""
+    time_to_result_ms: float = None
+    last_score: FrameScore = None
+    readings: list = field(default_factory=list)
+
+    @property
+    def done(self):
+        return bool(self.digits)
+
+
+class LiveScanner:
+    """Selección de fotogramas + reconocimiento + votación para un flujo de vídeo
+
+    ``feed`` se llama con cada fotograma (BGR) y su timestamp en segundos. Con
+    ``background=True`` el reconocimiento corre en un hilo aparte y, si sigue
+    ocupado cuando se cierra la siguiente ventana, ese fotograma se descarta
+    (el próximo será más reciente): el hilo que entrega el vídeo nunca espera
+    al motor OCR.
+    """
+
+    def __init__(self, recognizer, roi=None, preprocess=None, selector=None, voter=None,
+                 background=False):
+        self.recognizer = recognizer
+        self.roi = roi
+        self.preprocess = preprocess or get_preprocessor()
+        self.selector = selector or FrameSelector()
+        self.voter = voter or DigitVoter()
+        self.state = StreamState()
+        self._started = None
+        self._executor = ThreadPoolExecutor(max_workers=1) if background else None
+        self._pending = None
+        self._closed = False
+
+    def feed(self, image, timestamp=None):
+        """Procesa un fotograma; devuelve el estado actualizado"""
+        if self._started is None:
+            self._started = time.perf_counter()
+        timestamp = timestamp if timestamp is not None else time.perf_counter() - self._started
+        self.state.frames += 1
+        if self.state.done or self._closed:
+            return self.state
+
+        score = score_frame(image, self.roi)
+        self.state.last_score = score
+        selected = self.selector.offer(timestamp, image, score)
+        if selected is not None:
+            self._submit(selected)
+        return self.state
+
+    def finish(self):
+        """Reconoce el mejor fotograma pendiente al terminar el vídeo y espera al motor
+
+        Libera el hilo de reconocimiento: los fotogramas que lleguen después se
+        cuentan pero ya no se analizan.
+        """
+        if self._closed:
+            return self.state
+        self._closed = True
+        if not self.state.done:
+            selected = self.selector.flush()
+            if selected is not None:
+                if self._pending is not None:
+                    self._pending.result()
+                self._submit(selected)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        return self.state
+
+    def _submit(self, selected):
+        if self._executor is None:
+            self._recognize(selected)
+        elif self._pending is not None and not self._pending.done():
+            self.state.dropped += 1
+            inc("scanner_video_frames_total", outcome="dropped")
+        else:
+            self._pending = self._executor.submit(self._recognize, selected)
+
+    def _recognize(self, selected):
+        timestamp, image, score = selected
+        inc("scanner_video_frames_total", outcome="recognized")
+        roi = resolve_roi(self.roi, image.shape) if self.roi is not None else default_roi(image.shape)
+        result = self.recognizer.recognize(self.preprocess(get_roi(image, *roi)))
+        self.state.recognitions += 1
+        self.state.readings.append({"timestamp": round(timestamp, 3), "digits": result.digits,
+                                    "confidence": round(result.confidence, 4),
+                                    "sharpness": round(score.sharpness, 1),
+                                    "error_kind": result.error_kind.value if result.error_kind else None})
+        self.voter.add(result)
+        leader = self.voter.leader()
+        self.state.candidate = leader[0] if leader else ""
+        consensus = self.voter.consensus()
+        if consensus is not None and not self.state.done:
+            self.state.digits, self.state.confidence = consensus
+            self.state.time_to_result_ms = (time.perf_counter() - self._started) * 1000
+
+
+def iter_video_frames(source, stride=1):
+    """Fotogramas (timestamp en s, imagen BGR) de un fichero o dispositivo con cv2.VideoCapture
+
+    ``source`` es una ruta o el índice de una cámara ("0"); ``stride`` salta
+    fotogramas sin decodificarlos.
+    """
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not capture.isOpened():
+        raise ValueError(f"No se pudo abrir el vídeo: {source}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    index = 0
+    try:
+        while True:
+            if index % stride and capture.grab():
+                index += 1
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield index / fps, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def scan_stream(frames, recognizer, roi=None, preprocess=None, selector=None, voter=None,
+                stop_on_consensus=True):
+    """Escanea una secuencia de (timestamp, imagen) y devuelve el StreamState final"""
+    scanner = LiveScanner(recognizer, roi=roi, preprocess=preprocess, selector=selector, voter=voter)
+    for timestamp, image in frames:
+        state = scanner.feed(image, timestamp)
+        if state.done and stop_on_consensus:
+            break
+    return scanner.finish()
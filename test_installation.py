@@ -1,6 +1,5 @@
 import streamlit as st
 import cv2
-import pytesseract
 from PIL import Image
 import numpy as np
 import sys
@@ -9,11 +8,12 @@ st.write("Python version:", sys.version)
 st.write("OpenCV version:", cv2.__version__)
 
 try:
-    # Verificar Tesseract
-    pytesseract.get_tesseract_version()
-    st.success("✅ Tesseract OCR funciona correctamente")
+    # Verificar el motor OCR local (sin red)
+    import scanner
+    scanner.LocalDigitRecognizer().recognize(np.full((120, 250, 3), 255, dtype=np.uint8))
+    st.success("✅ Motor OCR local funciona correctamente")
 except Exception as e:
-    st.error(f"❌ Error con Tesseract: {e}")
+    st.error(f"❌ Error con el motor OCR local: {e}")
 
 try:
     # Verificar Pillow
@@ -0,0 +1,83 @@
+"""Pruebas de los dígitos de control y de la corrección de lecturas"""
+import pytest
+
+from scanner.formats import best_valid, ean_valid, luhn_valid, mod11_valid, parse_formats
+
+EAN13 = "4006381333931"
+
+
+def reading(digits, doubtful=None, confidence=0.95, doubt=0.4):
+    """Lectura sin alternativas del motor: todas las posiciones seguras salvo ``doubtful``"""
+    confidences = [confidence] * len(digits)
+    if doubtful is not None:
+        confidences[doubtful] = doubt
+    return digits, confidences, [None] * len(digits)
+
+
+def test_luhn_valid():
+    assert luhn_valid("79927398713")
+    assert not luhn_valid("79927398710")
+    assert not luhn_valid("7")
+
+
+def test_ean_valid():
+    assert ean_valid(EAN13)
+    assert not ean_valid(EAN13[:-1] + "2")
+    # Longitud que no es EAN-8, UPC-A, EAN-13 ni GTIN-14
+    assert not ean_valid("123456789")
+
+
+def test_mod11_valid():
+    assert mod11_valid("12345674")
+    assert not mod11_valid("12345675")
+    assert not mod11_valid("1")
+
+
+def test_parse_formats_named_and_custom():
+    ean13, custom = parse_formats("ean13; len=6-8|10:check=mod11:regex=^1\\d+$")
+    assert ean13.name == "ean13" and ean13.lengths == (13,)
+    assert custom.lengths == (6, 7, 8, 10)
+    assert custom.check == "mod11" and custom.pattern == "^1\\d+$"
+    assert custom.matches("12345674")
+    assert not custom.matches("22345674")
+
+
+def test_parse_formats_regex_may_contain_colon():
+    (digit_format,) = parse_formats("regex=^(?:0|1)\\d{3}$")
+    assert digit_format.matches("0123")
+
+
+@pytest.mark.parametrize("spec", ["len=13:foo=1", "bogus", "check=crc"])
+def test_parse_formats_rejects_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_formats(spec)
+
+
+def test_best_valid_fixes_one_substitution():
+    # Un 3 leído como 8 con poca confianza: un cambio devuelve el EAN válido
+    misread = EAN13[:4] + "8" + EAN13[5:]
+    match = best_valid([reading(misread, doubtful=4)], parse_formats("ean13"),
+                       max_changes=2, min_share=0.6)
+    assert match.digits == EAN13
+    assert match.changes == 1
+    assert match.format == "ean13"
+
+
+def test_best_valid_drops_spurious_glyph():
+    extra = EAN13[:7] + "1" + EAN13[7:]
+    match = best_valid([reading(extra, doubtful=7, doubt=0.3)], parse_formats("ean13"),
+                       max_changes=2, min_share=0.6)
+    assert match.digits == EAN13
+    assert match.changes == 1
+
+
+def test_best_valid_rejects_ambiguous_reading():
+    # Todas las posiciones igual de dudosas: varias cadenas válidas empatan
+    misread = EAN13[:4] + "8" + EAN13[5:]
+    assert best_valid([reading(misread, confidence=0.5)], parse_formats("ean13"),
+                      max_changes=2, min_share=0.6) is None
+
+
+def test_best_valid_keeps_valid_reading():
+    match = best_valid([reading(EAN13)], parse_formats("ean13"), max_changes=2, min_share=0.6)
+    assert match.digits == EAN13 and match.changes == 0
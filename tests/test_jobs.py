@@ -0,0 +1,90 @@
+"""Pruebas de la cola de trabajos: turnos por propietario, cancelación y límites"""
+import threading
+
+import pytest
+
+from scanner.errors import QueueFullError
+from scanner.jobs import CANCELLED, DONE, FAILED, RUNNING, JobQueue
+
+TIMEOUT = 5
+
+
+class Gate:
+    """Trabajo que avisa al empezar y no termina hasta que se abre la puerta"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, value):
+        self.started.set()
+        assert self.release.wait(TIMEOUT)
+        return value
+
+
+def occupy(queue, owner="a"):
+    """Ocupa el único hilo de la cola con un trabajo bloqueado"""
+    gate = Gate()
+    job_id = queue.submit(owner, gate, "gate")
+    assert gate.started.wait(TIMEOUT)
+    return gate, job_id
+
+
+def test_owners_take_turns():
+    queue = JobQueue(workers=1, max_pending=10, ttl=60)
+    order = []
+    gate, first = occupy(queue)
+    jobs = [queue.submit(owner, order.append, name)
+            for owner, name in (("a", "a2"), ("a", "a3"), ("b", "b1"))]
+    # Con "a1" en marcha, "b1" pasa por delante del segundo trabajo pendiente de "a"
+    assert [queue.position(job_id) for job_id in jobs] == [0, 2, 1]
+    gate.release.set()
+    for job_id in jobs:
+        assert queue.wait(job_id, timeout=TIMEOUT).status == DONE
+    assert queue.get(first).result == "gate"
+    assert order == ["a2", "b1", "a3"]
+
+
+def test_cancel_queued_job_never_runs():
+    queue = JobQueue(workers=1, max_pending=10, ttl=60)
+    ran = []
+    gate, _ = occupy(queue)
+    job_id = queue.submit("a", ran.append, "x")
+    assert queue.cancel(job_id)
+    assert queue.get(job_id).status == CANCELLED
+    gate.release.set()
+    after = queue.submit("a", ran.append, "y")
+    queue.wait(after, timeout=TIMEOUT)
+    assert ran == ["y"]
+    assert not queue.cancel(job_id)
+
+
+def test_cancel_running_job_discards_result():
+    queue = JobQueue(workers=1, max_pending=10, ttl=60)
+    gate, job_id = occupy(queue)
+    assert queue.get(job_id).status == RUNNING
+    assert queue.cancel(job_id)
+    gate.release.set()
+    job = queue.wait(job_id, timeout=TIMEOUT)
+    assert job.status == CANCELLED
+    assert job.result is None
+
+
+def test_max_pending_per_owner():
+    queue = JobQueue(workers=1, max_pending=2, ttl=60)
+    gate, _ = occupy(queue)
+    queue.submit("a", str, 1)
+    with pytest.raises(QueueFullError):
+        queue.submit("a", str, 2)
+    # El límite es por propietario: otra sesión sigue pudiendo encolar
+    queue.submit("b", str, 3)
+    gate.release.set()
+
+
+def test_failure_and_retry():
+    queue = JobQueue(workers=1, max_pending=2, ttl=60)
+    job_id = queue.submit("a", int, "x")
+    job = queue.wait(job_id, timeout=TIMEOUT)
+    assert job.status == FAILED and job.error
+    retried = queue.retry(job_id)
+    assert queue.wait(retried, timeout=TIMEOUT).attempt == 2
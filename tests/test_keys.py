@@ -0,0 +1,96 @@
+"""Pruebas del reparto de claves de OCR.space (sin red ni esperas)"""
+import pytest
+
+from scanner.errors import OCRRateLimitError
+from scanner.keys import KeyManager
+
+
+def manager(keys=("a", "b"), **options):
+    defaults = dict(rate=0, burst=5, daily_quota=0, cooldown=60.0, forbidden_cooldown=3600.0,
+                    state_path="", max_wait=0, strikes=3)
+    defaults.update(options)
+    return KeyManager(list(keys), **defaults)
+
+
+def cooldowns(keys):
+    return [entry["cooldown_s"] for entry in keys.snapshot()]
+
+
+def test_acquire_spreads_requests_over_keys():
+    keys = manager(daily_quota=10)
+    assert {keys.acquire(), keys.acquire()} == {"a", "b"}
+
+
+def test_token_bucket_limits_rate():
+    keys = manager(keys=("a",), rate=0.001, burst=2)
+    keys.acquire()
+    keys.acquire()
+    with pytest.raises(OCRRateLimitError):
+        keys.acquire()
+
+
+def test_daily_quota_exhausts_key():
+    keys = manager(keys=("a",), daily_quota=2)
+    keys.acquire()
+    keys.acquire()
+    with pytest.raises(OCRRateLimitError):
+        keys.acquire()
+
+
+def test_isolated_429_uses_retry_after():
+    keys = manager(keys=("a",))
+    keys.report("a", 429, retry_after=2.0)
+    assert 0 < cooldowns(keys)[0] <= 2.0
+
+
+def test_consecutive_429_apply_full_cooldown():
+    keys = manager(keys=("a",))
+    keys.report("a", 429)
+    assert cooldowns(keys)[0] <= 1.0
+    keys.report("a", 429)
+    assert cooldowns(keys)[0] <= 2.0
+    keys.report("a", 429)
+    assert cooldowns(keys)[0] > 50.0
+
+
+def test_success_resets_strikes():
+    keys = manager(keys=("a",))
+    keys.report("a", 429, retry_after=0)
+    keys.report("a", 429, retry_after=0)
+    keys.report("a", 200)
+    keys.report("a", 429, retry_after=0)
+    assert cooldowns(keys)[0] == 0
+
+
+def test_forbidden_key_is_skipped():
+    keys = manager()
+    keys.report("a", 403)
+    assert cooldowns(keys)[0] > 3000
+    assert keys.acquire() == "b"
+    assert not keys.available(exclude=("b",))
+
+
+def test_state_file_is_shared(tmp_path):
+    path = str(tmp_path / "keys.json")
+    first = manager(keys=("a",), daily_quota=2, state_path=path)
+    second = manager(keys=("a",), daily_quota=2, state_path=path)
+    first.acquire()
+    second.acquire()
+    with pytest.raises(OCRRateLimitError):
+        first.acquire()
+    # El fichero guarda identificadores, nunca las claves
+    assert '"a"' not in (tmp_path / "keys.json").read_text()
+
+
+def test_state_file_written_only_on_changes(tmp_path):
+    path = tmp_path / "keys.json"
+    keys = manager(keys=("a",), rate=1.0, state_path=str(path))
+    keys.acquire()
+    inode = path.stat().st_ino
+    # Respuestas correctas y consultas no reescriben el fichero
+    keys.report("a", 200)
+    keys.snapshot()
+    keys.available()
+    assert path.stat().st_ino == inode
+    keys.report("a", 429, retry_after=1.0)
+    assert path.stat().st_ino != inode
@@ -0,0 +1,100 @@
+"""Pruebas de los motores de reconocimiento y de su combinación (sin red)"""
+import json
+import os
+
+import cv2
+import numpy as np
+
+from scanner.errors import ErrorKind
+from scanner.recognizers import (
+    EnsembleRecognizer,
+    FallbackRecognizer,
+    LocalDigitRecognizer,
+    RecognitionResult,
+)
+from scanner.scan import scan_file
+
+CORPUS = os.path.join(os.path.dirname(__file__), os.pardir, "temp")
+
+
+def printed(text, scale=1.6):
+    image = np.full((120, 700, 3), 255, np.uint8)
+    cv2.putText(image, text, (10, 80), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 3)
+    return image
+
+
+def test_local_engine_is_confident_on_clean_digits():
+    result = LocalDigitRecognizer().recognize(printed("4006381333931"))
+    assert result.digits == "4006381333931"
+    assert result.confidence >= 0.8
+
+
+def test_local_engine_never_sure_of_wrong_reads():
+    # En el corpus etiquetado, una lectura local por encima del umbral de 'auto'
+    # se saltaría la API: sólo puede ocurrir si es correcta
+    with open(os.path.join(CORPUS, "labels.json"), encoding="utf-8") as f:
+        labels = json.load(f)
+    recognizer = LocalDigitRecognizer()
+    for name, label in labels.items():
+        for record in scan_file(os.path.join(CORPUS, name), recognizer):
+            if record["confidence"] >= 0.8:
+                assert record["digits"] == label, name
+
+
+class Fixed:
+    """Motor de prueba que siempre devuelve el mismo resultado"""
+
+    def __init__(self, name, digits="", confidence=0.0, error_kind=None):
+        self.name = name
+        self.result = RecognitionResult(digits=digits, confidence=confidence, engine=name,
+                                        error="fallo" if error_kind else None, error_kind=error_kind)
+        self.calls = 0
+
+    def recognize(self, image):
+        self.calls += 1
+        return self.result
+
+
+def test_fallback_returns_first_confident_reading():
+    local, api = Fixed("local", "123", 0.9), Fixed("api", "124", 0.95)
+    assert FallbackRecognizer([local, api], min_confidence=0.8).recognize(None).digits == "123"
+    assert api.calls == 0
+
+
+def test_fallback_prefers_api_answer_over_doubtful_guess():
+    local, api = Fixed("local", "0", 0.3), Fixed("api", error_kind=ErrorKind.NO_DIGITS)
+    result = FallbackRecognizer([local, api], min_confidence=0.8).recognize(None)
+    assert result.error_kind == ErrorKind.NO_DIGITS
+
+
+def test_fallback_keeps_guess_when_api_unavailable():
+    local, api = Fixed("local", "42", 0.5), Fixed("api", error_kind=ErrorKind.TIMEOUT)
+    assert FallbackRecognizer([local, api], min_confidence=0.8).recognize(None).digits == "42"
+
+
+def test_ensemble_returns_api_no_digits_over_doubtful_local():
+    local, api = Fixed("local", "9", 0.44), Fixed("api", error_kind=ErrorKind.NO_DIGITS)
+    result = EnsembleRecognizer([[local], [api]], min_confidence=0.8).recognize(None)
+    assert result.error_kind == ErrorKind.NO_DIGITS
+
+
+def test_ensemble_agreement_reinforces_confidence():
+    local, api = Fixed("local", "2025", 0.6), Fixed("api", "2025", 0.6)
+    result = EnsembleRecognizer([[local], [api]], min_confidence=0.9).recognize(None)
+    assert result.digits == "2025" and result.confidence > 0.8
+
+
+def test_ensemble_keeps_guess_when_api_unavailable():
+    local, api = Fixed("local", "42", 0.5), Fixed("api", error_kind=ErrorKind.CIRCUIT_OPEN)
+    assert EnsembleRecognizer([[local], [api]], min_confidence=0.8).recognize(None).digits == "42"
+
+
+def test_ensemble_close_stops_parallel_pool():
+    first, second = Fixed("api1", "1", 0.5), Fixed("api2", "1", 0.5)
+    ensemble = EnsembleRecognizer([[first, second]], min_confidence=0.9)
+    ensemble.recognize(None)
+    executor = ensemble._executor
+    ensemble.close()
+    assert executor._shutdown and ensemble._executor is None
+    # Después de cerrar, el nivel se recorre en serie
+    assert ensemble.recognize(None).digits == "1"
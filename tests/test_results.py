@@ -0,0 +1,37 @@
+"""Pruebas de la retención del log de lecturas"""
+import os
+import subprocess
+import sys
+import time
+
+from scanner.results import ResultLog
+
+
+def finished_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def make_file(root, stamp, pid, age=100):
+    path = os.path.join(root, f"results-20200101-{stamp}-{pid}-0001.jsonl.gz")
+    open(path, "wb").close()
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return os.path.basename(path)
+
+
+def test_prune_keeps_files_of_live_processes(tmp_path):
+    root = str(tmp_path)
+    dead, parent = finished_pid(), os.getppid()
+    stale = make_file(root, "000000", dead)
+    other = make_file(root, "000001", parent)
+    recent = make_file(root, "000002", dead, age=0)
+    older = make_file(root, "000003", dead)
+
+    log = ResultLog(root=root, max_files=2, flush_interval=2.0)
+    log._current_path()
+    remaining = sorted(os.listdir(root))
+    # Se borran los cerrados más antiguos; el de un proceso vivo y el recién escrito se quedan
+    assert stale not in remaining and older not in remaining
+    assert remaining == sorted([other, recent])